@@ -0,0 +1,105 @@
+"""Compares concurrent request throughput of the Flask (thread per request) and ASGI (asyncio) stacks
+
+Both apps serve the same seeded SQLite database, created in a temporary directory. The Flask app is
+driven from a pool of threads, the ASGI app from that many concurrent tasks on one event loop.
+
+Run from the project root:
+    python -m benchmarks.bench_async [requests] [concurrency ...]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REQUESTS = 2_000
+CONCURRENCY = (1, 8, 32)
+SEED_CONTACTS = 1_000
+
+os.environ['CONFIG_TYPE'] = 'config.TestingConfig'
+os.environ.setdefault('TEST_DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_async.db')}")
+
+from src.contacts.entrypoints.app.application import create_app  # noqa: E402 - the database URI has to be set first
+from src.contacts.entrypoints.asgi import create_asgi_app  # noqa: E402
+
+
+def request_paths(count):
+    # A mix of single contact reads and first pages of the listing
+    return [f'/contacts/{index % SEED_CONTACTS + 1}' if index % 4 else '/contacts?limit=20' for index in range(count)]
+
+
+def seed(flask_app):
+    contacts = [{'first_name': f'Jane{index}', 'last_name': 'Doe', 'birthday': '1990-01-01', 'email_address': f'jane{index}.doe@example.com'}
+                for index in range(SEED_CONTACTS)]
+    flask_app.test_client().put('/contacts/upsert', json=contacts)
+
+
+def run_sync(flask_app, paths, concurrency):
+    def get(path):
+        return flask_app.test_client().get(path).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(get, paths))
+    return time.perf_counter() - start, statuses
+
+
+def run_async(paths, concurrency):
+    asgi_app = create_asgi_app()
+
+    async def get(path):
+        route, _, query_string = path.partition('?')
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_app({'type': 'http', 'method': 'GET', 'path': route, 'query_string': query_string.encode('ascii'), 'headers': []}, receive, send)
+        return messages[0]['status']
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(path):
+            async with semaphore:
+                return await get(path)
+
+        await get('/contacts/1')  # startup and first connection, outside the timing
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(limited(path) for path in paths))
+        elapsed = time.perf_counter() - start
+        await asgi_app.extensions['session_factory'].engine.dispose()
+        return elapsed, statuses
+
+    return asyncio.run(run())
+
+
+def run(requests=REQUESTS, concurrency_levels=CONCURRENCY):
+    flask_app = create_app()
+    seed(flask_app)
+    paths = request_paths(requests)
+    results = []
+    for concurrency in concurrency_levels:
+        sync_seconds, sync_statuses = run_sync(flask_app, paths, concurrency)
+        async_seconds, async_statuses = run_async(paths, concurrency)
+        if set(sync_statuses) != {200} or set(async_statuses) != {200}:
+            raise AssertionError(f'Unexpected statuses at concurrency {concurrency}: {set(sync_statuses) | set(async_statuses)}')
+        results.append({
+            "concurrency": concurrency,
+            "requests": requests,
+            "sync_requests_per_second": round(requests / sync_seconds, 1),
+            "async_requests_per_second": round(requests / async_seconds, 1),
+            "speedup": round(sync_seconds / async_seconds, 2),
+        })
+    return results
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    concurrency_levels = tuple(int(level) for level in sys.argv[2:]) or CONCURRENCY
+    print(json.dumps(run(requests, concurrency_levels), indent=2))
@@ -0,0 +1,42 @@
+"""Compares marshmallow dump + json.dumps with the precompiled contact encoder
+
+Run from the project root:
+    python -m benchmarks.bench_serialization
+"""
+import json
+import sys
+import timeit
+
+from benchmarks import synthetic
+from src.contacts.service_layer import serialization
+from src.contacts.service_layer.services import serialize_for_api
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def best_of(function, repeat=3):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def run(sizes=SIZES):
+    results = []
+    for size in sizes:
+        contacts = synthetic.contacts(size)
+        baseline = json.dumps(serialize_for_api(contacts, 'not single')).encode('ascii')
+        if serialization.contacts_to_json(contacts) != baseline:
+            raise AssertionError(f'Encoded output differs from the marshmallow output at {size} rows')
+
+        marshmallow_seconds = best_of(lambda: json.dumps(serialize_for_api(contacts, 'not single')))
+        precompiled_seconds = best_of(lambda: serialization.contacts_to_json(contacts))
+        results.append({
+            "rows": size,
+            "marshmallow_json_dumps_ms": round(marshmallow_seconds * 1000, 3),
+            "precompiled_ms": round(precompiled_seconds * 1000, 3),
+            "speedup": round(marshmallow_seconds / precompiled_seconds, 2),
+        })
+    return results
+
+
+if __name__ == '__main__':
+    sizes = tuple(int(size) for size in sys.argv[1:]) or SIZES
+    print(json.dumps(run(sizes), indent=2))
@@ -0,0 +1,58 @@
+"""Measures how long importing the app and calling create_app() take, each in a fresh interpreter
+
+Run from the project root:
+    python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+
+# Printed by the child interpreter: import seconds, create_app seconds
+PROBE = """
+import time
+start = time.perf_counter()
+from src.contacts.entrypoints.app.application import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(imported - start, created - imported)
+"""
+
+
+def measure_once():
+    # Like load_test.start_server, the child runs the testing config against a database of its own - whatever .env
+    # selects (e.g. REPEATABLE READ, which SQLite doesn't have) would fail create_app() or touch a real database
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            'CONFIG_TYPE': 'config.TestingConfig',
+            'TEST_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench_startup.db')}",
+        }
+        probe = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True)
+    if probe.returncode != 0:
+        raise RuntimeError(f'The probe exited with status {probe.returncode}:\n{probe.stderr}')
+    import_seconds, create_app_seconds = map(float, probe.stdout.split()[-2:])
+    return import_seconds, create_app_seconds
+
+
+def run(runs=RUNS):
+    samples = [measure_once() for _ in range(runs)]
+    import_ms = [import_seconds * 1000 for import_seconds, _ in samples]
+    create_app_ms = [create_app_seconds * 1000 for _, create_app_seconds in samples]
+    return {
+        "runs": runs,
+        "import_median_ms": round(statistics.median(import_ms), 3),
+        "import_max_ms": round(max(import_ms), 3),
+        "create_app_median_ms": round(statistics.median(create_app_ms), 3),
+        "create_app_max_ms": round(max(create_app_ms), 3),
+    }
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    print(json.dumps(run(runs), indent=2))
@@ -0,0 +1,231 @@
+"""End-to-end HTTP load test - capacity numbers for the API as a client sees them
+
+Starts the app from run.py on a local port, against a fresh SQLite database seeded with synthetic
+contacts, then drives a weighted mix of requests on /contacts from concurrent client threads (or
+processes, when the client itself would be the bottleneck). Reports throughput and p50/p95/p99 latency
+for each route.
+
+Each client owns the contacts it changes - a share of the seeded ones and those it creates - so PUT and
+DELETE never race another client for the same row. Every contact the harness writes has an email address
+at LOAD_TEST_DOMAIN, and only those are ever updated or deleted. Pass --url to load an already running
+deployment instead; run.py serves through Flask's development server, so its numbers are only comparable
+with each other.
+
+Run from the project root:
+    python -m benchmarks.load_test [--clients 16] [--requests 5000] [--mix post=1,get=6,list=2,put=1,delete=1] [--processes]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+
+from benchmarks import synthetic
+from src.contacts.service_layer.services import MAX_BULK_SIZE
+
+CLIENTS = 16
+REQUESTS = 5_000
+SEED_CONTACTS = 1_000
+MIX = {'post': 1, 'get': 6, 'list': 2, 'put': 1, 'delete': 1}
+PERCENTILES = (50, 95, 99)
+STARTUP_TIMEOUT = 30
+# Reserved for testing by RFC 2606, so it can't belong to a real contact
+LOAD_TEST_DOMAIN = 'load-test.invalid'
+ROUTES = {
+    'post': 'POST /contacts',
+    'get': 'GET /contacts/<id>',
+    'list': 'GET /contacts',
+    'put': 'PUT /contacts/<id>',
+    'delete': 'DELETE /contacts/<id>',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, directory):
+    """Runs run.py through flask run on port, with a database in directory"""
+    env = {
+        **os.environ,
+        'CONFIG_TYPE': 'config.TestingConfig',
+        'TEST_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'load_test.db')}",
+    }
+    command = [sys.executable, '-m', 'flask', '--app', 'run.py', 'run', '--port', str(port), '--with-threads', '--no-reload', '--no-debugger']
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url, server=None, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f'The server exited with status {server.returncode} before accepting requests')
+        try:
+            if requests.get(f'{base_url}/status/db-pool', timeout=1).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f'The server did not accept requests within {timeout} seconds')
+
+
+def load_test_email_address(*parts):
+    return f"{'.'.join(str(part) for part in parts)}@{LOAD_TEST_DOMAIN}"
+
+
+def seed(base_url, count, run_id):
+    """Upserts count synthetic contacts, in batches the bulk endpoint accepts, returning the ids of those contacts only"""
+    contacts = synthetic.contact_data(count)
+    for index, contact in enumerate(contacts):
+        contact['email_address'] = load_test_email_address('seed', run_id, index)
+    for start in range(0, count, MAX_BULK_SIZE):
+        response = requests.put(f'{base_url}/contacts/upsert', json=contacts[start:start + MAX_BULK_SIZE])
+        response.raise_for_status()
+
+    seeded_emails = {contact['email_address'] for contact in contacts}
+    response = requests.get(f'{base_url}/contacts', params={'fields': 'id,email_address', 'email_domain': LOAD_TEST_DOMAIN})
+    response.raise_for_status()
+    return [contact['id'] for contact in response.json() if contact['email_address'] in seeded_emails]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        operation, _, weight = part.partition('=')
+        if operation not in ROUTES:
+            raise argparse.ArgumentTypeError(f'Unknown operation {operation!r} - choose from {", ".join(ROUTES)}')
+        mix[operation] = int(weight)
+    return mix
+
+
+def run_client(base_url, client, requests_to_send, mix, owned_ids, run_id):
+    """Sends requests_to_send requests in the given mix, returning a (route, status, seconds) sample for each"""
+    rng = random.Random(client)
+    operations, weights = list(mix), list(mix.values())
+    new_contacts = iter(synthetic.contact_data(requests_to_send, seed=client))
+    owned_ids = list(owned_ids)
+    samples = []
+
+    with requests.Session() as session:
+        for index in range(requests_to_send):
+            operation = rng.choices(operations, weights)[0]
+            if operation in ('get', 'put', 'delete') and not owned_ids:
+                operation = 'post'
+
+            if operation == 'post':
+                contact = next(new_contacts)
+                contact['email_address'] = load_test_email_address('client', run_id, client, index)
+                call = (session.post, f'{base_url}/contacts', {'json': contact})
+            elif operation == 'list':
+                call = (session.get, f'{base_url}/contacts', {'params': {'limit': 20}})
+            elif operation == 'get':
+                call = (session.get, f'{base_url}/contacts/{rng.choice(owned_ids)}', {})
+            elif operation == 'put':
+                call = (session.put, f'{base_url}/contacts/{rng.choice(owned_ids)}', {'json': {'last_name': f'Updated{index}'}})
+            else:
+                call = (session.delete, f'{base_url}/contacts/{owned_ids.pop(rng.randrange(len(owned_ids)))}', {})
+
+            method, url, kwargs = call
+            start = time.perf_counter()
+            response = method(url, **kwargs)
+            elapsed = time.perf_counter() - start
+
+            if operation == 'post' and response.status_code == 201:
+                owned_ids.append(response.json()['id'])
+            samples.append((ROUTES[operation], response.status_code, elapsed))
+
+    return samples
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, -(-percent * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def report(samples, elapsed):
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    for route, status, seconds in samples:
+        latencies[route].append(seconds)
+        statuses[route][status] += 1
+
+    routes = {}
+    for route in sorted(latencies):
+        values = sorted(latencies[route])
+        routes[route] = {
+            'requests': len(values),
+            'throughput_per_s': round(len(values) / elapsed, 1),
+            **{f'p{percent}_ms': round(percentile(values, percent) * 1000, 3) for percent in PERCENTILES},
+            'statuses': {str(status): count for status, count in sorted(statuses[route].items())},
+        }
+    return {
+        'requests': len(samples),
+        'seconds': round(elapsed, 3),
+        'throughput_per_s': round(len(samples) / elapsed, 1),
+        'routes': routes,
+    }
+
+
+def run(base_url, clients=CLIENTS, total_requests=REQUESTS, mix=None, processes=False, seed_contacts=SEED_CONTACTS):
+    mix = mix or MIX
+    # Keeps the email addresses of repeated runs against the same server apart
+    run_id = uuid.uuid4().hex[:12]
+    seeded_ids = seed(base_url, seed_contacts, run_id)
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+
+    with executor_class(max_workers=clients) as executor:
+        start = time.perf_counter()
+        futures = [executor.submit(run_client, base_url, client, total_requests // clients + (client < total_requests % clients), mix, seeded_ids[client::clients], run_id)
+                   for client in range(clients)]
+        samples = [sample for future in futures for sample in future.result()]
+        elapsed = time.perf_counter() - start
+
+    return {'clients': clients, 'client_type': 'process' if processes else 'thread', 'mix': mix, **report(samples, elapsed)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=CLIENTS, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=REQUESTS, help='Requests sent across all clients')
+    parser.add_argument('--mix', type=parse_mix, default=MIX, help='Relative weight of each operation, as post=1,get=6,list=2,put=1,delete=1')
+    parser.add_argument('--seed-contacts', type=int, default=SEED_CONTACTS, help='Contacts created before the clients start')
+    parser.add_argument('--processes', action='store_true', help='Run each client in its own process rather than a thread')
+    parser.add_argument('--url', help='Base URL of a running server to load, rather than starting run.py')
+    args = parser.parse_args(argv)
+
+    server = None
+    database_directory = None
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        database_directory = tempfile.TemporaryDirectory()
+        server = start_server(port, database_directory.name)
+        base_url = f'http://127.0.0.1:{port}'
+
+    try:
+        wait_until_ready(base_url, server)
+        results = run(base_url.rstrip('/'), args.clients, args.requests, args.mix, args.processes, args.seed_contacts)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if database_directory is not None:
+            database_directory.cleanup()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Micro-benchmarks of the repository, service, validation and serialization layers
+
+Each benchmark runs against SQLite databases seeded with synthetic contacts, at every size. Results
+are keyed "<layer>.<operation>[<rows>]" and written with sorted keys, so the JSON of two revisions can
+be diffed or compared with compare().
+
+Run from the project root:
+    python -m benchmarks.suite [--sizes 1000,10000] [--repeat 3] [--output results.json] [--compare baseline.json]
+or through the CLI command:
+    FLASK_APP=run.py flask bench
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from importlib.metadata import version
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import synthetic
+from src.contacts.adapters.repository import SqlAlchemyContactRepository
+from src.contacts.domain.model import init_database
+from src.contacts.service_layer import serialization
+from src.contacts.service_layer.services import ContactService, serialize_for_api, validate_request_with_schema
+from src.contacts.service_layer.unit_of_work import SqlAlchemyUnitOfWork
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = 3
+# Lookups and single inserts are timed in runs of this many calls, as one call is too quick to time reliably
+CALLS_PER_RUN = 200
+SEED_BATCH_SIZE = 5_000
+
+
+def time_runs(function, repeat):
+    """Wall-clock seconds of each of repeat calls to function"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarise(timings, calls):
+    return {
+        "calls": calls,
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+    }
+
+
+def seeded_session_factory(directory, size):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, f'bench_{size}.db')}")
+    with engine.begin() as connection:
+        init_database(connection)
+    session_factory = sessionmaker(bind=engine)
+    contacts = synthetic.contacts(size)
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        for start in range(0, size, SEED_BATCH_SIZE):
+            uow.contacts.add_many(contacts[start:start + SEED_BATCH_SIZE])
+        uow.commit()
+    return session_factory
+
+
+def benchmarks_for(session_factory, size, repeat):
+    """(name, function, calls) for every benchmark at one size - functions are timed as they are, after one warm-up call"""
+    lookup_ids = [1 + (index * 7919) % size for index in range(CALLS_PER_RUN)]
+    middle_id = size // 2
+    service = ContactService(SqlAlchemyUnitOfWork(session_factory))
+    contacts = synthetic.contacts(size)
+    contacts_data = synthetic.contact_data(size)
+    # Pages from halfway through the sorted listing - a keyset that doesn't seek reads every row before it
+    by_name = sorted(contacts, key=lambda contact: (contact.last_name, contact.first_name, contact.id))[size // 2]
+    by_name_descending = sorted(contacts, key=lambda contact: (contact.first_name, contact.id))
+    by_name_descending = sorted(by_name_descending, key=lambda contact: contact.last_name, reverse=True)[size // 2]
+    # Enough new contacts for the warm-up call and every timed run
+    new_contacts = iter(synthetic.contact_data(CALLS_PER_RUN * (repeat + 1), seed=size + 1))
+
+    def repository(operation):
+        def run():
+            session = session_factory()
+            try:
+                operation(SqlAlchemyContactRepository(session))
+            finally:
+                session.close()
+        return run
+
+    def add_contacts():
+        for _ in range(CALLS_PER_RUN):
+            contact = next(new_contacts)
+            service.add(contact['first_name'], contact['last_name'], datetime.date.fromisoformat(contact['birthday']), f"new.{contact['email_address']}")
+
+    return [
+        ("repository.get_all", repository(lambda contacts: contacts.get_all()), 1),
+        ("repository.get_all_rows", repository(lambda contacts: contacts.get_all_rows()), 1),
+        ("repository.get_page", repository(lambda contacts: contacts.get_page(50, after_id=middle_id)), 1),
+        ("repository.get_page_sorted", repository(lambda contacts: contacts.get_page(50, sort=('last_name', 'first_name'))), 1),
+        ("repository.get_page_sorted_deep", repository(lambda contacts: contacts.get_page(50, by_name.id, sort=('last_name', 'first_name'),
+                                                                                  after_keys=[by_name.last_name, by_name.first_name])), 1),
+        ("repository.get_page_mixed_sort_deep", repository(lambda contacts: contacts.get_page(50, by_name_descending.id, sort=('-last_name', 'first_name'),
+                                                                                      after_keys=[by_name_descending.last_name, by_name_descending.first_name])), 1),
+        ("repository.get_by_id", repository(lambda contacts: [contacts.get_by_id(id) for id in lookup_ids]), CALLS_PER_RUN),
+        ("repository.get_by_email_address", repository(lambda contacts: [contacts.get_by_email_address(contacts_data[id - 1]['email_address']) for id in lookup_ids]), CALLS_PER_RUN),
+        ("service.get_all_contacts", lambda: service.get_all_contacts(), 1),
+        ("service.get_all_contacts_json", lambda: service.get_all_contacts_json(), 1),
+        ("service.get_page_json", lambda: service.get_page_json(50), 1),
+        ("service.get_by_id", lambda: [service.get_by_id(id) for id in lookup_ids], CALLS_PER_RUN),
+        ("service.add", add_contacts, CALLS_PER_RUN),
+        ("validation.validate_request_with_schema", lambda: [validate_request_with_schema(contact) for contact in contacts_data], size),
+        ("serialization.serialize_for_api", lambda: serialize_for_api(contacts, 'not single'), 1),
+        ("serialization.contacts_to_json", lambda: serialization.contacts_to_json(contacts), 1),
+    ]
+
+
+def run(sizes=SIZES, repeat=REPEAT):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            session_factory = seeded_session_factory(directory, size)
+            for name, function, calls in benchmarks_for(session_factory, size, repeat):
+                function()
+                results[f"{name}[{size}]"] = summarise(time_runs(function, repeat), calls)
+            session_factory.kw['bind'].dispose()
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "sqlalchemy": version("sqlalchemy"),
+            "marshmallow": version("marshmallow"),
+            "platform": platform.platform(),
+        },
+        "settings": {"sizes": list(sizes), "repeat": repeat, "calls_per_run": CALLS_PER_RUN},
+        "results": results,
+    }
+
+
+def compare(baseline, current):
+    """Median time of every benchmark in both runs, and how many times slower (> 1) or faster (< 1) the current run is"""
+    comparison = {}
+    for name, result in current["results"].items():
+        if name in baseline["results"]:
+            baseline_ms = baseline["results"][name]["median_ms"]
+            comparison[name] = {
+                "baseline_ms": baseline_ms,
+                "current_ms": result["median_ms"],
+                "ratio": round(result["median_ms"] / baseline_ms, 2) if baseline_ms else None,
+            }
+    return comparison
+
+
+def to_json(results):
+    return json.dumps(results, indent=2, sort_keys=True)
+
+
+def main(sizes=SIZES, repeat=REPEAT, output=None, baseline=None):
+    results = run(sizes, repeat)
+    if output:
+        with open(output, 'w') as file:
+            file.write(to_json(results) + '\n')
+    if baseline:
+        with open(baseline) as file:
+            return to_json(compare(json.load(file), results))
+    return to_json(results)
+
+
+def parse_sizes(sizes):
+    return tuple(int(size) for size in sizes.split(',') if size.strip())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_sizes, default=SIZES)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', dest='baseline')
+    arguments = parser.parse_args()
+    print(main(arguments.sizes, arguments.repeat, arguments.output, arguments.baseline))
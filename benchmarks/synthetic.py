@@ -0,0 +1,37 @@
+"""Deterministic synthetic contacts for the benchmarks
+
+The same count and seed always give the same contacts, so runs on different revisions time the same work.
+"""
+import datetime
+import random
+
+from src.contacts.domain.model import Contact
+
+FIRST_NAMES = ('Jane', 'June', 'Juliet', 'Janice', 'Jamelia', 'Jill', 'Joan', 'Jo', 'Ada', 'Grace', 'Alan', 'Edsger', 'Barbara', 'Donald', 'Frances', 'Ken')
+LAST_NAMES = ('Doe', 'Smith', 'Adams', 'Brown', 'Lovelace', 'Hopper', 'Turing', 'Dijkstra', 'Liskov', 'Knuth', 'Allen', 'Thompson', "O'Neil", 'Müller')
+DOMAINS = ('example.com', 'gmails.com', 'mail.example.org', 'crm.test')
+CREATED_AT = datetime.datetime(2024, 5, 1, 9, 30, 0, 125000)
+
+
+def contact_data(count, seed=0):
+    """Request bodies for POST /contacts - email addresses are unique within one call"""
+    rng = random.Random(seed)
+    contacts = []
+    for index in range(count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        birthday = datetime.date(1950, 1, 1) + datetime.timedelta(days=rng.randrange(365 * 55))
+        contacts.append({
+            'first_name': first_name,
+            'last_name': last_name,
+            'birthday': birthday.isoformat(),
+            'email_address': f'{first_name.lower()}.{index}@{rng.choice(DOMAINS)}',
+        })
+    return contacts
+
+
+def contacts(count, seed=0):
+    """Contacts as the database would return them, with ids and timestamps"""
+    return [Contact(id=index, first_name=data['first_name'], last_name=data['last_name'], birthday=datetime.date.fromisoformat(data['birthday']),
+                    email_address=data['email_address'], created_at=CREATED_AT, last_updated_at=CREATED_AT)
+            for index, data in enumerate(contact_data(count, seed), start=1)]
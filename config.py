@@ -1,7 +1,6 @@
 from logging.handlers import RotatingFileHandler
 import os
-from click import echo
-import pytest
+from click import echo, option
 from dotenv import load_dotenv
 import logging
 from flask.logging import default_handler
@@ -26,7 +25,43 @@ class Config(object):
         SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASEDIR, 'instance', 'app.db')}"
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    ISOLATION_LEVEL = os.getenv('ISOLATION_LEVEL', default='REPEATABLE READ')
+    # SQLite has no REPEATABLE READ level - SERIALIZABLE is its default
+    ISOLATION_LEVEL = os.getenv('ISOLATION_LEVEL', default='REPEATABLE READ' if os.getenv('DATABASE_URI') else 'SERIALIZABLE')
+
+    # Connection pool - the defaults match SQLAlchemy's, except connections are recycled after 30 minutes
+    # and checked with a ping before use, so connections left over from before a failover aren't handed out
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', default=5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', default=10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default=30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', default=1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', default='true').lower() in ('true', '1')
+    # Fill the pool and run the common queries once at startup, so the first requests don't pay for it
+    DB_WARMUP = os.getenv('DB_WARMUP', default='false').lower() in ('true', '1')
+
+    # Read replica for the GET routes - unset, every read goes to the primary. A client that has just written
+    # keeps reading from the primary for this many seconds, so it sees its own writes despite replication lag.
+    REPLICA_DATABASE_URI = os.getenv('REPLICA_DATABASE_URI')
+    REPLICA_STICKINESS_SECONDS = float(os.getenv('REPLICA_STICKINESS_SECONDS', default=5))
+
+    # Read-through cache for single contact lookups, shared by all worker threads of the process
+    CONTACT_CACHE_ENABLED = os.getenv('CONTACT_CACHE_ENABLED', default='false').lower() in ('true', '1')
+    CONTACT_CACHE_MAX_SIZE = int(os.getenv('CONTACT_CACHE_MAX_SIZE', default=10000))
+    CONTACT_CACHE_TTL = float(os.getenv('CONTACT_CACHE_TTL', default=30))
+
+    # In-memory autocomplete index, loaded at startup and kept up to date by this process's writes only
+    TYPEAHEAD_ENABLED = os.getenv('TYPEAHEAD_ENABLED', default='false').lower() in ('true', '1')
+
+    # Server-Timing header breaking each request down into validate, uow, db, serialize and json phases.
+    # Off, every phase costs one context variable lookup; SERVER_TIMING_LOG also logs the breakdown per request.
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', default='false').lower() in ('true', '1')
+    SERVER_TIMING_LOG = os.getenv('SERVER_TIMING_LOG', default='false').lower() in ('true', '1')
+
+    # SQL statements counted per request, with repeats logged as duplicate queries and X-DB-Queries and X-DB-Time headers
+    # added. Counting keeps every statement's parameters, so it is off unless asked for here or the app runs in debug mode.
+    QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', default='false').lower() in ('true', '1')
+
+    # Request counts, latency histograms, error counts and pool and cache gauges, served in Prometheus format from /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='true').lower() in ('true', '1')
 
 class ProductionConfig(Config):
     FLASK_ENV = 'production'
@@ -42,9 +77,12 @@ class TestingConfig(Config):
 
 def register_cli_commands(app):
 
+    # pytest is imported by the commands themselves, so serving the app never pays for importing it
+
     @app.cli.command()
     def test():
         """Runs all tests."""
+        import pytest
         echo('Running all tests and producing an XML report...')
 
         exit(pytest.main(["-s", "--junit-xml=test_results/junit.xml", 'tests']))
@@ -52,21 +90,34 @@ def register_cli_commands(app):
     @app.cli.command()
     def unittest():
         """Runs all unit tests."""
+        import pytest
         pytest.main(["-s", 'tests/unit/'])
         echo('All unit tests have been run.')
 
     @app.cli.command()
     def integrationtest():
         """Runs all integration tests."""
+        import pytest
         pytest.main(["-s", 'tests/integration/'])
         echo('All integration tests have been run.')
 
     @app.cli.command()
     def endtest():
         """Runs all end-to-end tests."""
+        import pytest
         pytest.main(["-s", 'tests/e2e/'])
         echo('All end-to-end tests have been run.')
 
+    @app.cli.command()
+    @option('--sizes', default='1000,10000,100000', help='Comma separated row counts to run every benchmark at.')
+    @option('--repeat', default=3, help='Timed runs per benchmark; the median and minimum are reported.')
+    @option('--output', default=None, help='File to write the results JSON to.')
+    @option('--compare', 'baseline', default=None, help='Results JSON of an earlier run to compare against.')
+    def bench(sizes, repeat, output, baseline):
+        """Runs the micro-benchmark suite."""
+        from benchmarks import suite
+        echo(suite.main(suite.parse_sizes(sizes), repeat, output, baseline))
+
 
 def configure_logging(app):
     file_handler = RotatingFileHandler('instance/crm.log', maxBytes=16384, backupCount=20)
@@ -0,0 +1,106 @@
+import random
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.contacts.adapters.repository import (AbstractContactRepository, all_rows_statement, birthdays_statement, bump_collection_version_statement,
+                                              collection_version_statement, contact_columns, page_statement, search_statement, upsert_outcome, upsert_statement)
+from src.contacts.domain import model
+
+
+class AsyncSqlAlchemyContactRepository(AbstractContactRepository):
+    """SQLAlchemy asyncio implementation of AbstractContactRepository - every method is a coroutine
+
+    Builds the same statements as SqlAlchemyContactRepository, so both stacks read and write identically.
+    iter_batches is an async generator.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, contact):
+        self.session.add(contact)
+        await self.session.flush()
+        return contact
+
+    async def add_many(self, contacts):
+        # See SqlAlchemyContactRepository.add_many - callers match the returned contacts up by email address
+        rows = [{field: getattr(contact, field) for field in model.CONTACT_FIELDS} for contact in contacts]
+        return (await self.session.scalars(insert(model.Contact).returning(model.Contact), rows)).all()
+
+    async def get_all(self):
+        return (await self.session.scalars(select(model.Contact))).all()
+
+    async def get_all_rows(self, fields=None, filters=None, sort=None):
+        return (await self.session.execute(all_rows_statement(fields, filters, sort))).all()
+
+    async def get_page(self, limit, after_id=None, fields=None, filters=None, sort=None, after_keys=None):
+        statement = page_statement(limit, after_id, fields, filters, sort, after_keys)
+        if fields is None:
+            return (await self.session.scalars(statement)).all()
+        return (await self.session.execute(statement)).all()
+
+    async def iter_batches(self, batch_size, fields=None, filters=None, sort=None):
+        statement = all_rows_statement(fields, filters, sort, always_sorted=True).execution_options(yield_per=batch_size)
+        result = await self.session.stream(statement)
+        async for batch in result.partitions():
+            yield batch
+
+    async def search(self, terms, limit, fields=None):
+        return (await self.session.execute(search_statement(self.session.bind.dialect.name, terms, limit, fields))).all()
+
+    async def get_birthdays_between(self, start_month_day, end_month_day, fields=None):
+        # Two range scans when the range runs over the new year - see SqlAlchemyContactRepository.get_birthdays_between
+        if start_month_day > end_month_day:
+            return await self._birthdays_between(start_month_day, 1231, fields) + await self._birthdays_between(101, end_month_day, fields)
+        return await self._birthdays_between(start_month_day, end_month_day, fields)
+
+    async def _birthdays_between(self, start_month_day, end_month_day, fields):
+        return (await self.session.execute(birthdays_statement(start_month_day, end_month_day, fields))).all()
+
+    async def get_by_id(self, id):
+        return await self.session.get(model.Contact, id)
+
+    async def get_fields_by_id(self, id, fields):
+        return (await self.session.execute(select(*contact_columns(fields)).where(model.Contact.id == id))).first()
+
+    async def get_last_updated_at(self, id):
+        return await self.session.scalar(select(model.Contact.last_updated_at).where(model.Contact.id == id))
+
+    async def get_by_email_address(self, email_address):
+        return await self.session.scalar(select(model.Contact).where(model.Contact.email_address == email_address).limit(1))
+
+    async def get_existing_email_addresses(self, email_addresses):
+        if not email_addresses:
+            return set()
+        statement = select(model.Contact.email_address).where(model.Contact.email_address.in_(email_addresses))
+        return set((await self.session.scalars(statement)).all())
+
+    async def upsert_many(self, contacts):
+        if not contacts:
+            return {"inserted": {}, "updated": {}, "unchanged": 0}
+
+        existing_emails = await self.get_existing_email_addresses({contact["email_address"] for contact in contacts})
+        rows = await self.session.execute(upsert_statement(self.session.bind.dialect.name, contacts))
+        return upsert_outcome(rows, existing_emails, len(contacts))
+
+    async def update(self, id, new_properties_dict):
+        current_record = await self.get_by_id(id)
+
+        for key, value in new_properties_dict.items():
+            setattr(current_record, key, value)
+        # Flushed here so the new last_updated_at is read back through RETURNING - lazy loads aren't possible under asyncio
+        await self.session.flush()
+        return current_record
+
+    async def delete_by_id(self, id):
+        selected_contact = await self.get_by_id(id)
+        await self.session.delete(selected_contact)
+
+    async def get_collection_version(self):
+        return await self.session.scalar(collection_version_statement()) or 0
+
+    async def bump_collection_version(self):
+        slot = random.randrange(model.COLLECTION_VERSION_SLOTS)
+        if (await self.session.execute(bump_collection_version_statement(slot))).rowcount == 0:
+            self.session.add(model.CollectionVersionSlot(name=model.Contact.__tablename__, slot=slot, version=1))
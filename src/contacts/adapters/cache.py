@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.contacts.adapters.repository import AbstractContactRepository
+from src.contacts.domain import model
+
+
+class ContactCache:
+    """Thread-safe LRU cache of contact records with a time-to-live, looked up by id or by email address
+
+    Every invalidation moves the cache on a generation. A fill passes the generation it saw before reading
+    the database, and is dropped if a write was invalidated in between - its record could be the one the
+    write replaced, and nothing would evict it again before its TTL ran out.
+    """
+
+    def __init__(self, max_size=1024, ttl=30.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._ids_by_email = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_fills = 0
+
+    def get_by_id(self, id):
+        with self._lock:
+            return self._get(id)
+
+    def get_by_email_address(self, email_address):
+        with self._lock:
+            return self._get(self._ids_by_email.get(email_address))
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def put(self, record, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.stale_fills += 1
+                return
+            self._remove(record["id"])
+            self._entries[record["id"]] = (self._clock() + self.ttl, record)
+            self._ids_by_email[record["email_address"]] = record["id"]
+            while len(self._entries) > self.max_size:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def invalidate(self, id):
+        with self._lock:
+            self._generation += 1
+            self._remove(id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._ids_by_email.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_fills": self.stale_fills
+            }
+
+    def _get(self, id):
+        entry = self._entries.get(id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, record = entry
+        if expires_at <= self._clock():
+            self._remove(id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(id)
+        self.hits += 1
+        return record
+
+    def _remove(self, id):
+        entry = self._entries.pop(id, None)
+        if entry is not None:
+            self._ids_by_email.pop(entry[1]["email_address"], None)
+
+
+def snapshot(contact):
+    return {column.key: getattr(contact, column.key) for column in model.Contact.__table__.columns}
+
+
+class CachedContactRepository(AbstractContactRepository):
+    """Read-through caching decorator for any AbstractContactRepository
+
+    Contacts changed through update, delete_by_id or upsert_many are only dropped from the cache
+    once the unit of work commits (apply_invalidations), so a rolled back change never evicts anything.
+    With fill=False misses are read through without being cached - for repositories on a replica, whose
+    rows may lag behind the primary the cache is invalidated by.
+
+    Fills carry the cache generation from when the repository was created, before its unit of work ran any
+    statement - so a write committed after the transaction's snapshot was taken always drops them.
+    """
+
+    def __init__(self, repository: AbstractContactRepository, cache: ContactCache, fill=True):
+        self.repository = repository
+        self.cache = cache
+        self.fill = fill
+        self._generation = cache.generation()
+        self._pending_invalidations = set()
+
+    def add(self, contact):
+        return self.repository.add(contact)
+
+    def add_many(self, contacts):
+        return self.repository.add_many(contacts)
+
+    def get_all(self):
+        return self.repository.get_all()
+
+    def get_all_rows(self, fields=None, filters=None, sort=None):
+        return self.repository.get_all_rows(fields, filters, sort)
+
+    def get_page(self, limit, after_id=None, fields=None, filters=None, sort=None, after_keys=None):
+        return self.repository.get_page(limit, after_id, fields, filters, sort, after_keys)
+
+    def iter_batches(self, batch_size, fields=None, filters=None, sort=None):
+        return self.repository.iter_batches(batch_size, fields, filters, sort)
+
+    def search(self, terms, limit, fields=None):
+        return self.repository.search(terms, limit, fields)
+
+    def get_birthdays_between(self, start_month_day, end_month_day, fields=None):
+        return self.repository.get_birthdays_between(start_month_day, end_month_day, fields)
+
+    def get_by_id(self, id):
+        record = self.cache.get_by_id(id)
+        if record is not None:
+            return model.Contact(**record)
+        return self._cache_contact(self.repository.get_by_id(id))
+
+    def get_fields_by_id(self, id, fields):
+        # A cached contact has every field; a miss reads just the projection, which is too partial to cache
+        record = self.cache.get_by_id(id)
+        if record is not None:
+            return model.Contact(**record)
+        return self.repository.get_fields_by_id(id, fields)
+
+    def get_by_email_address(self, email_address):
+        record = self.cache.get_by_email_address(email_address)
+        if record is not None:
+            return model.Contact(**record)
+        return self._cache_contact(self.repository.get_by_email_address(email_address))
+
+    def get_last_updated_at(self, id):
+        return self.repository.get_last_updated_at(id)
+
+    def get_existing_email_addresses(self, email_addresses):
+        return self.repository.get_existing_email_addresses(email_addresses)
+
+    def upsert_many(self, contacts):
+        outcome = self.repository.upsert_many(contacts)
+        self._pending_invalidations.update(outcome["updated"].values())
+        return outcome
+
+    def update(self, id, new_properties_dict):
+        self._pending_invalidations.add(id)
+        return self.repository.update(id, new_properties_dict)
+
+    def delete_by_id(self, id):
+        self._pending_invalidations.add(id)
+        return self.repository.delete_by_id(id)
+
+    def get_collection_version(self):
+        return self.repository.get_collection_version()
+
+    def bump_collection_version(self):
+        return self.repository.bump_collection_version()
+
+    def apply_invalidations(self):
+        for id in self._pending_invalidations:
+            self.cache.invalidate(id)
+        self._pending_invalidations.clear()
+
+    def discard_invalidations(self):
+        self._pending_invalidations.clear()
+
+    def _cache_contact(self, contact):
+        if contact is not None and self.fill:
+            self.cache.put(snapshot(contact), self._generation)
+        return contact
@@ -0,0 +1,135 @@
+"""In-process request metrics, rendered in the Prometheus text exposition format
+
+Every thread records into its own shard, so recording takes no lock and threads never contend. A
+scrape adds the shards up. The shards of threads that have exited are folded into one retired shard,
+whenever a new thread registers or a scrape runs, so a thread-per-request server doesn't accumulate them.
+"""
+import bisect
+import threading
+
+# Prometheus client's default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class _Shard:
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.counters = {}
+        # (name, labels) -> [count per bucket, with +Inf last, sum]
+        self.histograms = {}
+
+    def merge(self, other):
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, (bucket_counts, total) in list(other.histograms.items()):
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.histograms[key] = [list(bucket_counts), total]
+            else:
+                histogram[0] = [mine + theirs for mine, theirs in zip(histogram[0], bucket_counts)]
+                histogram[1] += total
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by metric name and a tuple of (label, value) pairs"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.descriptions = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = _Shard()
+
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+        histogram[1] += value
+
+    def collect(self):
+        """One shard holding the totals of every thread's shard"""
+        totals = _Shard()
+        with self._lock:
+            self._retire_exited_threads()
+            totals.merge(self._retired)
+            for shard in self._shards:
+                totals.merge(shard)
+        return totals
+
+    def render(self, gauges=()):
+        """Prometheus text format of every counter and histogram, followed by gauges - (name, labels, value) tuples"""
+        totals = self.collect()
+        # name -> [(labels, lines)], so each series' lines stay together and in order
+        series = {}
+        for (name, labels), value in totals.counters.items():
+            series.setdefault(name, []).append((labels, [f"{name}{format_labels(labels)} {format_value(value)}"]))
+        for (name, labels), (bucket_counts, total) in totals.histograms.items():
+            lines = []
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+            series.setdefault(name, []).append((labels, lines))
+        for name, labels, value in gauges:
+            series.setdefault(name, []).append((labels, [f"{name}{format_labels(labels)} {format_value(value)}"]))
+
+        output = []
+        for name in sorted(series):
+            if name in self.descriptions:
+                kind, help_text = self.descriptions[name]
+                output.append(f"# HELP {name} {help_text}")
+                output.append(f"# TYPE {name} {kind}")
+            for labels, lines in sorted(series[name], key=lambda labelled_lines: labelled_lines[0]):
+                output.extend(lines)
+        return '\n'.join(output) + '\n'
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._retire_exited_threads()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_exited_threads(self):
+        # An exited thread can't write to its shard again, so it is safe to fold in without a lock on the shard
+        live_shards = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live_shards.append(shard)
+            else:
+                self._retired.merge(shard)
+        self._shards = live_shards
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{label}="{escape_label_value(value)}"' for label, value in labels) + '}'
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,73 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+_current_stats = ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """Statement count and total database time for one request (or any other tracked block)
+
+    With statements=False only the totals are kept - telling repeated statements apart costs a repr of each one's parameters.
+    """
+
+    def __init__(self, parent=None, statements=True):
+        self.parent = parent
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter() if statements else None
+
+    def record(self, statement, parameters, duration):
+        self.count += 1
+        self.total_time += duration
+        if self.statements is not None:
+            self.statements[(statement, repr(parameters))] += 1
+        if self.parent is not None:
+            self.parent.record(statement, parameters, duration)
+
+    def duplicates(self):
+        """Statements that were sent more than once with identical parameters"""
+        if self.statements is None:
+            return []
+        return [(statement, parameters, count) for (statement, parameters), count in self.statements.items() if count > 1]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context - a statement that fails never reaches after_cursor_execute,
+    # and its start time is dropped along with the context rather than left on the connection
+    context.query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context.query_start_time
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, parameters, duration)
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def start_tracking(statements=True):
+    stats = QueryStats(parent=_current_stats.get(), statements=statements)
+    _current_stats.set(stats)
+    return stats
+
+
+def stop_tracking(stats):
+    _current_stats.set(stats.parent)
+
+
+@contextmanager
+def track_queries():
+    stats = start_tracking()
+    try:
+        yield stats
+    finally:
+        stop_tracking(stats)
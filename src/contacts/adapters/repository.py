@@ -1,5 +1,12 @@
 from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
 import datetime
+from itertools import islice
+import random
+import re
+import sys
+from sqlalchemy import and_, column, func, insert, literal_column, or_, select, table, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from src.contacts.domain import model
@@ -11,18 +18,58 @@ class AbstractContactRepository(ABC):
     def add(self, contact: model.Contact):
         raise NotImplementedError
 
+    @abstractmethod
+    def add_many(self, contacts):
+        raise NotImplementedError
+
     @abstractmethod
     def get_all(self):
         raise NotImplementedError
     
+    @abstractmethod
+    def get_all_rows(self, fields=None, filters=None, sort=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_page(self, limit, after_id=None, fields=None, filters=None, sort=None, after_keys=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_batches(self, batch_size, fields=None, filters=None, sort=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, terms, limit, fields=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_birthdays_between(self, start_month_day, end_month_day, fields=None):
+        raise NotImplementedError
+
     @abstractmethod
     def get_by_id(self, _id: int):
         raise NotImplementedError
+
+    @abstractmethod
+    def get_fields_by_id(self, id, fields):
+        raise NotImplementedError
     
+    @abstractmethod
+    def get_last_updated_at(self, id):
+        raise NotImplementedError
+
     @abstractmethod
     def get_by_email_address(self, email_address):
         raise NotImplementedError
     
+    @abstractmethod
+    def get_existing_email_addresses(self, email_addresses):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_many(self, contacts):
+        raise NotImplementedError
+
     @abstractmethod
     def update(self, id, new_properties_dict):
         raise NotImplementedError
@@ -31,6 +78,14 @@ class AbstractContactRepository(ABC):
     def delete_by_id(self, id):
         raise NotImplementedError
 
+    @abstractmethod
+    def get_collection_version(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def bump_collection_version(self):
+        raise NotImplementedError
+
 
 class SqlAlchemyContactRepository(AbstractContactRepository):
     """SQLAlchemy implementation of AbstractContactRepository (for production)"""
@@ -39,98 +94,521 @@ class SqlAlchemyContactRepository(AbstractContactRepository):
         self.session = session
 
     def add(self, contact):
+        # Flushing straight away sends INSERT ... RETURNING, so id and the timestamps are populated without a read-back
         self.session.add(contact)
+        self.session.flush()
+        return contact
+
+    def add_many(self, contacts):
+        # Unordered RETURNING lets SQLAlchemy batch every row into one multi-row INSERT,
+        # so callers should match the returned contacts back up by email address
+        rows = [{field: getattr(contact, field) for field in model.CONTACT_FIELDS} for contact in contacts]
+        return self.session.scalars(insert(model.Contact).returning(model.Contact), rows).all()
 
     def get_all(self):
         return self.session.query(model.Contact).all()
 
+    def get_page(self, limit, after_id=None, fields=None, filters=None, sort=None, after_keys=None):
+        statement = page_statement(limit, after_id, fields, filters, sort, after_keys)
+        if fields is None:
+            return self.session.scalars(statement).all()
+        return self.session.execute(statement).all()
+
+    def get_all_rows(self, fields=None, filters=None, sort=None):
+        # Plain column rows skip building ORM instances and registering them in the identity map
+        return self.session.execute(all_rows_statement(fields, filters, sort)).all()
+
+    def iter_batches(self, batch_size, fields=None, filters=None, sort=None):
+        # yield_per switches on a server-side cursor, so only one batch of rows is held at a time
+        statement = all_rows_statement(fields, filters, sort, always_sorted=True).execution_options(yield_per=batch_size)
+        for batch in self.session.execute(statement).partitions():
+            yield batch
+
+    def search(self, terms, limit, fields=None):
+        """Best matching contacts for a list of search terms, each matched as a word prefix"""
+        return self.session.execute(search_statement(self.session.get_bind().dialect.name, terms, limit, fields)).all()
+
+    def get_birthdays_between(self, start_month_day, end_month_day, fields=None):
+        """Contacts whose birthday falls between two month_day values, in calendar order from the start
+
+        A range running over the new year is read as two range scans, as an OR of both would not use the index.
+        """
+        if start_month_day > end_month_day:
+            return self._birthdays_between(start_month_day, 1231, fields) + self._birthdays_between(101, end_month_day, fields)
+        return self._birthdays_between(start_month_day, end_month_day, fields)
+
+    def _birthdays_between(self, start_month_day, end_month_day, fields):
+        return self.session.execute(birthdays_statement(start_month_day, end_month_day, fields)).all()
+
     def get_by_id(self, id):
-        return self.session.query(model.Contact).filter_by(id=id).first()
+        # Session.get checks the identity map first, so repeat lookups within a unit of work don't hit the database
+        return self.session.get(model.Contact, id)
+
+    def get_fields_by_id(self, id, fields):
+        return self.session.execute(select(*contact_columns(fields)).where(model.Contact.id == id)).first()
     
+    def get_last_updated_at(self, id):
+        return self.session.query(model.Contact.last_updated_at).filter_by(id=id).scalar()
+
     def get_by_email_address(self, email_address):
         return self.session.query(model.Contact).filter_by(email_address=email_address).first()
+
+    def get_existing_email_addresses(self, email_addresses):
+        if not email_addresses:
+            return set()
+        query = self.session.query(model.Contact.email_address).filter(model.Contact.email_address.in_(email_addresses))
+        return {row.email_address for row in query}
+
+    def upsert_many(self, contacts):
+        if not contacts:
+            return {"inserted": {}, "updated": {}, "unchanged": 0}
+
+        existing_emails = self.get_existing_email_addresses({contact["email_address"] for contact in contacts})
+        rows = self.session.execute(upsert_statement(self.session.get_bind().dialect.name, contacts))
+        return upsert_outcome(rows, existing_emails, len(contacts))
     
     def update(self, id, new_properties_dict):
         current_record = self.get_by_id(id)
 
         for key, value in new_properties_dict.items():
             setattr(current_record, key, value)
+        # Flushed here so the new last_updated_at is read back through RETURNING, rather than by a query after the commit
+        self.session.flush()
+        return current_record
 
     def delete_by_id(self, id):
         selected_contact = self.get_by_id(id)
         self.session.delete(selected_contact)
 
+    def get_collection_version(self):
+        return self.session.scalar(collection_version_statement()) or 0
+
+    def bump_collection_version(self):
+        slot = random.randrange(model.COLLECTION_VERSION_SLOTS)
+        if self.session.execute(bump_collection_version_statement(slot)).rowcount == 0:
+            self.session.add(model.CollectionVersionSlot(name=model.Contact.__tablename__, slot=slot, version=1))
+
+
+# Statements shared by the synchronous and asyncio repositories
+
+def page_statement(limit, after_id=None, fields=None, filters=None, sort=None, after_keys=None):
+    if fields is None:
+        statement = select(model.Contact)
+    else:
+        statement = select(*contact_columns(fields, sort))
+    statement = filter_and_sort(statement, filters, sort)
+    if after_id is not None:
+        statement = statement.where(keyset_predicate(sort, after_id, after_keys))
+    return statement.limit(limit)
+
+
+def all_rows_statement(fields=None, filters=None, sort=None, always_sorted=False):
+    statement = select(*contact_columns(fields))
+    if filters or sort or always_sorted:
+        statement = filter_and_sort(statement, filters, sort)
+    return statement
+
+
+def search_statement(dialect_name, terms, limit, fields=None):
+    columns = contact_columns(fields)
+    if dialect_name == 'postgresql':
+        document = literal_column(model.CONTACT_SEARCH_DOCUMENT)
+        query = func.to_tsquery('simple', ' & '.join(f"{term}:*" for term in terms))
+        statement = (select(*columns)
+                     .where(document.bool_op('@@')(query))
+                     .order_by(func.ts_rank(document, query).desc(), model.Contact.id))
+    else:
+        contact_search = table('contact_search', column('rowid'), column('rank'))
+        query = ' '.join(f'"{term}"*' for term in terms)
+        statement = (select(*columns)
+                     .join_from(contact_search, model.Contact.__table__, contact_search.c.rowid == model.Contact.id)
+                     .where(literal_column('contact_search').op('MATCH')(query))
+                     .order_by(contact_search.c.rank, model.Contact.id))
+    return statement.limit(limit)
+
+
+def birthdays_statement(start_month_day, end_month_day, fields=None):
+    birthday = model.month_day(model.Contact.birthday)
+    return (select(*contact_columns(fields))
+            .where(birthday.between(start_month_day, end_month_day))
+            .order_by(birthday, model.Contact.id))
+
+
+def upsert_statement(dialect_name, contacts):
+    # Imported here - loading the PostgreSQL dialect costs startup time on deployments that never upsert
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(model.Contact).values(contacts)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[model.Contact.email_address],
+        set_={**{field: excluded[field] for field in model.CONTACT_FIELDS}, "last_updated_at": model.precise_now()},
+        # Rows whose fields all match are left alone, so they keep their last_updated_at and aren't returned
+        where=or_(*(model.Contact.__table__.c[field] != excluded[field] for field in model.CONTACT_FIELDS))
+    ).returning(model.Contact.id, model.Contact.email_address)
+
+
+def upsert_outcome(rows, existing_emails, contact_count):
+    """Sort the (id, email_address) rows returned by an upsert into inserted and updated contacts"""
+    outcome = {"inserted": {}, "updated": {}, "unchanged": contact_count}
+    for row in rows:
+        status = "updated" if row.email_address in existing_emails else "inserted"
+        outcome[status][row.email_address] = row.id
+        outcome["unchanged"] -= 1
+    return outcome
+
+
+def collection_version_statement():
+    # A primary key range over a fixed number of slots, however many contacts there are
+    return (select(func.sum(model.CollectionVersionSlot.version))
+            .where(model.CollectionVersionSlot.name == model.Contact.__tablename__))
 
 
-def find_index(full_list, key, value):
-    for i, dictionary in enumerate(full_list):
-            if dictionary[key] == value:
-                return i
-    raise ValueError
+def bump_collection_version_statement(slot):
+    """Add one to a slot of the contact collection version
 
-class MockContactRepository(AbstractContactRepository):
-    """Mock SQLAlchemy implementation of AbstractContactRepository - for (unit) testing"""
+    Bumped in the writer's own transaction, so the version changes exactly when the write becomes visible -
+    unlike a timestamp, which is taken before the commit and can land behind one already read.
+    """
+    return (update(model.CollectionVersionSlot)
+            .where(model.CollectionVersionSlot.name == model.Contact.__tablename__, model.CollectionVersionSlot.slot == slot)
+            .values(version=model.CollectionVersionSlot.version + 1))
+
+
+def contact_columns(fields=None, sort=None):
+    """Columns to select for a projection of contact fields - id and any sort fields are always included, as paging and ETags rely on them"""
+    columns = model.Contact.__table__.c
+    if fields is None:
+        return list(columns)
+    selected_fields = ["id"]
+    for field in (*fields, *(sort_field(term) for term in sort or ())):
+        if field not in selected_fields:
+            selected_fields.append(field)
+    return [columns[field] for field in selected_fields]
+
+
+def sort_field(term):
+    """Field name of a sort term - a leading "-" marks a descending sort"""
+    return term.lstrip("-")
+
+
+def sort_terms(sort):
+    """(field, descending) pairs for a sort, always ending with the ascending id tiebreaker"""
+    return [(sort_field(term), term.startswith("-")) for term in sort or ()] + [("id", False)]
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix, or None when there is no such string
+
+    The last character is incremented - trailing U+10FFFF characters can't be, so they are dropped first.
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def filter_predicates(filters):
+    columns = model.Contact.__table__.c
+    predicates = []
+    for name, value in (filters or {}).items():
+        if name in ("first_name", "last_name"):
+            predicates.append(columns[name] == value)
+        elif name in ("first_name_prefix", "last_name_prefix"):
+            column = columns[name[:-len("_prefix")]]
+            # The range lets the planner seek the index whatever the column's collation; LIKE then keeps the match exact
+            upper_bound = prefix_upper_bound(value)
+            range_predicates = [column >= value] if upper_bound is None else [column >= value, column < upper_bound]
+            predicates.append(and_(*range_predicates, column.startswith(value, autoescape=True)))
+        elif name == "email_domain":
+            predicates.append(columns.email_address.endswith("@" + value, autoescape=True))
+        elif name == "birthday_from":
+            predicates.append(columns.birthday >= value)
+        elif name == "birthday_to":
+            predicates.append(columns.birthday <= value)
+        elif name == "created_after":
+            predicates.append(columns.created_at > value)
+    return predicates
+
+
+def filter_and_sort(statement, filters, sort):
+    columns = model.Contact.__table__.c
+    ordering = [columns[field].desc() if descending else columns[field] for field, descending in sort_terms(sort)]
+    return statement.where(*filter_predicates(filters)).order_by(*ordering)
+
+
+def keyset_predicate(sort, after_id, after_keys):
+    """Rows that come after (after_keys..., after_id) in the given sort order
+
+    When every term sorts the same way (only ever ascending, as the id tiebreaker is) this is a row value
+    comparison. Otherwise it is written out as (a > x) OR (a = x AND b > y) OR ..., so ascending and
+    descending terms can be mixed, and ANDed with a bound on the first sort column - without it the planner
+    can't seek the index and scans every earlier row.
+    """
+    columns = model.Contact.__table__.c
+    terms = sort_terms(sort)
+    values = [*(after_keys or ()), after_id]
+    if not any(descending for _, descending in terms):
+        return tuple_(*(columns[field] for field, _ in terms)) > tuple_(*values)
+
+    alternatives = []
+    for position, (field, descending) in enumerate(terms):
+        equal_prefix = [columns[earlier_field] == earlier_value for (earlier_field, _), earlier_value in zip(terms[:position], values)]
+        column = columns[field]
+        alternatives.append(and_(*equal_prefix, column < values[position] if descending else column > values[position]))
+    first_field, first_descending = terms[0]
+    leading_bound = columns[first_field] <= values[0] if first_descending else columns[first_field] >= values[0]
+    return and_(leading_bound, or_(*alternatives))
+
+
+def search_terms(text):
+    """Words of a search query, lower-cased - punctuation is dropped, so the terms are safe to embed in either dialect's query syntax"""
+    return [term.lower() for term in re.findall(r"[^\W_]+", text)]
+
+
+def contact_matches(contact, filters):
+    """Python counterpart of filter_predicates for contacts held in memory"""
+    for name, value in (filters or {}).items():
+        if name in ("first_name", "last_name") and getattr(contact, name) != value:
+            return False
+        if name in ("first_name_prefix", "last_name_prefix") and not getattr(contact, name[:-len("_prefix")]).startswith(value):
+            return False
+        if name == "email_domain" and not contact.email_address.endswith("@" + value):
+            return False
+        if name == "birthday_from" and contact.birthday < value:
+            return False
+        if name == "birthday_to" and contact.birthday > value:
+            return False
+        if name == "created_after" and contact.created_at <= value:
+            return False
+    return True
+
+
+def sort_contacts(contacts, sort):
+    # Stable sorts applied from the last term to the first give a mixed ascending/descending order
+    for field, descending in reversed(sort_terms(sort)):
+        contacts = sorted(contacts, key=lambda contact: getattr(contact, field), reverse=descending)
+    return contacts
+
+
+def comes_after(contact, sort, after_id, after_keys):
+    """Python counterpart of keyset_predicate"""
+    for (field, descending), value in zip(sort_terms(sort), [*(after_keys or ()), after_id]):
+        current_value = getattr(contact, field)
+        if current_value != value:
+            return current_value < value if descending else current_value > value
+    return False
+
+
+def utc_now():
+    """The current time as naive UTC, the way precise_now stamps contacts in the database"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def as_date(value):
+    """A birthday as a date - services and clients may hand them over as ISO strings"""
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def first_position_after(ordered, sort, after_id, after_keys):
+    """Position of the first contact of an ordered list that comes after the keyset position, by binary search"""
+    low, high = 0, len(ordered)
+    while low < high:
+        middle = (low + high) // 2
+        if comes_after(ordered[middle], sort, after_id, after_keys):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class ContactRecord:
+    """Compact record of one contact held by InMemoryContactRepository
+
+    Records are never changed once stored - an update stores a new record - so the ones handed out stay
+    consistent snapshots. They have the attributes of model.Contact, which is all the services and
+    serializers rely on.
+    """
+    __slots__ = ("id", "first_name", "last_name", "birthday", "email_address", "created_at", "last_updated_at")
+
+    def __init__(self, id, first_name, last_name, birthday, email_address, created_at, last_updated_at):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.birthday = birthday
+        self.email_address = email_address
+        self.created_at = created_at
+        self.last_updated_at = last_updated_at
+
+    def replace(self, **changes):
+        return ContactRecord(**{field: changes.get(field, getattr(self, field)) for field in self.__slots__})
+
+
+class InMemoryContactRepository(AbstractContactRepository):
+    """In-memory implementation of AbstractContactRepository - for unit tests and as a local read tier
+
+    Contacts are held in a dict by id, with a dict from email address to id and a sorted list of ids,
+    so lookups are O(1) and id-ordered pages start with a binary search. Each sort order asked for is
+    built once and kept until the next write, so later pages of a sorted listing also seek rather than scan.
+    Filters, search and birthdays scan the contacts.
+
+    Like the unit of work it is used with, it isn't transactional, and writes aren't synchronised with
+    concurrent reads.
+    """
 
     def __init__(self):
-        self._data_source = []
+        self._contacts = {}
+        self._ids_by_email = {}
+        self._ids = []
+        self._next_id = 1
+        self._orderings = {}
+        self._collection_version = 0
 
     def add(self, contact):
-        new_contact = model.Contact.dict(contact)
-        new_contact['id'] = len(self._data_source) + 1
-        new_contact['created_at'] = datetime.datetime.now()
-        self._data_source.append(new_contact)
-        return contact
-    
+        if contact.email_address in self._ids_by_email:
+            raise IntegrityError('INSERT INTO contact', model.Contact.dict(contact), Exception('UNIQUE constraint failed: contact.email_address'))
+        now = utc_now()
+        record = ContactRecord(self._next_id, contact.first_name, contact.last_name, as_date(contact.birthday), contact.email_address, now, now)
+        self._next_id += 1
+        self._store(record)
+        self._ids.append(record.id)
+        return record
+
+    def add_many(self, contacts):
+        # All or nothing, as the single INSERT of the SQL repository is
+        email_addresses = [contact.email_address for contact in contacts]
+        duplicates = set(self.get_existing_email_addresses(email_addresses))
+        if duplicates or len(set(email_addresses)) != len(email_addresses):
+            raise IntegrityError('INSERT INTO contact', email_addresses, Exception('UNIQUE constraint failed: contact.email_address'))
+        return [self.add(contact) for contact in contacts]
+
     def get_all(self):
-        all_contacts = self._data_source
-        for contact in all_contacts:
-            contact["birthday"] = datetime.date.fromisoformat(contact["birthday"])
+        return list(self._contacts.values())
+
+    def get_all_rows(self, fields=None, filters=None, sort=None):
+        return self._matching(self._scan(sort), filters, None)
+
+    def get_page(self, limit, after_id=None, fields=None, filters=None, sort=None, after_keys=None):
+        return self._matching(self._scan(sort, after_id, after_keys), filters, limit)
+
+    def iter_batches(self, batch_size, fields=None, filters=None, sort=None):
+        contacts = self._scan(sort)
+        if filters:
+            contacts = (contact for contact in contacts if contact_matches(contact, filters))
+        while True:
+            batch = list(islice(contacts, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def search(self, terms, limit, fields=None):
+        matches = []
+        for contact in self._contacts.values():
+            words = search_terms(f"{contact.first_name} {contact.last_name} {contact.email_address}")
+            if all(any(word.startswith(term) for word in words) for term in terms):
+                matches.append(contact)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def get_birthdays_between(self, start_month_day, end_month_day, fields=None):
+        def month_day(contact):
+            return contact.birthday.month * 100 + contact.birthday.day
+
+        def in_range(value):
+            if start_month_day > end_month_day:
+                return value >= start_month_day or value <= end_month_day
+            return start_month_day <= value <= end_month_day
+
+        matches = [contact for contact in self._contacts.values() if in_range(month_day(contact))]
+        return sorted(matches, key=lambda contact: (month_day(contact) < start_month_day, month_day(contact), contact.id))
 
-        return all_contacts
-    
     def get_by_id(self, id):
-        selected_contact = [contact for contact in self._data_source if contact.get("id") == id]
-        if selected_contact:
-            retrieved_contact = selected_contact[0]
-            original_contact = selected_contact[0]
-            if type(retrieved_contact["birthday"]) != datetime.date:
-                retrieved_contact["birthday"] = datetime.datetime.strptime(retrieved_contact["birthday"], "%Y-%m-%d")
-            retrieved_contact = model.Contact(**retrieved_contact)
-            current_contact_index = find_index(self._data_source, 'id', id)
-            original_contact["birthday"] = original_contact["birthday"].strftime("%Y-%m-%d")
-            self._data_source[current_contact_index] = original_contact
-            return retrieved_contact
-        return None            
-    
+        return self._contacts.get(id)
+
+    def get_fields_by_id(self, id, fields):
+        # Whole records carry every field, so the projection is left to the serializer
+        return self._contacts.get(id)
+
+    def get_last_updated_at(self, id):
+        contact = self._contacts.get(id)
+        return contact.last_updated_at if contact is not None else None
+
     def get_by_email_address(self, email_address):
-        selected_contact = [contact for contact in self._data_source if contact.get("email_address") == email_address]
-        if len(selected_contact) > 0:
-            retrieved_contact = selected_contact[0]
-            original_contact = selected_contact[0]
-            retrieved_contact["birthday"] = datetime.datetime.strptime(retrieved_contact["birthday"], "%Y-%m-%d")
-            retrieved_contact = model.Contact(**retrieved_contact)
-            current_contact_index = find_index(self._data_source, 'email_address', email_address)
-            original_contact["birthday"] = original_contact["birthday"].strftime("%Y-%m-%d")
-            self._data_source[current_contact_index] = original_contact
-            return retrieved_contact
-        return None            
+        id = self._ids_by_email.get(email_address)
+        return self._contacts[id] if id is not None else None
 
-    def delete_by_id(self, id):
-        for contact in self._data_source:
-            if contact['id'] == id:
-                self._data_source.remove(contact)
-                break
+    def get_existing_email_addresses(self, email_addresses):
+        return {email_address for email_address in email_addresses if email_address in self._ids_by_email}
+
+    def upsert_many(self, contacts):
+        outcome = {"inserted": {}, "updated": {}, "unchanged": 0}
+        for contact in contacts:
+            values = {**{field: contact[field] for field in model.CONTACT_FIELDS}, "birthday": as_date(contact["birthday"])}
+            existing_contact = self.get_by_email_address(values["email_address"])
+            if existing_contact is None:
+                outcome["inserted"][values["email_address"]] = self.add(model.Contact(**values)).id
+            elif all(getattr(existing_contact, field) == value for field, value in values.items()):
+                outcome["unchanged"] += 1
+            else:
+                self._store(existing_contact.replace(**values, last_updated_at=utc_now()))
+                outcome["updated"][values["email_address"]] = existing_contact.id
+        return outcome
 
     def update(self, id, new_properties_dict):
-        current_record = self.get_by_id(id)
-        current_record = vars(current_record)
+        current_record = self._contacts[id]
+        changes = {key: value for key, value in new_properties_dict.items() if key in model.CONTACT_FIELDS}
+        if "birthday" in changes:
+            changes["birthday"] = as_date(changes["birthday"])
+        new_email_address = changes.get("email_address", current_record.email_address)
+        if self._ids_by_email.get(new_email_address, id) != id:
+            raise IntegrityError('UPDATE contact', changes, Exception('UNIQUE constraint failed: contact.email_address'))
+        if new_email_address != current_record.email_address:
+            del self._ids_by_email[current_record.email_address]
+        updated_record = current_record.replace(**changes, last_updated_at=utc_now())
+        self._store(updated_record)
+        return updated_record
 
-        for key, value in new_properties_dict.items():
-            current_record[key] = value
+    def delete_by_id(self, id):
+        contact = self._contacts.pop(id, None)
+        if contact is None:
+            return
+        del self._ids_by_email[contact.email_address]
+        del self._ids[bisect_left(self._ids, id)]
+        self._orderings.clear()
+
+    def get_collection_version(self):
+        return self._collection_version
+
+    def bump_collection_version(self):
+        self._collection_version += 1
+
+    def _store(self, record):
+        self._contacts[record.id] = record
+        self._ids_by_email[record.email_address] = record.id
+        self._orderings.clear()
+
+    def _scan(self, sort, after_id=None, after_keys=None):
+        """Contacts in sort order, from just after the keyset position when one is given"""
+        if sort:
+            sort = tuple(sort)
+            ordered = self._orderings.get(sort)
+            if ordered is None:
+                ordered = self._orderings[sort] = sort_contacts(list(self._contacts.values()), sort)
+            start = 0 if after_id is None else first_position_after(ordered, sort, after_id, after_keys)
+            return (ordered[position] for position in range(start, len(ordered)))
+        ids, contacts = self._ids, self._contacts
+        start = 0 if after_id is None else bisect_right(ids, after_id)
+        return (contacts[ids[position]] for position in range(start, len(ids)))
 
-        current_record.pop('_sa_instance_state', None)
+    @staticmethod
+    def _matching(contacts, filters, limit):
+        if filters:
+            contacts = (contact for contact in contacts if contact_matches(contact, filters))
+        return list(islice(contacts, limit))
 
-        current_contact_index = find_index(self._data_source, 'id', id)
 
-        self._data_source[current_contact_index] = current_record
-        
\ No newline at end of file
+# Earlier name of InMemoryContactRepository, which replaced the list-backed mock
+MockContactRepository = InMemoryContactRepository
@@ -0,0 +1,138 @@
+import re
+import sys
+import threading
+from array import array
+from functools import lru_cache
+
+# Prefixes up to this length are indexed as they are; longer query terms are narrowed down with trigrams
+PREFIX_LENGTH = 3
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def words(text):
+    """Lower-cased words of a text - email addresses are split into their parts"""
+    return WORD_PATTERN.findall(text.lower())
+
+
+@lru_cache(maxsize=65536)
+def word_grams(word):
+    """Posting list keys for a word - its short prefixes (marked with "^") and its trigrams after the first
+
+    A word starting with some term is filed under every key of that term too, so the same function
+    gives the posting lists a query term has to be looked up in. Names and email domains repeat a lot,
+    hence the cache.
+    """
+    grams = {sys.intern("^" + word[:length]) for length in range(1, min(len(word), PREFIX_LENGTH) + 1)}
+    grams.update(sys.intern(word[start:start + 3]) for start in range(1, len(word) - 2))
+    return frozenset(grams)
+
+
+class TypeaheadIndex:
+    """In-memory prefix and trigram index of contact names and email addresses, for autocomplete
+
+    Each posting list is an array of unsigned ints holding contact ids. Removing or changing a contact
+    only drops its entry - stale ids are skipped when candidates are checked against the live entries,
+    and the posting lists are rebuilt once stale ids make up half of them.
+
+    The index only sees writes made through this process, so it should be enabled with a single worker
+    process or be accepted to lag behind writes made by the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._postings = {}
+        self._posting_count = 0
+        self._stale_postings = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, contacts):
+        """Index every contact of an iterable of rows or contacts, e.g. the batches of a streaming scan"""
+        with self._lock:
+            for contact in contacts:
+                self._add(contact.id, contact.first_name, contact.last_name, contact.email_address)
+
+    def add(self, id, first_name, last_name, email_address):
+        with self._lock:
+            self._remove(id)
+            self._add(id, first_name, last_name, email_address)
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self._posting_count = 0
+            self._stale_postings = 0
+
+    def search(self, query, limit=10):
+        """Contacts with a word starting with each term of the query, in the order they were indexed"""
+        terms = words(query)
+        if not terms:
+            return []
+        with self._lock:
+            posting_lists = []
+            for term in terms:
+                for gram in word_grams(term):
+                    posting_list = self._postings.get(gram)
+                    if posting_list is None:
+                        return []
+                    posting_lists.append(posting_list)
+            # Every match is in every posting list, so walking the shortest one is enough. Its ids are
+            # checked against the live entries, which drops stale ids and trigrams found mid-word.
+            seen = set()
+            suggestions = []
+            for id in min(posting_lists, key=len):
+                entry = self._entries.get(id)
+                if entry is None or id in seen:
+                    continue
+                seen.add(id)
+                if all(any(word.startswith(term) for word in entry[3]) for term in terms):
+                    suggestions.append({"id": id, "first_name": entry[0], "last_name": entry[1], "email_address": entry[2]})
+                    if len(suggestions) == limit:
+                        break
+        return suggestions
+
+    def stats(self):
+        with self._lock:
+            return {
+                "contacts": len(self._entries),
+                "posting_lists": len(self._postings),
+                "postings": self._posting_count,
+                "stale_postings": self._stale_postings
+            }
+
+    def _add(self, id, first_name, last_name, email_address):
+        # Interning shares one copy of common names and words between every contact and posting list key
+        contact_words = tuple({sys.intern(word) for word in words(f"{first_name} {last_name} {email_address}")})
+        self._entries[id] = (sys.intern(first_name), sys.intern(last_name), email_address, contact_words)
+        grams = frozenset().union(*map(word_grams, contact_words))
+        postings = self._postings
+        for gram in grams:
+            try:
+                postings[gram].append(id)
+            except KeyError:
+                postings[gram] = array('I', (id,))
+        self._posting_count += len(grams)
+
+    def _remove(self, id):
+        entry = self._entries.pop(id, None)
+        if entry is None:
+            return
+        self._stale_postings += len({gram for word in entry[3] for gram in word_grams(word)})
+        if self._stale_postings * 2 > self._posting_count:
+            self._compact()
+
+    def _compact(self):
+        entries = self._entries
+        self._entries = {}
+        self._postings = {}
+        self._posting_count = 0
+        self._stale_postings = 0
+        for id, (first_name, last_name, email_address, _) in entries.items():
+            self._add(id, first_name, last_name, email_address)
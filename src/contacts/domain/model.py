@@ -1,22 +1,86 @@
 from __future__ import annotations
+import warnings
 
 from sqlalchemy import func
-from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, String, Date
+from sqlalchemy import Column, Integer, DateTime, String, Date, Index, event, inspect, select
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql.functions import FunctionElement
 
 Base = declarative_base()
 
+
+class precise_now(FunctionElement):
+    """The database's current timestamp as naive UTC, with sub-second precision on every dialect"""
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(precise_now)
+def compile_precise_now(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(precise_now, "postgresql")
+def compile_precise_now_postgresql(element, compiler, **kw):
+    # CURRENT_TIMESTAMP is in the session's time zone - contacts are stamped in UTC, as on SQLite and in memory
+    return "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"
+
+
+@compiles(precise_now, "sqlite")
+def compile_precise_now_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP only has whole seconds on SQLite, which would let two updates share a last_updated_at.
+    # %f only has milliseconds, so it is padded to the six digits SQLAlchemy uses for datetime parameters,
+    # keeping stored timestamps comparable with the values filters and cursors bind.
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+class month_day(FunctionElement):
+    """A date's month and day as one number, e.g. 1231 for 31 December - comparable across years"""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(month_day)
+def compile_month_day(element, compiler, **kw):
+    # Constants are written out rather than bound, so queries match the expression index exactly
+    value = compiler.process(element.clauses, **kw)
+    return f"(CAST(EXTRACT(MONTH FROM {value}) AS INTEGER) * 100 + CAST(EXTRACT(DAY FROM {value}) AS INTEGER))"
+
+
+@compiles(month_day, "sqlite")
+def compile_month_day_sqlite(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return f"(CAST(STRFTIME('%m', {value}) AS INTEGER) * 100 + CAST(STRFTIME('%d', {value}) AS INTEGER))"
+
+
+# Fields supplied by API clients - everything else is generated by the database
+CONTACT_FIELDS = ("first_name", "last_name", "birthday", "email_address")
+
 class Contact(Base):
     __tablename__ = "contact"
+    __table_args__ = (
+        Index("ix_contact_email_address", "email_address", unique=True),
+        # Filters and sorts offered by GET /contacts - id is the keyset tiebreaker, so it closes every index
+        Index("ix_contact_last_name_first_name", "last_name", "first_name", "id"),
+        Index("ix_contact_first_name", "first_name", "id"),
+        Index("ix_contact_birthday", "birthday", "id"),
+        Index("ix_contact_created_at", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     first_name = Column(String(255), nullable=False)
     last_name = Column(String(255), nullable=False)
     birthday = Column(Date, nullable=False)
     email_address = Column(String(255), nullable=False)
-    created_at = Column(DateTime, nullable=False, default=datetime.now())
-    last_updated_at = Column(DateTime, nullable=False, default=datetime.now(),onupdate=func.now())
+    # Timestamps are generated by the database; the INSERT also renders now() itself for tables
+    # created before the DDL defaults existed. eager_defaults reads them back through RETURNING.
+    created_at = Column(DateTime, nullable=False, default=precise_now(), server_default=func.now())
+    last_updated_at = Column(DateTime, nullable=False, default=precise_now(), server_default=func.now(), onupdate=precise_now())
+
+    __mapper_args__ = {"eager_defaults": True}
 
     def __repr__(self):
         return f'id: {self.id}, \
@@ -34,4 +98,115 @@ class Contact(Base):
             "birthday": self.birthday,
             "email_address": self.email_address,
             "created_at": self.created_at
-        }
\ No newline at end of file
+        }
+
+
+# Upcoming birthdays are a range over month and day, whatever the year of birth
+Index("ix_contact_birthday_month_day", month_day(Contact.birthday), Contact.id)
+
+
+# Rows of each collection's version counter - writers bump one chosen at random, so concurrent writers rarely wait on the same row
+COLLECTION_VERSION_SLOTS = 16
+
+
+class CollectionVersionSlot(Base):
+    """One slot of a counter bumped in the same transaction as every write to a table - the slots add up to that collection's ETag version"""
+    __tablename__ = "collection_version_slot"
+
+    name = Column(String(64), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+@event.listens_for(CollectionVersionSlot.__table__, "after_create")
+def seed_collection_version_slots(target, connection, **kw):
+    # Seeding the rows up front means writers only ever UPDATE them and never race to insert them
+    connection.execute(target.insert(), [{"name": Contact.__tablename__, "slot": slot, "version": 0} for slot in range(COLLECTION_VERSION_SLOTS)])
+
+
+# Full-text search over names and email addresses. Email addresses are split on "@" and "." so their parts
+# can be searched for on their own. The PostgreSQL query must repeat this expression exactly to use the index.
+CONTACT_SEARCH_DOCUMENT = "to_tsvector('simple', first_name || ' ' || last_name || ' ' || translate(email_address, '@.', '  '))"
+
+SEARCH_INDEX_DDL = {
+    "postgresql": [
+        f"CREATE INDEX IF NOT EXISTS ix_contact_search ON contact USING GIN ({CONTACT_SEARCH_DOCUMENT})",
+    ],
+    "sqlite": [
+        # An external content FTS5 table stores only the index - the text itself stays in contact
+        "CREATE VIRTUAL TABLE IF NOT EXISTS contact_search USING fts5("
+        "first_name, last_name, email_address, content='contact', content_rowid='id', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS contact_search_insert AFTER INSERT ON contact BEGIN "
+        "INSERT INTO contact_search(rowid, first_name, last_name, email_address) VALUES (new.id, new.first_name, new.last_name, new.email_address); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS contact_search_delete AFTER DELETE ON contact BEGIN "
+        "INSERT INTO contact_search(contact_search, rowid, first_name, last_name, email_address) VALUES ('delete', old.id, old.first_name, old.last_name, old.email_address); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS contact_search_update AFTER UPDATE OF first_name, last_name, email_address ON contact BEGIN "
+        "INSERT INTO contact_search(contact_search, rowid, first_name, last_name, email_address) VALUES ('delete', old.id, old.first_name, old.last_name, old.email_address); "
+        "INSERT INTO contact_search(rowid, first_name, last_name, email_address) VALUES (new.id, new.first_name, new.last_name, new.email_address); "
+        "END",
+    ],
+}
+
+
+@event.listens_for(Contact.__table__, "after_create")
+def create_search_index(target, connection, **kw):
+    """Create the full-text search index for the connection's dialect - safe to run against an existing database"""
+    new_fts_table = connection.dialect.name == "sqlite" and not inspect(connection).has_table("contact_search")
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+    if new_fts_table:
+        # Indexes any contacts written before the triggers existed
+        connection.exec_driver_sql("INSERT INTO contact_search(contact_search) VALUES ('rebuild')")
+
+
+@event.listens_for(Contact.__table__, "after_drop")
+def drop_search_index(target, connection, **kw):
+    # The GIN index and the triggers go with the contact table, the FTS5 table has to be dropped separately
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS contact_search")
+
+
+def init_database(connection):
+    """Create the schema on a connection, returning True if the contact table had to be created
+
+    Databases created by an earlier release may be missing newer tables and indexes. create_all only adds
+    tables that don't exist; indexes on the existing contact table are added one by one, with IF NOT EXISTS
+    rather than checkfirst, as expression indexes can't be reflected to check for them. Taking a connection
+    lets the asyncio entrypoint run this through run_sync.
+    """
+    created = not inspect(connection).has_table("contact")
+    Base.metadata.create_all(connection)
+    if not created:
+        check_email_addresses_are_unique(connection)
+        for index in Base.metadata.tables["contact"].indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+        create_search_index(Base.metadata.tables["contact"], connection)
+    return created
+
+
+# Duplicate email addresses named when the unique index can't be added
+DUPLICATES_REPORTED = 10
+
+
+def check_email_addresses_are_unique(connection):
+    """Raise an error naming the duplicated email addresses if an existing contact table can't take its unique index
+
+    Databases from before the index was added may hold the same address more than once, and creating the index
+    would fail with a bare IntegrityError. Once the index exists the check is skipped, so startup stays one reflection.
+    """
+    with warnings.catch_warnings():
+        # Expression indexes can't be reflected, and aren't the one looked for
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection", SAWarning)
+        if any(index["name"] == "ix_contact_email_address" for index in inspect(connection).get_indexes("contact")):
+            return
+    duplicates = connection.execute(select(Contact.email_address)
+                                    .group_by(Contact.email_address)
+                                    .having(func.count() > 1)
+                                    .order_by(Contact.email_address)
+                                    .limit(DUPLICATES_REPORTED + 1)).scalars().all()
+    if duplicates:
+        listed = ', '.join(duplicates[:DUPLICATES_REPORTED]) + (', ...' if len(duplicates) > DUPLICATES_REPORTED else '')
+        raise RuntimeError(f"Cannot add the unique index on contact.email_address - these email addresses belong to more than one contact: "
+                           f"{listed}. Merge or delete the duplicates, then start the app again.")
@@ -1,13 +1,19 @@
 import os
 from flask import Flask
 from dotenv import load_dotenv
-import sqlalchemy as sa
+from sqlalchemy.orm import configure_mappers
 
 import config
 from config import configure_logging
 from src.contacts.entrypoints.routes import init_views, register_error_functions
-from src.contacts.domain.model import Base
+from src.contacts.entrypoints.hooks import create_metrics_registry, register_request_hooks
+from src.contacts.domain.model import init_database
 from src.contacts.domain.schema import ma
+from src.contacts.adapters.cache import ContactCache
+from src.contacts.adapters.typeahead import TypeaheadIndex
+from src.contacts.service_layer import serialization
+from src.contacts.service_layer.services import ContactService
+from src.contacts.service_layer.unit_of_work import LazySessionFactory, SqlAlchemyUnitOfWork
 
 load_dotenv()
 
@@ -16,6 +22,7 @@ def create_app():
     app = Flask(__name__)
     init_views(app)
     register_error_functions(app)
+    register_request_hooks(app)
     config.register_cli_commands(app)
 
     config_type_dev = os.environ.get('CONFIG_TYPE')
@@ -24,13 +31,52 @@ def create_app():
 
     ma.init_app(app)
 
+    app.extensions['contact_cache'] = None
+    if app.config['CONTACT_CACHE_ENABLED']:
+        app.extensions['contact_cache'] = ContactCache(max_size=app.config['CONTACT_CACHE_MAX_SIZE'], ttl=app.config['CONTACT_CACHE_TTL'])
+
+    app.extensions['metrics'] = create_metrics_registry() if app.config['METRICS_ENABLED'] else None
+
     configure_logging(app)
 
-    engine = sa.create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
-    inspector = sa.inspect(engine)
-    if not inspector.has_table("contact"):
-        Base.metadata.create_all(engine)
-        app.logger.info('Initialized the database!')
-    app.logger.info('Database already contains the contact table.')
+    # One session factory, and so one engine and pool, is shared by the schema bootstrap, the typeahead load and every request
+    session_factory = LazySessionFactory.from_config(app.config)
+    app.extensions['session_factory'] = session_factory
+
+    # Replicas are kept up to date by the database itself, so only the primary is bootstrapped
+    app.extensions['replica_session_factory'] = None
+    if app.config['REPLICA_DATABASE_URI']:
+        app.extensions['replica_session_factory'] = LazySessionFactory.from_config({**app.config, 'SQLALCHEMY_DATABASE_URI': app.config['REPLICA_DATABASE_URI']})
+
+    with session_factory.engine.begin() as connection:
+        if init_database(connection):
+            app.logger.info('Initialized the database!')
+        else:
+            app.logger.info('Database already contains the contact table.')
+
+    app.extensions['typeahead_index'] = None
+    if app.config['TYPEAHEAD_ENABLED']:
+        typeahead_index = TypeaheadIndex()
+        ContactService(SqlAlchemyUnitOfWork(session_factory=session_factory), typeahead_index).load_typeahead_index()
+        app.extensions['typeahead_index'] = typeahead_index
+        app.logger.info(f'Loaded {len(typeahead_index)} contacts into the typeahead index.')
+
+    if app.config['DB_WARMUP']:
+        warm_up(app)
+
+    return app
+
 
-    return app
\ No newline at end of file
+def warm_up(app):
+    """Fill the connection pool and run the common reads once, so their SQL and JSON encoders are compiled and cached"""
+    configure_mappers()
+    session_factory = app.extensions['session_factory']
+    session_factory.warm_up()
+    if app.extensions['replica_session_factory'] is not None:
+        app.extensions['replica_session_factory'].warm_up()
+    service = ContactService(SqlAlchemyUnitOfWork(session_factory=session_factory, cache=app.extensions['contact_cache']))
+    service.get_collection_version()
+    service.get_page_json()
+    service.get_etag(0)
+    serialization.contact_encoder()
+    app.logger.info('Warmed up the connection pool and the common queries.')
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""ASGI entrypoint serving the /contacts routes on the asyncio stack
+
+Same routes, status codes and error bodies as the Flask app, with every database call awaited instead
+of holding a thread. Run it with any ASGI server, e.g.
+    uvicorn --factory src.contacts.entrypoints.asgi:create_asgi_app
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from marshmallow import ValidationError
+from werkzeug.utils import import_string
+
+from src.contacts.adapters import query_stats
+from src.contacts.adapters.typeahead import TypeaheadIndex
+from src.contacts.domain.model import init_database
+from src.contacts.service_layer import serialization
+from src.contacts.service_layer.async_services import AsyncContactService
+from src.contacts.service_layer.async_unit_of_work import AsyncLazySessionFactory, AsyncSqlAlchemyUnitOfWork
+from src.contacts.service_layer.services import (validate_request_with_schema, transform_request_for_db, parse_page_size, parse_birthday_window, parse_fields,
+                                                 parse_filters, parse_sort, collection_etag, MAX_BULK_SIZE, DEFAULT_SEARCH_LIMIT, DEFAULT_AUTOCOMPLETE_LIMIT)
+from src.contacts.service_layer.unit_of_work import config_settings
+from src.contacts.utils.exceptions import BaseCustomException, BadRequestException, ServerError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class Request:
+    """The parts of an ASGI HTTP request the routes read"""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'')
+        # Like Flask's request.args.get, each parameter's first value wins
+        self.args = {name: values[0] for name, values in parse_qs(self.query_string.decode('latin-1'), keep_blank_values=True).items()}
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', ())}
+        self.body = body
+
+    def json(self):
+        try:
+            return serialization.loads(self.body)
+        except ValueError:
+            raise BadRequestException('Request body must be valid JSON')
+
+
+class Response:
+    """A response whose body is bytes, or an async iterator of bytes to be streamed"""
+
+    def __init__(self, body=b'', status=200, media_type='application/json', etag=None):
+        self.body = body
+        self.status = status
+        self.headers = [(b'content-type', media_type.encode('latin-1'))]
+        if etag is not None:
+            self.headers.append((b'etag', f'"{etag}"'.encode('latin-1')))
+
+    async def send(self, send, include_body=True):
+        streamed = not isinstance(self.body, bytes)
+        headers = self.headers
+        if not streamed and self.status not in (204, 304):
+            headers = [*headers, (b'content-length', str(len(self.body)).encode('latin-1'))]
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        if streamed and include_body:
+            async for chunk in self.body:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        else:
+            await send({'type': 'http.response.body', 'body': self.body if include_body and not streamed else b''})
+
+
+def error_response(status, data):
+    # Byte for byte what Flask's jsonify produces for ErrorResponse
+    return Response(body=(json.dumps(data, separators=(",", ":"), sort_keys=True) + "\n").encode('utf-8'), status=status)
+
+
+def if_none_match(request, etag):
+    """Whether the If-None-Match header lists etag, compared weakly as RFC 7232 requires - W/"etag" matches too, as with werkzeug's ETags.contains_weak"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or f'"{etag}"' in tags
+
+
+def accept_quality(accept, mimetype):
+    """Quality the Accept header gives a mimetype, taken from its most specific matching media range"""
+    best_specificity, quality = -1, 0.0
+    for media_range in accept.split(','):
+        name, *parameters = [part.strip() for part in media_range.split(';')]
+        specificity = {mimetype: 2, f"{mimetype.split('/')[0]}/*": 1, '*/*': 0}.get(name)
+        if specificity is None or specificity < best_specificity:
+            continue
+        range_quality = 1.0
+        for parameter in parameters:
+            if parameter.startswith('q='):
+                try:
+                    range_quality = float(parameter[2:])
+                except ValueError:
+                    range_quality = 0.0
+        best_specificity, quality = specificity, range_quality
+    return quality
+
+
+def wants_ndjson(request):
+    accept = request.headers.get('accept')
+    return accept is not None and accept_quality(accept, 'application/x-ndjson') > accept_quality(accept, 'application/json')
+
+
+def create_asgi_app(config_object=None):
+    """Build the ASGI application for a config class or its import path, by default the one named by CONFIG_TYPE
+
+    The schema bootstrap, typeahead load and optional warm-up run on the ASGI lifespan startup event,
+    or before the first request under a server that doesn't send lifespan events.
+    """
+    config_object = config_object or os.environ.get('CONFIG_TYPE')
+    settings = config_settings(import_string(config_object) if isinstance(config_object, str) else config_object)
+    session_factory = AsyncLazySessionFactory.from_config(settings)
+    track_queries = settings['DEBUG'] or settings['QUERY_STATS_ENABLED']
+    extensions = {'session_factory': session_factory, 'typeahead_index': None}
+    started = asyncio.Event()
+    startup_lock = asyncio.Lock()
+
+    def contact_service():
+        return AsyncContactService(AsyncSqlAlchemyUnitOfWork(session_factory), typeahead_index=extensions['typeahead_index'])
+
+    async def startup():
+        async with startup_lock:
+            if started.is_set():
+                return
+            async with session_factory.engine.begin() as connection:
+                if await connection.run_sync(init_database):
+                    logger.info('Initialized the database!')
+            if settings['TYPEAHEAD_ENABLED']:
+                typeahead_index = TypeaheadIndex()
+                await AsyncContactService(AsyncSqlAlchemyUnitOfWork(session_factory), typeahead_index).load_typeahead_index()
+                extensions['typeahead_index'] = typeahead_index
+                logger.info(f'Loaded {len(typeahead_index)} contacts into the typeahead index.')
+            if settings['DB_WARMUP']:
+                await session_factory.warm_up()
+            started.set()
+
+    async def add_contact(request):
+        contact_data = request.json()
+        validate_request_with_schema(contact_data)
+        transform_request_for_db(contact_data)
+        new_contact = await contact_service().add(
+            contact_data["first_name"],
+            contact_data["last_name"],
+            contact_data["birthday"],
+            contact_data["email_address"]
+        )
+        return Response(body=json.dumps(new_contact).encode('utf-8'), status=201)
+
+    async def add_contacts_bulk(request):
+        contacts_data = request.json()
+
+        if not isinstance(contacts_data, list):
+            raise BadRequestException('Expected a list of contacts')
+        if len(contacts_data) > MAX_BULK_SIZE:
+            raise BadRequestException(f'A maximum of {MAX_BULK_SIZE} contacts can be created at once')
+
+        results = await contact_service().add_many(contacts_data)
+        summary = {status: sum(1 for result in results if result["status"] == status) for status in ('created', 'duplicate', 'invalid')}
+        return Response(body=json.dumps({"results": results, **summary}).encode('utf-8'), status=207)
+
+    async def upsert_contacts(request):
+        contacts_data = request.json()
+
+        if not isinstance(contacts_data, list):
+            raise BadRequestException('Expected a list of contacts')
+        if len(contacts_data) > MAX_BULK_SIZE:
+            raise BadRequestException(f'A maximum of {MAX_BULK_SIZE} contacts can be upserted at once')
+
+        counts = await contact_service().upsert_many(contacts_data)
+        return Response(body=json.dumps(counts).encode('utf-8'))
+
+    async def get_all_contacts(request):
+        service = contact_service()
+        fields = parse_fields(request.args.get('fields'))
+        filters = parse_filters(request.args)
+        sort = parse_sort(request.args.get('sort'))
+
+        etag = collection_etag(await service.get_collection_version(), request.query_string)
+        if if_none_match(request, etag):
+            return Response(status=304, etag=etag)
+        if request.args.get('stream') == '1' or wants_ndjson(request):
+            return Response(body=service.stream_all_contacts_ndjson(fields=fields, filters=filters, sort=sort), media_type='application/x-ndjson', etag=etag)
+        if 'limit' in request.args or 'cursor' in request.args:
+            page = await service.get_page_json(parse_page_size(request.args.get('limit')), request.args.get('cursor'), fields, filters, sort)
+            return Response(body=page, etag=etag)
+        return Response(body=await service.get_all_contacts_json(fields, filters, sort), etag=etag)
+
+    async def search_contacts(request):
+        query = request.args.get('q')
+
+        if not query:
+            raise BadRequestException('A search query (q) is required')
+
+        results = await contact_service().search_json(query, parse_page_size(request.args.get('limit'), DEFAULT_SEARCH_LIMIT), parse_fields(request.args.get('fields')))
+        return Response(body=results)
+
+    async def get_upcoming_birthdays(request):
+        contacts = await contact_service().get_upcoming_birthdays_json(parse_birthday_window(request.args.get('within_days')), parse_fields(request.args.get('fields')))
+        return Response(body=contacts)
+
+    async def autocomplete_contacts(request):
+        suggestions = await contact_service().autocomplete(request.args.get('q', ''), parse_page_size(request.args.get('limit'), DEFAULT_AUTOCOMPLETE_LIMIT))
+        return Response(body=json.dumps(suggestions).encode('utf-8'))
+
+    async def get_contact(request, id):
+        service = contact_service()
+        fields = parse_fields(request.args.get('fields'))
+
+        # As in the Flask route, revalidation reads only last_updated_at
+        if request.headers.get('if-none-match'):
+            etag = await service.get_etag(id, fields)
+            if etag is not None and if_none_match(request, etag):
+                return Response(status=304, etag=etag)
+
+        existing_contact, etag = await service.get_json_by_id_with_etag(id, fields)
+        return Response(body=existing_contact, etag=etag)
+
+    async def update_contact(request, id):
+        updated_contact = await contact_service().update(id, request.json())
+        return Response(body=json.dumps(updated_contact).encode('utf-8'), status=201)
+
+    async def delete_contact(request, id):
+        await contact_service().delete_by_id(id)
+        return Response(status=204)
+
+    routes = [
+        ('POST', re.compile(r'/contacts'), add_contact),
+        ('GET', re.compile(r'/contacts'), get_all_contacts),
+        ('POST', re.compile(r'/contacts/bulk'), add_contacts_bulk),
+        ('PUT', re.compile(r'/contacts/upsert'), upsert_contacts),
+        ('GET', re.compile(r'/contacts/search'), search_contacts),
+        ('GET', re.compile(r'/contacts/birthdays'), get_upcoming_birthdays),
+        ('GET', re.compile(r'/contacts/autocomplete'), autocomplete_contacts),
+        ('GET', re.compile(r'/contacts/(\d+)'), get_contact),
+        ('PUT', re.compile(r'/contacts/(\d+)'), update_contact),
+        ('DELETE', re.compile(r'/contacts/(\d+)'), delete_contact),
+    ]
+
+    async def dispatch(request):
+        method = 'GET' if request.method == 'HEAD' else request.method
+        for route_method, pattern, handler in routes:
+            match = pattern.fullmatch(request.path)
+            if match is not None and route_method == method:
+                return await handler(request, *(int(group) for group in match.groups()))
+        # The Flask app answers every other GET with its catch-all route, and anything else with 405
+        if method == 'GET':
+            raise BadRequestException("Invalid path")
+        return Response(status=405)
+
+    async def handle(request):
+        try:
+            return await dispatch(request)
+        except BaseCustomException as exc:
+            logger.error(f"{type(exc).__name__} - {exc}")
+            return error_response(exc.status_code, exc.message)
+        except ValidationError as error:
+            logger.error(f"Validation Error - {error}")
+            return error_response(422, {'errors': error.messages})
+        except Exception:
+            logger.exception(f"Unhandled error - {request.method} {request.path}")
+            return error_response(ServerError.status_code, ServerError.message)
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await startup()
+                except Exception as exc:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(exc)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await session_factory.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        if not started.is_set():
+            await startup()
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        request = Request(scope, body)
+
+        # As in the Flask app, statements are only counted when asked for
+        if not track_queries:
+            response = await handle(request)
+            return await response.send(send, include_body=request.method != 'HEAD')
+        stats = query_stats.start_tracking()
+        try:
+            response = await handle(request)
+            await response.send(send, include_body=request.method != 'HEAD')
+        finally:
+            query_stats.stop_tracking(stats)
+        for statement, parameters, count in stats.duplicates():
+            logger.warning(f"Duplicate query - {request.method} {request.path} sent {count} times: {statement} {parameters}")
+
+    app.extensions = extensions
+    return app
@@ -0,0 +1,162 @@
+import math
+import time
+
+from flask import g, request
+
+from src.contacts.adapters import query_stats
+from src.contacts.adapters.metrics import MetricsRegistry
+from src.contacts.utils import timing
+
+# Set on the responses to writes - while it is current, the client's reads go to the primary instead of the replica
+READ_PRIMARY_COOKIE = 'crm_read_primary_until'
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+METRIC_DESCRIPTIONS = {
+    'crm_http_requests_total': ('counter', 'HTTP requests by method, route and status'),
+    'crm_http_request_duration_seconds': ('histogram', 'Time from the start of request handling to the response, by method, route and status'),
+    'crm_errors_total': ('counter', 'Errors returned by the error handlers, by exception and the endpoint that raised it'),
+    'crm_db_pool_size': ('gauge', 'Connections the pool keeps open'),
+    'crm_db_pool_checked_in': ('gauge', 'Idle connections in the pool'),
+    'crm_db_pool_checked_out': ('gauge', 'Connections in use'),
+    'crm_db_pool_overflow': ('gauge', 'Connections open beyond the pool size'),
+    'crm_db_pool_checkouts_total': ('counter', 'Connections taken from the pool'),
+    'crm_db_pool_timeouts_total': ('counter', 'Checkouts that gave up waiting for a connection'),
+    'crm_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for connections'),
+    'crm_contact_cache_entries': ('gauge', 'Contacts held in the cache'),
+    'crm_contact_cache_max_entries': ('gauge', 'Contacts the cache can hold'),
+    'crm_contact_cache_hits_total': ('counter', 'Contact lookups answered from the cache'),
+    'crm_contact_cache_misses_total': ('counter', 'Contact lookups the cache could not answer'),
+    'crm_contact_cache_evictions_total': ('counter', 'Contacts evicted to make room'),
+    'crm_contact_cache_expirations_total': ('counter', 'Contacts dropped after their TTL'),
+    'crm_typeahead_entries': ('gauge', 'Contacts in the typeahead index'),
+}
+
+
+def reads_from_replica(app):
+    """Whether this request's reads can go to the replica - one is configured and the client hasn't written recently"""
+    if app.extensions.get('replica_session_factory') is None:
+        return False
+    try:
+        read_primary_until = float(request.cookies.get(READ_PRIMARY_COOKIE, 0))
+    except ValueError:
+        read_primary_until = 0
+    return read_primary_until <= time.time()
+
+
+def create_metrics_registry():
+    metrics = MetricsRegistry()
+    for name, (kind, help_text) in METRIC_DESCRIPTIONS.items():
+        metrics.describe(name, kind, help_text)
+    return metrics
+
+
+def route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def count_error(app, exception_name):
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.inc('crm_errors_total', (('endpoint', request.endpoint or 'unmatched'), ('exception', exception_name)))
+
+
+def service_gauges(app):
+    """(name, labels, value) of the pool, cache and typeahead metrics, read when /metrics is scraped"""
+    gauges = []
+    for database, session_factory in (('primary', app.extensions['session_factory']), ('replica', app.extensions.get('replica_session_factory'))):
+        # A pool is only reported once its engine exists - a scrape never creates one
+        if session_factory is None or not session_factory.initialised:
+            continue
+        pool = session_factory.engine.pool
+        labels = (('database', database),)
+        # QueuePool.overflow() counts up from -pool_size while the pool is still filling
+        gauges += [('crm_db_pool_size', labels, pool.size()), ('crm_db_pool_checked_in', labels, pool.checkedin()),
+                   ('crm_db_pool_checked_out', labels, pool.checkedout()), ('crm_db_pool_overflow', labels, max(pool.overflow(), 0))]
+        if hasattr(pool, 'stats'):
+            gauges += [('crm_db_pool_checkouts_total', labels, pool.checkouts), ('crm_db_pool_timeouts_total', labels, pool.timeouts),
+                       ('crm_db_pool_wait_seconds_total', labels, pool.total_wait)]
+
+    cache = app.extensions.get('contact_cache')
+    if cache is not None:
+        stats = cache.stats()
+        gauges += [('crm_contact_cache_entries', (), stats['size']), ('crm_contact_cache_max_entries', (), stats['max_size']),
+                   ('crm_contact_cache_hits_total', (), stats['hits']), ('crm_contact_cache_misses_total', (), stats['misses']),
+                   ('crm_contact_cache_evictions_total', (), stats['evictions']), ('crm_contact_cache_expirations_total', (), stats['expirations'])]
+
+    typeahead_index = app.extensions.get('typeahead_index')
+    if typeahead_index is not None:
+        gauges.append(('crm_typeahead_entries', (), len(typeahead_index)))
+    return gauges
+
+
+def register_request_hooks(app):
+    @app.before_request
+    def start_query_tracking():
+        # Server-Timing's db phase only needs the totals, so statements are only told apart when they are reported
+        report_statements = app.debug or app.config['QUERY_STATS_ENABLED']
+        if report_statements or app.config['SERVER_TIMING_ENABLED']:
+            g.query_stats = query_stats.start_tracking(statements=report_statements)
+
+    @app.before_request
+    def start_request_metrics():
+        if app.extensions.get('metrics') is not None:
+            g.request_started_at = time.perf_counter()
+
+    @app.before_request
+    def start_request_timing():
+        if app.config['SERVER_TIMING_ENABLED']:
+            g.request_timings, g.request_timings_token = timing.start_timing()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        query_stats.stop_tracking(stats)
+
+        for statement, parameters, count in stats.duplicates():
+            app.logger.warning(f"Duplicate query - {request.method} {request.path} sent {count} times: {statement} {parameters}")
+
+        if stats.statements is not None:
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers['X-DB-Time'] = f"{stats.total_time * 1000:.3f}ms"
+
+        return response
+
+    # Registered after report_query_stats so it runs first, while this request's query stats are still in g
+    @app.after_request
+    def add_server_timing(response):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return response
+        timing.stop_timing(g.pop('request_timings_token'))
+
+        stats = g.get('query_stats')
+        if stats is not None:
+            timings.add('db', stats.total_time, f"{stats.count} {'query' if stats.count == 1 else 'queries'}")
+        timings.add('total', timings.elapsed())
+        header = timings.header()
+
+        response.headers['Server-Timing'] = header
+        if app.config['SERVER_TIMING_LOG']:
+            app.logger.info(f"Server-Timing - {request.method} {request.path} {response.status_code}: {header}")
+        return response
+
+    @app.after_request
+    def record_request_metrics(response):
+        started_at = g.pop('request_started_at', None)
+        if started_at is None:
+            return response
+
+        metrics = app.extensions['metrics']
+        labels = (('method', request.method), ('route', route_label()), ('status', str(response.status_code)))
+        metrics.inc('crm_http_requests_total', labels)
+        metrics.observe('crm_http_request_duration_seconds', time.perf_counter() - started_at, labels)
+        return response
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if app.extensions.get('replica_session_factory') is not None and request.method in WRITE_METHODS and response.status_code < 400:
+            window = app.config['REPLICA_STICKINESS_SECONDS']
+            response.set_cookie(READ_PRIMARY_COOKIE, f"{time.time() + window:.3f}", max_age=math.ceil(window), httponly=True, samesite='Lax')
+        return response
@@ -1,38 +1,47 @@
 import json
-import traceback
-from flask import Response, jsonify, request
+from flask import Response, request, stream_with_context
 from marshmallow import ValidationError
 
-from src.contacts.service_layer.services import ContactService, validate_request_with_schema, transform_request_for_db
-from src.contacts.service_layer import unit_of_work
+from src.contacts.service_layer.services import ContactService, validate_request_with_schema, transform_request_for_db, parse_page_size, parse_birthday_window, parse_fields, parse_filters, parse_sort, collection_etag, MAX_BULK_SIZE, DEFAULT_SEARCH_LIMIT, DEFAULT_AUTOCOMPLETE_LIMIT
+from src.contacts.service_layer import serialization, unit_of_work
+from src.contacts.entrypoints.hooks import count_error, reads_from_replica, service_gauges
 from src.contacts.utils.exceptions import ErrorResponse, InvalidRecord, RecordExists, BadRequestException
+from src.contacts.utils import timing
 
 
 def init_views(app):
+    def contact_service(read_only=False):
+        # Read routes use the replica, unless the client wrote within the stickiness window and must see its own writes
+        read_only = read_only and reads_from_replica(app)
+        uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory=app.extensions['session_factory'], cache=app.extensions.get('contact_cache'),
+                                                read_only=read_only, replica_session_factory=app.extensions.get('replica_session_factory'))
+        return ContactService(uow, typeahead_index=app.extensions.get('typeahead_index'))
+
     @app.route('/contacts', methods=['POST'])
     def add_contact():
-        service = ContactService(unit_of_work.SqlAlchemyUnitOfWork(session_factory=unit_of_work.DEFAULT_SESSION_FACTORY))
+        service = contact_service()
+        contact_data = parse_request_body()
 
         try:
-            validate_request_with_schema(request.json)
+            validate_request_with_schema(contact_data)
 
-            transform_request_for_db(request.json)
+            transform_request_for_db(contact_data)
 
             new_contact = service.add(
-                    request.json["first_name"],
-                    request.json["last_name"],
-                    request.json["birthday"],
-                    request.json["email_address"]
+                    contact_data["first_name"],
+                    contact_data["last_name"],
+                    contact_data["birthday"],
+                    contact_data["email_address"]
                 )
             
-            return Response(response=json.dumps(new_contact), status=201)
+            return Response(response=dumps(new_contact), status=201)
 
 
         except ValidationError as e:
             raise ValidationError(e.messages)
         
         except RecordExists:
-            raise RecordExists(request.json["email_address"])
+            raise RecordExists(contact_data["email_address"])
 
         # error = None
         # error = validate_request_with_schema(request.json)
@@ -57,34 +66,150 @@ def init_views(app):
 
     
 
+    @app.route('/contacts/bulk', methods=['POST'])
+    def add_contacts_bulk():
+        service = contact_service()
+        contacts_data = parse_request_body()
+
+        if not isinstance(contacts_data, list):
+            raise BadRequestException('Expected a list of contacts')
+        if len(contacts_data) > MAX_BULK_SIZE:
+            raise BadRequestException(f'A maximum of {MAX_BULK_SIZE} contacts can be created at once')
+
+        results = service.add_many(contacts_data)
+        summary = {status: sum(1 for result in results if result["status"] == status) for status in ('created', 'duplicate', 'invalid')}
+
+        return Response(response=dumps({"results": results, **summary}), status=207)
+
+
+    @app.route('/contacts/upsert', methods=['PUT'])
+    def upsert_contacts():
+        service = contact_service()
+        contacts_data = parse_request_body()
+
+        if not isinstance(contacts_data, list):
+            raise BadRequestException('Expected a list of contacts')
+        if len(contacts_data) > MAX_BULK_SIZE:
+            raise BadRequestException(f'A maximum of {MAX_BULK_SIZE} contacts can be upserted at once')
+
+        try:
+            counts = service.upsert_many(contacts_data)
+
+            return Response(response=dumps(counts), status=200)
+
+        except ValidationError as e:
+            raise ValidationError(e.messages)
+
+
     @app.route('/contacts/<int:id>', methods=['GET'])
     def get_contact(id):
-        service = ContactService(unit_of_work.SqlAlchemyUnitOfWork(session_factory=unit_of_work.DEFAULT_SESSION_FACTORY))
+        service = contact_service(read_only=True)
+        fields = parse_fields(request.args.get('fields'))
 
         try:
-            existing_contact = service.get_by_id(id)
-            return Response(response=json.dumps(existing_contact), status=200)
+            # Revalidation only needs the timestamp column - the full row and its serialization are skipped on a match
+            if request.if_none_match:
+                etag = service.get_etag(id, fields)
+                # If-None-Match compares weakly (RFC 7232 3.2) - proxies often add W/ to the tags they pass on
+                if etag is not None and request.if_none_match.contains_weak(etag):
+                    response = Response(status=304)
+                    response.set_etag(etag)
+                    return response
+
+            existing_contact, etag = service.get_json_by_id_with_etag(id, fields)
+            response = Response(response=existing_contact, status=200)
+            response.set_etag(etag)
+            return response
     
         except InvalidRecord:
             raise InvalidRecord(id)
 
     @app.route('/contacts', methods=['GET'])
     def get_all_contacts():
-        service = ContactService(unit_of_work.SqlAlchemyUnitOfWork(session_factory=unit_of_work.DEFAULT_SESSION_FACTORY))
+        service = contact_service(read_only=True)
+        fields = parse_fields(request.args.get('fields'))
+        filters = parse_filters(request.args)
+        sort = parse_sort(request.args.get('sort'))
+
+        # The collection version is one primary key read, so unchanged collections are answered without loading any contacts
+        etag = collection_etag(service.get_collection_version(), request.query_string)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        elif request.args.get('stream') == '1' or wants_ndjson(request):
+            batches = service.stream_all_contacts_ndjson(fields=fields, filters=filters, sort=sort)
+            response = Response(response=stream_with_context(batches), status=200, mimetype='application/x-ndjson')
+        elif 'limit' in request.args or 'cursor' in request.args:
+            page = service.get_page_json(parse_page_size(request.args.get('limit')), request.args.get('cursor'), fields, filters, sort)
+            response = Response(response=page, status=200)
+        else:
+            all_contacts = service.get_all_contacts_json(fields, filters, sort)
+            response = Response(response=all_contacts, status=200)
+
+        response.set_etag(etag)
+        return response
+    
+
+    @app.route('/contacts/search', methods=['GET'])
+    def search_contacts():
+        service = contact_service(read_only=True)
+        query = request.args.get('q')
+
+        if not query:
+            raise BadRequestException('A search query (q) is required')
+
+        results = service.search_json(query, parse_page_size(request.args.get('limit'), DEFAULT_SEARCH_LIMIT), parse_fields(request.args.get('fields')))
+        return Response(response=results, status=200)
+    
+
+    @app.route('/contacts/birthdays', methods=['GET'])
+    def get_upcoming_birthdays():
+        service = contact_service(read_only=True)
+
+        contacts = service.get_upcoming_birthdays_json(parse_birthday_window(request.args.get('within_days')), parse_fields(request.args.get('fields')))
+        return Response(response=contacts, status=200)
+    
 
-        all_contacts = service.get_all_contacts()
+    @app.route('/contacts/autocomplete', methods=['GET'])
+    def autocomplete_contacts():
+        service = contact_service(read_only=True)
 
-        return Response(response=json.dumps(all_contacts), status=200)
+        suggestions = service.autocomplete(request.args.get('q', ''), parse_page_size(request.args.get('limit'), DEFAULT_AUTOCOMPLETE_LIMIT))
+        return Response(response=dumps(suggestions), status=200)
     
 
+    @app.route('/status/cache', methods=['GET'])
+    def get_cache_stats():
+        cache = app.extensions.get('contact_cache')
+        stats = {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
+
+        return Response(response=json.dumps(stats), status=200)
+
+
+    @app.route('/status/db-pool', methods=['GET'])
+    def get_db_pool_stats():
+        pool = app.extensions['session_factory'].engine.pool
+        stats = {"instrumented": False, "status": pool.status()} if not hasattr(pool, 'stats') else {"instrumented": True, **pool.stats()}
+
+        return Response(response=json.dumps(stats), status=200)
+
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        metrics = app.extensions.get('metrics')
+        if metrics is None:
+            raise BadRequestException('Metrics are not enabled')
+
+        return Response(response=metrics.render(service_gauges(app)), status=200, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
     @app.route('/contacts/<int:id>', methods=['PUT'])
     def update_contact(id):
-        service = ContactService(unit_of_work.SqlAlchemyUnitOfWork(session_factory=unit_of_work.DEFAULT_SESSION_FACTORY))
+        service = contact_service()
 
         try:
-            updated_contact = service.update(id, request.json)
+            updated_contact = service.update(id, parse_request_body())
 
-            return Response(response=json.dumps(updated_contact), status=201)
+            return Response(response=dumps(updated_contact), status=201)
     
         except InvalidRecord:
             raise InvalidRecord(id)
@@ -92,7 +217,7 @@ def init_views(app):
 
     @app.route('/contacts/<int:id>', methods=['DELETE'])
     def delete_contact(id):
-        service = ContactService(unit_of_work.SqlAlchemyUnitOfWork(session_factory=unit_of_work.DEFAULT_SESSION_FACTORY))
+        service = contact_service()
 
         try:
             service.delete_by_id(id)
@@ -101,7 +226,24 @@ def init_views(app):
         
         except InvalidRecord:
             raise InvalidRecord(id)
-    
+
+
+def wants_ndjson(request):
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+
+def dumps(value):
+    with timing.phase('json'):
+        return json.dumps(value)
+
+
+def parse_request_body():
+    try:
+        return serialization.loads(request.get_data(cache=True))
+    except ValueError:
+        raise BadRequestException('Request body must be valid JSON')
+
+
 def register_error_functions(app):
     @app.route("/", defaults={"path": ""})
     @app.route("/<path:path>")
@@ -114,6 +256,7 @@ def register_error_functions(app):
     def handle_record_exists(exc):
 
         app.logger.error(f"RecordExists - {exc}")
+        count_error(app, 'RecordExists')
         
         return ErrorResponse(status_code=exc.status_code, data=exc.message)
     
@@ -121,6 +264,7 @@ def register_error_functions(app):
     def handle_validation_failure(error):
 
         app.logger.error(f"Validation Error - {error}")
+        count_error(app, 'ValidationError')
 
         return ErrorResponse(status_code=422, data={'errors': error.messages})
     
@@ -128,6 +272,7 @@ def register_error_functions(app):
     def handle_invalid_record(exc):
 
         app.logger.error(f"InvalidRecord - {exc}")
+        count_error(app, 'InvalidRecord')
 
         return ErrorResponse(status_code=exc.status_code, data=exc.message)
     
@@ -135,5 +280,6 @@ def register_error_functions(app):
     def handle_bad_request(exc):
 
         app.logger.error(f"BadRequestException - {exc}")
+        count_error(app, 'BadRequestException')
 
         return ErrorResponse(status_code=exc.status_code, data=exc.message)
\ No newline at end of file
@@ -0,0 +1,224 @@
+from __future__ import annotations
+from datetime import date
+
+from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
+
+from src.contacts.domain import model
+from src.contacts.adapters.repository import search_terms
+from src.contacts.adapters.typeahead import TypeaheadIndex
+from src.contacts.service_layer import serialization
+from src.contacts.service_layer.async_unit_of_work import AsyncSqlAlchemyUnitOfWork
+from src.contacts.service_layer.services import (AUTOCOMPLETE_FIELDS, DEFAULT_AUTOCOMPLETE_LIMIT, DEFAULT_BIRTHDAY_WINDOW, DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT,
+                                                 STREAM_BATCH_SIZE, birthday_window, contact_etag, decode_cursor, encode_cursor, serialize_for_api,
+                                                 transform_request_for_db, validate_many_with_schema)
+from src.contacts.utils.exceptions import RecordExists, InvalidRecord
+
+
+class AsyncContactService:
+    """asyncio counterpart of ContactService, returning the same JSON and raising the same exceptions
+
+    Only the operations served by the ASGI entrypoint are offered - all of them render JSON directly.
+    """
+
+    def __init__(self, uow: AsyncSqlAlchemyUnitOfWork, typeahead_index: TypeaheadIndex = None):
+        self.uow = uow
+        self.typeahead_index = typeahead_index
+
+    async def add(self, first_name, last_name, birthday, email_address):
+        async with self.uow:
+            try:
+                new_contact = await self.uow.contacts.add(model.Contact(first_name=first_name, last_name=last_name, birthday=birthday, email_address=email_address))
+                serialized_contact = serialize_for_api(new_contact, 'single')
+                await self.uow.contacts.bump_collection_version()
+                await self.uow.commit()
+            except IntegrityError:
+                raise RecordExists(email_address)
+        self._index_contact(serialized_contact)
+        return serialized_contact
+
+    async def add_many(self, contacts_data):
+        results = [None] * len(contacts_data)
+        errors = validate_many_with_schema(contacts_data)
+        for index, messages in errors.items():
+            results[index] = {"index": index, "status": "invalid", "errors": messages}
+
+        valid_indexes = [index for index in range(len(contacts_data)) if index not in errors]
+
+        async with self.uow:
+            existing_emails = await self.uow.contacts.get_existing_email_addresses({contacts_data[index]["email_address"] for index in valid_indexes})
+            new_contacts = {}
+            for index in valid_indexes:
+                email_address = contacts_data[index]["email_address"]
+                if email_address in existing_emails:
+                    results[index] = {"index": index, "status": "duplicate", "email_address": email_address}
+                    continue
+                existing_emails.add(email_address)
+                contact_data = transform_request_for_db(dict(contacts_data[index]))
+                new_contacts[index] = model.Contact(**{field: contact_data[field] for field in model.CONTACT_FIELDS})
+
+            if new_contacts:
+                try:
+                    created_contacts = {contact.email_address: contact for contact in await self.uow.contacts.add_many(list(new_contacts.values()))}
+                    for index, contact in new_contacts.items():
+                        results[index] = {"index": index, "status": "created", "contact": serialize_for_api(created_contacts[contact.email_address], 'single')}
+                    await self.uow.contacts.bump_collection_version()
+                    await self.uow.commit()
+                except IntegrityError:
+                    # See ContactService.add_many - an email address taken since the check fails the whole INSERT
+                    await self.uow.rollback()
+                    for index, contact in new_contacts.items():
+                        results[index] = await self._add_for_batch(index, contact)
+                for index in new_contacts:
+                    if results[index]["status"] == "created":
+                        self._index_contact(results[index]["contact"])
+
+        return results
+
+    async def _add_for_batch(self, index, contact):
+        try:
+            serialized_contact = serialize_for_api(await self.uow.contacts.add(contact), 'single')
+            await self.uow.contacts.bump_collection_version()
+            await self.uow.commit()
+        except IntegrityError:
+            await self.uow.rollback()
+            return {"index": index, "status": "duplicate", "email_address": contact.email_address}
+        return {"index": index, "status": "created", "contact": serialized_contact}
+
+    async def upsert_many(self, contacts_data):
+        errors = validate_many_with_schema(contacts_data)
+        if errors:
+            raise ValidationError(errors)
+
+        contacts = {}
+        for contact_data in contacts_data:
+            contact_data = transform_request_for_db(dict(contact_data))
+            contacts[contact_data["email_address"]] = {field: contact_data[field] for field in model.CONTACT_FIELDS}
+
+        async with self.uow:
+            outcome = await self.uow.contacts.upsert_many(list(contacts.values()))
+            if outcome["inserted"] or outcome["updated"]:
+                await self.uow.contacts.bump_collection_version()
+            await self.uow.commit()
+
+        for email_address, id in {**outcome["inserted"], **outcome["updated"]}.items():
+            self._index_contact({"id": id, **contacts[email_address]})
+
+        return {"inserted": len(outcome["inserted"]), "updated": len(outcome["updated"]), "unchanged": outcome["unchanged"]}
+
+    async def get_all_contacts_json(self, fields=None, filters=None, sort=None):
+        async with self.uow:
+            return serialization.contacts_to_json(await self.uow.contacts.get_all_rows(fields, filters, sort), fields or serialization.CONTACT_JSON_FIELDS)
+
+    async def get_page_json(self, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None, filters=None, sort=None):
+        after_id, after_keys = decode_cursor(cursor, sort) if cursor else (None, None)
+        async with self.uow:
+            # Rendered before the unit of work ends - its rollback expires the contacts, and asyncio can't lazy load them back
+            contacts = await self.uow.contacts.get_page(limit + 1, after_id, fields, filters, sort, after_keys)
+            next_cursor = None
+            if len(contacts) > limit:
+                contacts = contacts[:limit]
+                next_cursor = encode_cursor(contacts[-1].id, [getattr(contacts[-1], term.lstrip('-')) for term in sort or ()], sort)
+            return serialization.page_to_json(contacts, next_cursor, fields or serialization.CONTACT_JSON_FIELDS)
+
+    async def stream_all_contacts_ndjson(self, batch_size=STREAM_BATCH_SIZE, fields=None, filters=None, sort=None):
+        async with self.uow:
+            async for batch in self.uow.contacts.iter_batches(batch_size, fields, filters, sort):
+                yield serialization.contacts_to_ndjson(batch, fields or serialization.CONTACT_JSON_FIELDS)
+
+    async def search(self, query, limit=DEFAULT_SEARCH_LIMIT, fields=None):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        async with self.uow:
+            return serialize_for_api(await self.uow.contacts.search(terms, limit, fields), 'not single', fields)
+
+    async def search_json(self, query, limit=DEFAULT_SEARCH_LIMIT, fields=None):
+        terms = search_terms(query)
+        if not terms:
+            return b'[]'
+        async with self.uow:
+            return serialization.contacts_to_json(await self.uow.contacts.search(terms, limit, fields), fields or serialization.CONTACT_JSON_FIELDS)
+
+    async def autocomplete(self, query, limit=DEFAULT_AUTOCOMPLETE_LIMIT):
+        # The typeahead index is in memory and held only briefly, so it is read without leaving the event loop
+        if self.typeahead_index is not None:
+            return self.typeahead_index.search(query, limit)
+        return await self.search(query, limit, AUTOCOMPLETE_FIELDS)
+
+    async def load_typeahead_index(self, batch_size=STREAM_BATCH_SIZE):
+        async with self.uow:
+            async for batch in self.uow.contacts.iter_batches(batch_size, AUTOCOMPLETE_FIELDS):
+                self.typeahead_index.load(batch)
+
+    def _index_contact(self, contact):
+        if self.typeahead_index is not None:
+            self.typeahead_index.add(contact["id"], contact["first_name"], contact["last_name"], contact["email_address"])
+
+    async def get_upcoming_birthdays_json(self, within_days=DEFAULT_BIRTHDAY_WINDOW, fields=None, today=None):
+        start, end = birthday_window(today or date.today(), within_days)
+        async with self.uow:
+            return serialization.contacts_to_json(await self.uow.contacts.get_birthdays_between(start, end, fields), fields or serialization.CONTACT_JSON_FIELDS)
+
+    async def get_by_id(self, id, fields=None):
+        async with self.uow:
+            if fields is None:
+                selected_contact = await self.uow.contacts.get_by_id(id)
+            else:
+                selected_contact = await self.uow.contacts.get_fields_by_id(id, fields)
+            if selected_contact is None:
+                raise InvalidRecord(id)
+            return serialize_for_api(selected_contact, 'single', fields)
+
+    async def get_json_by_id_with_etag(self, id, fields=None):
+        async with self.uow:
+            if fields is None:
+                selected_contact = await self.uow.contacts.get_by_id(id)
+            else:
+                selected_contact = await self.uow.contacts.get_fields_by_id(id, fields + ("last_updated_at",))
+            if selected_contact is None:
+                raise InvalidRecord(id)
+            etag = contact_etag(id, selected_contact.last_updated_at, fields)
+            return serialization.contact_to_json(selected_contact, fields or serialization.CONTACT_JSON_FIELDS), etag
+
+    async def get_etag(self, id, fields=None):
+        async with self.uow:
+            last_updated_at = await self.uow.contacts.get_last_updated_at(id)
+        if last_updated_at is None:
+            return None
+        return contact_etag(id, last_updated_at, fields)
+
+    async def get_collection_version(self):
+        async with self.uow:
+            return await self.uow.contacts.get_collection_version()
+
+    async def delete_by_id(self, id):
+        async with self.uow:
+            # Kept referenced, so the repository finds it in the identity map rather than querying again
+            contact_exists = await self.uow.contacts.get_by_id(id)
+            if contact_exists is None:
+                raise InvalidRecord(id)
+            await self.uow.contacts.delete_by_id(id)
+            await self.uow.contacts.bump_collection_version()
+            await self.uow.commit()
+        if self.typeahead_index is not None:
+            self.typeahead_index.remove(id)
+
+    async def update(self, id, new_properties_dict):
+        async with self.uow:
+            contact_exists = await self.uow.contacts.get_by_id(id)
+            if contact_exists is None:
+                raise InvalidRecord(id)
+            if 'birthday' in new_properties_dict:
+                try:
+                    new_properties_dict = transform_request_for_db(new_properties_dict)
+                except TypeError:
+                    return {'message': 'The proposed birthday does not align with requirements.'}
+            try:
+                updated_contact = serialize_for_api(await self.uow.contacts.update(id, new_properties_dict), 'single')
+                await self.uow.contacts.bump_collection_version()
+                await self.uow.commit()
+            except IntegrityError:
+                raise RecordExists(new_properties_dict.get('email_address'))
+        self._index_contact(updated_contact)
+        return updated_contact
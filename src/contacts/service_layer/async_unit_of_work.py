@@ -0,0 +1,70 @@
+from __future__ import annotations
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.contacts.adapters import query_stats
+from src.contacts.adapters.async_repository import AsyncSqlAlchemyContactRepository
+from src.contacts.service_layer.unit_of_work import LazySessionFactory, pool_options
+
+# asyncio drivers used for each database, when the configured URI names a synchronous one
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_uri(database_uri):
+    url = make_url(database_uri)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() == driver:
+        return url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}")
+
+
+def async_pool_options(settings):
+    # Same sizing as the synchronous pool; QueuePool subclasses can't be used by an asyncio engine
+    return {**pool_options(settings), "poolclass": AsyncAdaptedQueuePool}
+
+
+class AsyncLazySessionFactory(LazySessionFactory):
+    """LazySessionFactory for the asyncio stack - engine is an AsyncEngine and sessions are AsyncSessions
+
+    expire_on_commit is off, as reading an expired attribute would need a lazy load, which asyncio can't do.
+    """
+
+    @classmethod
+    def from_config(cls, settings):
+        return cls(async_database_uri(settings['SQLALCHEMY_DATABASE_URI']), settings['ISOLATION_LEVEL'], **async_pool_options(settings))
+
+    async def warm_up(self):
+        connections = [await self.engine.connect() for _ in range(self.engine.pool.size())]
+        for connection in connections:
+            await connection.close()
+
+    def _create_sessionmaker(self):
+        engine = create_async_engine(self.database_uri, isolation_level=self.isolation_level, **self.engine_options)
+        return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+class AsyncSqlAlchemyUnitOfWork:
+    """asyncio counterpart of SqlAlchemyUnitOfWork, used with async with
+
+    There is no contact cache on this stack - CachedContactRepository wraps synchronous repositories only.
+    """
+
+    def __init__(self, session_factory: AsyncLazySessionFactory):
+        self.session_factory = session_factory
+
+    async def __aenter__(self) -> AsyncSqlAlchemyUnitOfWork:
+        self.session: AsyncSession = self.session_factory()
+        query_stats.instrument_engine(self.session.bind.sync_engine)
+        self.contacts = AsyncSqlAlchemyContactRepository(self.session)
+        return self
+
+    async def __aexit__(self, *args):
+        await self.rollback()
+        await self.session.close()
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
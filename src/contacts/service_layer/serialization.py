@@ -0,0 +1,97 @@
+"""Precompiled JSON encoding for contacts
+
+Produces exactly the bytes that json.dumps(ContactSchema().dump(contact)) does, without building the
+intermediate marshmallow dict. Works on ORM instances and on plain column rows alike. The encoding
+is timed as the request's serialize phase - there is no separate json.dumps step to time.
+"""
+import datetime
+import json
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+from src.contacts.utils import timing
+
+CONTACT_JSON_FIELDS = ("id", "first_name", "last_name", "birthday", "email_address", "created_at")
+
+
+def _encode_int(value):
+    return 'null' if value is None else int.__repr__(value)
+
+
+def _encode_string(value):
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+
+def _encode_date(value):
+    if value is None:
+        return 'null'
+    # Matches the schema's "%Y-%m-%d" format; isoformat is the same string and much cheaper for four-digit years
+    if type(value) is datetime.date and value.year >= 1000:
+        return '"' + value.isoformat() + '"'
+    return '"' + value.strftime("%Y-%m-%d") + '"'
+
+
+def _encode_datetime(value):
+    return 'null' if value is None else '"' + value.isoformat() + '"'
+
+
+FIELD_ENCODERS = {
+    "id": _encode_int,
+    "first_name": _encode_string,
+    "last_name": _encode_string,
+    "birthday": _encode_date,
+    "email_address": _encode_string,
+    "created_at": _encode_datetime,
+}
+
+
+@lru_cache(maxsize=64)
+def contact_encoder(fields=CONTACT_JSON_FIELDS):
+    """Build (once per field tuple) a function turning one contact or row into its JSON text
+
+    The function is generated as straight-line code - one attribute read and one encoder call per
+    field, no loops - since it runs once for every row of a listing.
+    """
+    template = '{' + ', '.join(f'{encode_basestring_ascii(field)}: %s' for field in fields) + '}'
+    namespace = {"template": template}
+    calls = []
+    for position, field in enumerate(fields):
+        namespace[f"encode_{position}"] = FIELD_ENCODERS[field]
+        calls.append(f"encode_{position}(contact.{field})")
+    source = f"def encode(contact):\n    return template % ({', '.join(calls)},)\n"
+    exec(source, namespace)
+    return namespace["encode"]
+
+
+def contact_to_json(contact, fields=CONTACT_JSON_FIELDS):
+    with timing.phase('serialize'):
+        return contact_encoder(fields)(contact).encode('ascii')
+
+
+def contacts_to_json(contacts, fields=CONTACT_JSON_FIELDS):
+    encode = contact_encoder(fields)
+    with timing.phase('serialize'):
+        return ('[' + ', '.join([encode(contact) for contact in contacts]) + ']').encode('ascii')
+
+
+def contacts_to_ndjson(contacts, fields=CONTACT_JSON_FIELDS):
+    encode = contact_encoder(fields)
+    with timing.phase('serialize'):
+        return ''.join([encode(contact) + '\n' for contact in contacts]).encode('ascii')
+
+
+def page_to_json(contacts, next_cursor, fields=CONTACT_JSON_FIELDS):
+    return (b'{"contacts": ' + contacts_to_json(contacts, fields)
+            + b', "next_cursor": ' + json.dumps(next_cursor).encode('ascii') + b'}')
+
+
+def loads(data):
+    """Parse a JSON request body, raising ValueError when it isn't valid JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,46 +1,274 @@
 from __future__ import annotations
-from datetime import date
+import base64
+import binascii
+import calendar
+import hashlib
+import json
+from datetime import date, datetime, timedelta, timezone
 
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
 
 from src.contacts.domain import model
 from src.contacts.domain import schema
+from src.contacts.adapters.repository import search_terms
+from src.contacts.adapters.typeahead import TypeaheadIndex
+from src.contacts.service_layer import serialization
 from src.contacts.service_layer.unit_of_work import SqlAlchemyUnitOfWork
-from src.contacts.utils.exceptions import RecordExists, InvalidRecord
-import config as config
+from src.contacts.utils.exceptions import RecordExists, InvalidRecord, BadRequestException
+from src.contacts.utils import timing
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+MAX_BULK_SIZE = 1000
+DEFAULT_SEARCH_LIMIT = 20
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_FIELDS = ("id", "first_name", "last_name", "email_address")
+DEFAULT_BIRTHDAY_WINDOW = 7
+MAX_BIRTHDAY_WINDOW = 365
+
+
+def parse_timestamp(value):
+    """An ISO 8601 timestamp as the naive UTC datetime contact timestamps are stored as - an offset, if given, is converted"""
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+# Query parameters accepted as filters on GET /contacts, with how each is parsed and what a valid value looks like
+FILTER_PARAMETERS = {
+    "first_name": (str, "a string"),
+    "first_name_prefix": (str, "a string"),
+    "last_name": (str, "a string"),
+    "last_name_prefix": (str, "a string"),
+    "email_domain": (str, "a string"),
+    "birthday_from": (date.fromisoformat, "a date (YYYY-MM-DD)"),
+    "birthday_to": (date.fromisoformat, "a date (YYYY-MM-DD)"),
+    "created_after": (parse_timestamp, "an ISO 8601 timestamp"),
+}
+# Fields contacts can be sorted by; id is always the final tiebreaker
+SORT_FIELDS = ("first_name", "last_name", "birthday", "email_address", "created_at")
+# Cursor keys are stored as JSON, so sort values that aren't strings are parsed back on the way in
+CURSOR_KEY_PARSERS = {"birthday": date.fromisoformat, "created_at": parse_timestamp}
 
 
 class ContactService:
 
-    def __init__(self, uow: SqlAlchemyUnitOfWork):
+    def __init__(self, uow: SqlAlchemyUnitOfWork, typeahead_index: TypeaheadIndex = None):
         self.uow = uow
+        self.typeahead_index = typeahead_index
 
     def add(self, first_name, last_name, birthday, email_address):
         with self.uow:
-            contact_exists = self.uow.contacts.get_by_email_address(email_address)
-            if contact_exists is not None:
-                raise RecordExists(email_address)
-            else:
-                self.uow.contacts.add(model.Contact(first_name=first_name, last_name=last_name, birthday=birthday, email_address=email_address))
+            # The unique index on email_address detects duplicates as part of the insert itself
+            try:
+                new_contact = self.uow.contacts.add(model.Contact(first_name=first_name, last_name=last_name, birthday=birthday, email_address=email_address))
+                # Serialize before committing - the commit expires the instance and reading it back would cost a query
+                serialized_contact = serialize_for_api(new_contact, 'single')
+                self.uow.contacts.bump_collection_version()
                 self.uow.commit()
-                retrieved_contact = self.uow.contacts.get_by_email_address(email_address)
-                return serialize_for_api(retrieved_contact, 'single')
+            except IntegrityError:
+                raise RecordExists(email_address)
+            self._index_contact(serialized_contact)
+            return serialized_contact
+
+    def add_many(self, contacts_data):
+        results = [None] * len(contacts_data)
+        errors = validate_many_with_schema(contacts_data)
+        for index, messages in errors.items():
+            results[index] = {"index": index, "status": "invalid", "errors": messages}
+
+        valid_indexes = [index for index in range(len(contacts_data)) if index not in errors]
+
+        with self.uow:
+            existing_emails = self.uow.contacts.get_existing_email_addresses({contacts_data[index]["email_address"] for index in valid_indexes})
+            new_contacts = {}
+            for index in valid_indexes:
+                email_address = contacts_data[index]["email_address"]
+                if email_address in existing_emails:
+                    results[index] = {"index": index, "status": "duplicate", "email_address": email_address}
+                    continue
+                existing_emails.add(email_address)
+                contact_data = transform_request_for_db(dict(contacts_data[index]))
+                new_contacts[index] = model.Contact(
+                    first_name=contact_data["first_name"],
+                    last_name=contact_data["last_name"],
+                    birthday=contact_data["birthday"],
+                    email_address=email_address)
+
+            if new_contacts:
+                try:
+                    created_contacts = {contact.email_address: contact for contact in self.uow.contacts.add_many(list(new_contacts.values()))}
+                    # Serialize before committing - the commit expires the instances and reading them back would cost a query each
+                    for index, contact in new_contacts.items():
+                        created_contact = created_contacts[contact.email_address]
+                        results[index] = {"index": index, "status": "created", "contact": serialize_for_api(created_contact, 'single')}
+                    self.uow.contacts.bump_collection_version()
+                    self.uow.commit()
+                except IntegrityError:
+                    # Another request took one of the email addresses since they were checked, failing the whole INSERT -
+                    # adding the contacts one at a time reports just the ones taken as duplicates
+                    self.uow.rollback()
+                    for index, contact in new_contacts.items():
+                        results[index] = self._add_for_batch(index, contact)
+                for index in new_contacts:
+                    if results[index]["status"] == "created":
+                        self._index_contact(results[index]["contact"])
+
+        return results
+
+    def _add_for_batch(self, index, contact):
+        try:
+            serialized_contact = serialize_for_api(self.uow.contacts.add(contact), 'single')
+            self.uow.contacts.bump_collection_version()
+            self.uow.commit()
+        except IntegrityError:
+            self.uow.rollback()
+            return {"index": index, "status": "duplicate", "email_address": contact.email_address}
+        return {"index": index, "status": "created", "contact": serialized_contact}
+
+    def upsert_many(self, contacts_data):
+        errors = validate_many_with_schema(contacts_data)
+        if errors:
+            raise ValidationError(errors)
+
+        # Later entries for the same email address win, as they would with one PUT after another
+        contacts = {}
+        for contact_data in contacts_data:
+            contact_data = transform_request_for_db(dict(contact_data))
+            contacts[contact_data["email_address"]] = {field: contact_data[field] for field in model.CONTACT_FIELDS}
+
+        with self.uow:
+            outcome = self.uow.contacts.upsert_many(list(contacts.values()))
+            if outcome["inserted"] or outcome["updated"]:
+                self.uow.contacts.bump_collection_version()
+            self.uow.commit()
+
+        for email_address, id in {**outcome["inserted"], **outcome["updated"]}.items():
+            self._index_contact({"id": id, **contacts[email_address]})
+
+        return {"inserted": len(outcome["inserted"]), "updated": len(outcome["updated"]), "unchanged": outcome["unchanged"]}
             
     
-    def get_all_contacts(self):
+    def get_all_contacts(self, fields=None, filters=None, sort=None):
+        with self.uow:
+            if fields is None and not filters and not sort:
+                all_contacts = self.uow.contacts.get_all()
+            else:
+                all_contacts = self.uow.contacts.get_all_rows(fields, filters, sort)
+            return serialize_for_api(all_contacts, 'not single', fields)
+
+    def get_all_contacts_json(self, fields=None, filters=None, sort=None):
+        with self.uow:
+            return serialization.contacts_to_json(self.uow.contacts.get_all_rows(fields, filters, sort), fields or serialization.CONTACT_JSON_FIELDS)
+
+    def get_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None, filters=None, sort=None):
+        return self._read_page(limit, cursor, fields, filters, sort, lambda contacts, next_cursor: {"contacts": serialize_for_api(contacts, 'not single', fields), "next_cursor": next_cursor})
+
+    def get_page_json(self, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None, filters=None, sort=None):
+        return self._read_page(limit, cursor, fields, filters, sort, lambda contacts, next_cursor: serialization.page_to_json(contacts, next_cursor, fields or serialization.CONTACT_JSON_FIELDS))
+
+    def _read_page(self, limit, cursor, fields, filters, sort, render):
+        after_id, after_keys = decode_cursor(cursor, sort) if cursor else (None, None)
+        with self.uow:
+            # One extra row tells us whether there is a next page without a COUNT query
+            contacts = self.uow.contacts.get_page(limit + 1, after_id, fields, filters, sort, after_keys)
+            next_cursor = None
+            if len(contacts) > limit:
+                contacts = contacts[:limit]
+                last_contact = contacts[-1]
+                next_cursor = encode_cursor(last_contact.id, [getattr(last_contact, term.lstrip('-')) for term in sort or ()], sort)
+            return render(contacts, next_cursor)
+
+    def stream_all_contacts(self, batch_size=STREAM_BATCH_SIZE, fields=None, filters=None, sort=None):
+        with self.uow:
+            for batch in self.uow.contacts.iter_batches(batch_size, fields, filters, sort):
+                yield serialize_for_api(batch, 'not single', fields)
+
+    def stream_all_contacts_ndjson(self, batch_size=STREAM_BATCH_SIZE, fields=None, filters=None, sort=None):
         with self.uow:
-            all_contacts = self.uow.contacts.get_all()
-            return serialize_for_api(all_contacts, 'not single')
+            for batch in self.uow.contacts.iter_batches(batch_size, fields, filters, sort):
+                yield serialization.contacts_to_ndjson(batch, fields or serialization.CONTACT_JSON_FIELDS)
     
-    def get_by_id(self, id):
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, fields=None):
+        terms = search_terms(query)
+        if not terms:
+            return []
         with self.uow:
-            contact_exists = self.uow.contacts.get_by_id(id)
-            if contact_exists is None:
-                raise InvalidRecord(id)
+            return serialize_for_api(self.uow.contacts.search(terms, limit, fields), 'not single', fields)
+
+    def search_json(self, query, limit=DEFAULT_SEARCH_LIMIT, fields=None):
+        terms = search_terms(query)
+        if not terms:
+            return b'[]'
+        with self.uow:
+            return serialization.contacts_to_json(self.uow.contacts.search(terms, limit, fields), fields or serialization.CONTACT_JSON_FIELDS)
+
+    def autocomplete(self, query, limit=DEFAULT_AUTOCOMPLETE_LIMIT):
+        """Typeahead suggestions from the in-memory index, or from full-text search when there is no index"""
+        if self.typeahead_index is not None:
+            return self.typeahead_index.search(query, limit)
+        return self.search(query, limit, AUTOCOMPLETE_FIELDS)
+
+    def load_typeahead_index(self, batch_size=STREAM_BATCH_SIZE):
+        """Fill the typeahead index from a streaming scan of the contacts - only the indexed columns are read"""
+        with self.uow:
+            for batch in self.uow.contacts.iter_batches(batch_size, AUTOCOMPLETE_FIELDS):
+                self.typeahead_index.load(batch)
+
+    def _index_contact(self, contact):
+        if self.typeahead_index is not None:
+            self.typeahead_index.add(contact["id"], contact["first_name"], contact["last_name"], contact["email_address"])
+
+    def get_upcoming_birthdays(self, within_days=DEFAULT_BIRTHDAY_WINDOW, fields=None, today=None):
+        with self.uow:
+            return serialize_for_api(self._upcoming_birthdays(within_days, fields, today), 'not single', fields)
+
+    def get_upcoming_birthdays_json(self, within_days=DEFAULT_BIRTHDAY_WINDOW, fields=None, today=None):
+        with self.uow:
+            return serialization.contacts_to_json(self._upcoming_birthdays(within_days, fields, today), fields or serialization.CONTACT_JSON_FIELDS)
+
+    def _upcoming_birthdays(self, within_days, fields, today):
+        """Contacts with a birthday from today up to within_days days ahead, soonest first"""
+        start, end = birthday_window(today or date.today(), within_days)
+        return self.uow.contacts.get_birthdays_between(start, end, fields)
+
+    def get_by_id(self, id, fields=None):
+        with self.uow:
+            if fields is None:
+                selected_contact = self.uow.contacts.get_by_id(id)
             else:
+                selected_contact = self.uow.contacts.get_fields_by_id(id, fields)
+            if selected_contact is None:
+                raise InvalidRecord(id)
+            return serialize_for_api(selected_contact, 'single', fields)
+
+    def get_json_by_id_with_etag(self, id, fields=None):
+        with self.uow:
+            if fields is None:
                 selected_contact = self.uow.contacts.get_by_id(id)
-                return serialize_for_api(selected_contact, 'single')
+            else:
+                # The ETag is derived from last_updated_at, so it is read alongside the requested fields
+                selected_contact = self.uow.contacts.get_fields_by_id(id, fields + ("last_updated_at",))
+            if selected_contact is None:
+                raise InvalidRecord(id)
+            etag = contact_etag(id, selected_contact.last_updated_at, fields)
+            return serialization.contact_to_json(selected_contact, fields or serialization.CONTACT_JSON_FIELDS), etag
+
+    def get_etag(self, id, fields=None):
+        """Current ETag of a contact from its last_updated_at alone, or None if the contact doesn't exist"""
+        with self.uow:
+            last_updated_at = self.uow.contacts.get_last_updated_at(id)
+        if last_updated_at is None:
+            return None
+        return contact_etag(id, last_updated_at, fields)
     
+    def get_collection_version(self):
+        with self.uow:
+            return self.uow.contacts.get_collection_version()
+
     def get_by_email_address(self, email_address):
         with self.uow:
             contact_exists = self.uow.contacts.get_by_email_address(email_address)
@@ -53,29 +281,33 @@ class ContactService:
                 raise InvalidRecord(id)
             else:
                 self.uow.contacts.delete_by_id(id)
+                self.uow.contacts.bump_collection_version()
                 self.uow.commit()
+                if self.typeahead_index is not None:
+                    self.typeahead_index.remove(id)
     
     def update(self, id, new_properties_dict):
         with self.uow:
+            # Kept referenced, so the update finds it in the identity map rather than querying again
             contact_exists = self.uow.contacts.get_by_id(id)
             if contact_exists is None:
                 raise InvalidRecord(id)
-            else:
-                with self.uow:
-                    if 'birthday' in new_properties_dict.keys():
-                        try:
-                            new_properties_dict = transform_request_for_db(new_properties_dict)  
-                            self.uow.contacts.update(id, new_properties_dict)
-                            self.uow.commit()
-                            return self.get_by_id(id)
-                        except TypeError:
-                            return {'message': 'The proposed birthday does not align with requirements.'}
-                    else:
-                        self.uow.contacts.update(id, new_properties_dict)
-                        self.uow.commit()
-                        return self.get_by_id(id)
-
-                    
+            if 'birthday' in new_properties_dict:
+                try:
+                    new_properties_dict = transform_request_for_db(new_properties_dict)
+                except TypeError:
+                    return {'message': 'The proposed birthday does not align with requirements.'}
+            try:
+                # Serialize before committing - the commit expires the instance and reading it back would cost a query
+                updated_contact = serialize_for_api(self.uow.contacts.update(id, new_properties_dict), 'single')
+                self.uow.contacts.bump_collection_version()
+                self.uow.commit()
+            except IntegrityError:
+                # The email address is the only unique column a client can change
+                raise RecordExists(new_properties_dict.get('email_address'))
+        self._index_contact(updated_contact)
+        return updated_contact
+
 
 # Additional functions for validation - using marshmallow schema
 
@@ -85,7 +317,8 @@ def validate_request_with_schema(request_dict):
     error_messages = None
 
     try:
-        validation_schema.load(request_dict)
+        with timing.phase('validate'):
+            validation_schema.load(request_dict)
     except ValidationError as e:
         error_messages = e.messages
         raise ValidationError(e.messages)
@@ -93,21 +326,153 @@ def validate_request_with_schema(request_dict):
     return error_messages
 
 
+def validate_many_with_schema(request_list):
+
+    validation_schema = schema.ContactSchema(many=True)
+
+    try:
+        with timing.phase('validate'):
+            validation_schema.load(request_list)
+    except ValidationError as e:
+        return e.messages
+
+    return {}
+
+
 def transform_request_for_db(request_dict):
     request_dict['birthday'] = date.fromisoformat(request_dict['birthday'])
 
     return request_dict
 
 
-def serialize_for_api(contact, list_indicator):
+def parse_page_size(limit, default=DEFAULT_PAGE_SIZE):
+    if limit is None:
+        return default
+    try:
+        page_size = int(limit)
+    except ValueError:
+        raise BadRequestException('limit must be an integer')
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        raise BadRequestException(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return page_size
+
+
+def parse_birthday_window(within_days):
+    if within_days is None:
+        return DEFAULT_BIRTHDAY_WINDOW
+    try:
+        days = int(within_days)
+    except ValueError:
+        raise BadRequestException('within_days must be an integer')
+    if days < 0 or days > MAX_BIRTHDAY_WINDOW:
+        raise BadRequestException(f'within_days must be between 0 and {MAX_BIRTHDAY_WINDOW}')
+    return days
+
+
+def month_day(day):
+    return day.month * 100 + day.day
+
+
+def birthday_window(today, within_days):
+    """(start, end) month_day values of the birthdays falling in the next within_days days - start > end when the window crosses the new year"""
+    if within_days >= MAX_BIRTHDAY_WINDOW:
+        # Every day of the year is covered, including 29 February
+        return 101, 1231
+    end = today + timedelta(days=within_days)
+    end_month_day = month_day(end)
+    # Outside leap years 29 February birthdays are celebrated on the 28th, so they join a window ending then
+    if end.month == 2 and end.day == 28 and not calendar.isleap(end.year):
+        end_month_day = 229
+    return month_day(today), end_month_day
+
+
+def parse_fields(fields):
+    """Turn a comma separated ?fields= value into a projection, in schema order and always including id"""
+    if not fields:
+        return None
+    requested_fields = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown_fields = requested_fields.difference(schema.ContactSchema.Meta.fields)
+    if unknown_fields:
+        raise BadRequestException(f"Unknown field(s): {', '.join(sorted(unknown_fields))}")
+    return tuple(field for field in schema.ContactSchema.Meta.fields if field == "id" or field in requested_fields)
+
+
+def parse_filters(args):
+    """Pick the filter query parameters out of args, parsed into the values the repository compares against"""
+    filters = {}
+    for name, (parse, description) in FILTER_PARAMETERS.items():
+        value = args.get(name)
+        if not value:
+            continue
+        try:
+            filters[name] = parse(value)
+        except ValueError:
+            raise BadRequestException(f'{name} must be {description}')
+    return filters or None
+
+
+def parse_sort(sort):
+    """Turn a comma separated ?sort= value into sort terms - a leading "-" sorts that field in descending order"""
+    if not sort:
+        return None
+    terms = tuple(term.strip() for term in sort.split(',') if term.strip())
+    unknown_fields = {term.lstrip('-') for term in terms}.difference(SORT_FIELDS)
+    if unknown_fields:
+        raise BadRequestException(f"Unknown sort field(s): {', '.join(sorted(unknown_fields))}")
+    return terms or None
+
+
+def encode_cursor(last_id, keys=None, sort=None):
+    # The sort values of the last contact are kept alongside its id, so the next page can seek straight past it,
+    # and so is the sort they were taken under - the same values mean a different position in another order
+    cursor = {"id": last_id}
+    if keys:
+        cursor["keys"] = [key.isoformat() if isinstance(key, date) else key for key in keys]
+    if sort:
+        cursor["sort"] = list(sort)
+    payload = json.dumps(cursor).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(cursor, sort=None):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        after_id = int(payload["id"])
+        keys = payload.get("keys", [])
+        fields = [term.lstrip('-') for term in sort or ()]
+        # A cursor from a differently sorted listing can't be continued
+        if payload.get("sort", []) != list(sort or ()) or not isinstance(keys, list) or len(keys) != len(fields):
+            raise ValueError
+        # Every sort key is a string or an ISO date - anything else would only fail once bound into the query
+        if not all(isinstance(key, str) for key in keys):
+            raise ValueError
+        after_keys = [CURSOR_KEY_PARSERS[field](key) if field in CURSOR_KEY_PARSERS else key for field, key in zip(fields, keys)]
+        return after_id, after_keys or None
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError, AttributeError):
+        raise BadRequestException('Invalid cursor')
+
+
+def contact_etag(id, last_updated_at, fields=None):
+    # Each projection is a different representation of the contact, so it gets its own tag
+    projection = f":{','.join(fields)}" if fields is not None else ""
+    return hashlib.sha1(f"{id}:{last_updated_at.isoformat()}{projection}".encode('utf-8')).hexdigest()
+
+
+def collection_etag(version, query_string):
+    # Paging, streaming and other query parameters change the representation, so they are part of the tag
+    return hashlib.sha1(f"contacts:{version}:".encode('utf-8') + query_string).hexdigest()
+
+
+def serialize_for_api(contact, list_indicator, fields=None):
     if str.lower(list_indicator) == 'single':
-        serialisation_schema = schema.ContactSchema()
+        serialisation_schema = schema.ContactSchema(only=fields)
     else:
-        serialisation_schema = schema.ContactSchema(many=True)
+        serialisation_schema = schema.ContactSchema(many=True, only=fields)
 
     try:
-        final_output = serialisation_schema.dump(contact)
-    except ValidationError as e:
+        with timing.phase('serialize'):
+            final_output = serialisation_schema.dump(contact)
+    except ValidationError:
         final_output = ValidationError
     return final_output
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import abc
+import threading
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,7 +9,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import config as config
-from src.contacts.adapters.repository import AbstractContactRepository, MockContactRepository, SqlAlchemyContactRepository
+from src.contacts.adapters import query_stats
+from src.contacts.adapters.pool import InstrumentedQueuePool
+from src.contacts.adapters.cache import CachedContactRepository, ContactCache
+from src.contacts.adapters.repository import AbstractContactRepository, InMemoryContactRepository, SqlAlchemyContactRepository
+from src.contacts.utils import timing
 
 # Configuration
 def update_config_type(env_type):
@@ -21,9 +26,24 @@ def update_config_type(env_type):
 
     return config_db_uri, isolation_level
 
+def config_settings(config_class):
+    """The settings of a config class as a mapping, as app.config holds them"""
+    return {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
+
+def pool_options(settings):
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings['DB_POOL_SIZE'],
+        "max_overflow": settings['DB_MAX_OVERFLOW'],
+        "pool_timeout": settings['DB_POOL_TIMEOUT'],
+        "pool_recycle": settings['DB_POOL_RECYCLE'],
+        "pool_pre_ping": settings['DB_POOL_PRE_PING']
+    }
+
 env_type = os.environ.get('ENV_TYPE')
 
 config_db_uri, isolation_level = update_config_type(env_type)
+config_class = config.ProductionConfig if env_type == "Production" else config.TestingConfig
 
 class AbstractUnitOfWork(abc.ABC):
     contacts: AbstractContactRepository
@@ -42,36 +62,109 @@ class AbstractUnitOfWork(abc.ABC):
     def rollback(self):
         raise NotImplementedError
 
-DEFAULT_SESSION_FACTORY = sessionmaker(
-    bind=create_engine(
-        config_db_uri,
-        isolation_level=isolation_level)
-)
+class LazySessionFactory:
+    """Session factory that creates its engine the first time a session or the engine is asked for
+
+    Called like a sessionmaker. Importing the module or creating an app no longer opens anything, and
+    the app, its schema bootstrap and its units of work all share the one engine and pool.
+    """
+
+    def __init__(self, database_uri, isolation_level, **engine_options):
+        self.database_uri = database_uri
+        self.isolation_level = isolation_level
+        self.engine_options = engine_options
+        self._lock = threading.Lock()
+        self._sessionmaker = None
+
+    @classmethod
+    def from_config(cls, settings):
+        return cls(settings['SQLALCHEMY_DATABASE_URI'], settings['ISOLATION_LEVEL'], **pool_options(settings))
+
+    @property
+    def engine(self):
+        return self._get_sessionmaker().kw['bind']
+
+    @property
+    def initialised(self):
+        return self._sessionmaker is not None
+
+    def __call__(self, **kwargs):
+        return self._get_sessionmaker()(**kwargs)
+
+    def warm_up(self):
+        """Open the pool's connections up front, so the first requests don't wait for them"""
+        connections = [self.engine.connect() for _ in range(self.engine.pool.size())]
+        for connection in connections:
+            connection.close()
+
+    def _get_sessionmaker(self):
+        if self._sessionmaker is None:
+            with self._lock:
+                if self._sessionmaker is None:
+                    self._sessionmaker = self._create_sessionmaker()
+        return self._sessionmaker
+
+    def _create_sessionmaker(self):
+        return sessionmaker(bind=create_engine(self.database_uri, isolation_level=self.isolation_level, **self.engine_options))
+
+DEFAULT_SESSION_FACTORY = LazySessionFactory(config_db_uri, isolation_level, **pool_options(config_settings(config_class)))
 
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
+    """Unit of work on a SQLAlchemy session
+
+    A read-only unit of work takes its session from replica_session_factory when one is given, and
+    refuses to commit - writes must always go to the primary.
+    """
 
-    def __init__(self, session_factory=DEFAULT_SESSION_FACTORY):
+    def __init__(self, session_factory=DEFAULT_SESSION_FACTORY, cache: ContactCache = None, read_only=False, replica_session_factory=None):
         self.session_factory = session_factory
+        self.cache = cache
+        self.read_only = read_only
+        self.replica_session_factory = replica_session_factory
+        self._depth = 0
 
     def __enter__(self):
-        self.session = self.session_factory()
+        # Services re-enter their unit of work, so only the outermost block is timed
+        if self._depth == 0:
+            self._timed_phase = timing.phase('uow')
+            self._timed_phase.__enter__()
+        self._depth += 1
+        on_replica = self.read_only and self.replica_session_factory is not None
+        if on_replica:
+            self.session = self.replica_session_factory()
+        else:
+            self.session = self.session_factory()
+        query_stats.instrument_engine(self.session.get_bind())
         self.contacts = SqlAlchemyContactRepository(self.session)
+        if self.cache is not None:
+            # The shared cache is only ever filled from the primary - a lagging replica row would be served
+            # for the whole TTL, even to clients reading their own writes from the primary
+            self.contacts = CachedContactRepository(self.contacts, self.cache, fill=not on_replica)
         return super().__enter__()
         
     def __exit__(self, *args):
         super().__exit__(*args)
         self.session.close()
+        self._depth -= 1
+        if self._depth == 0:
+            self._timed_phase.__exit__(*args)
 
     def commit(self):
+        if self.read_only:
+            raise RuntimeError('A read-only unit of work cannot commit')
         self.session.commit()
+        if self.cache is not None:
+            self.contacts.apply_invalidations()
 
     def rollback(self):
         self.session.rollback()
+        if self.cache is not None:
+            self.contacts.discard_invalidations()
 
 
 class MockUnitOfWork(AbstractUnitOfWork):
     def __init__(self):
-        self.contacts = MockContactRepository()
+        self.contacts = InMemoryContactRepository()
         self.committed = False
 
     def commit(self):
@@ -0,0 +1,71 @@
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+_current_timings = ContextVar('request_timings', default=None)
+_untimed = nullcontext()
+
+
+class RequestTimings:
+    """Time spent in each named phase of one request, rendered as a Server-Timing header
+
+    A phase entered more than once, e.g. serializing each contact of a listing, adds up to one total.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = {}
+        self.descriptions = {}
+
+    def add(self, name, duration, description=None):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+        if description is not None:
+            self.descriptions[name] = description
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def header(self):
+        metrics = []
+        for name, duration in self.phases.items():
+            description = self.descriptions.get(name)
+            metrics.append(f'{name};dur={duration * 1000:.3f}' + (f';desc="{description}"' if description is not None else ''))
+        return ', '.join(metrics)
+
+
+class _Phase:
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+def phase(name):
+    """Context manager adding the time spent in the block to phase name of the current request
+
+    Outside a timed request it returns a shared no-op context manager, so call sites cost one lookup.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return _untimed
+    return _Phase(timings, name)
+
+
+def current():
+    return _current_timings.get()
+
+
+def start_timing():
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def stop_timing(token):
+    _current_timings.reset(token)
@@ -1,4 +1,5 @@
 import pytest
+from contextlib import contextmanager
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -9,6 +10,7 @@ from src.contacts.domain import model
 from src.contacts.service_layer.services import ContactService
 
 from src.contacts.service_layer.unit_of_work import MockUnitOfWork
+from src.contacts.adapters.query_stats import track_queries
 
 @pytest.fixture
 def mock_uow():
@@ -73,4 +75,17 @@ def get_flask_app():
 
     with test_flask_app.test_client() as testing_client:
         with test_flask_app.app_context():
-            yield testing_client
\ No newline at end of file
+            yield testing_client
+
+
+@pytest.fixture
+def assert_max_queries():
+    """Context manager factory failing the test when the block sends more SQL statements than allowed"""
+
+    @contextmanager
+    def _assert_max_queries(max_queries):
+        with track_queries() as stats:
+            yield stats
+        assert stats.count <= max_queries, f"Expected at most {max_queries} queries, {stats.count} were sent: {list(stats.statements)}"
+
+    return _assert_max_queries
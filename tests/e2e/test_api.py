@@ -1,6 +1,13 @@
+import base64
+import datetime
 import pytest
 import json
+import sqlalchemy as sa
 
+import config
+from src.contacts.domain.model import init_database
+from src.contacts.entrypoints.app.application import create_app
+from src.contacts.entrypoints.hooks import READ_PRIMARY_COOKIE
 from src.contacts.utils.exceptions import BaseCustomException, RecordExists
 
 def test_unhappy_path_create_contact_email_in_use(postgres_test_db_cleardown, get_flask_app):
@@ -145,6 +152,29 @@ def test_happy_path_contact_creation_update_flow(postgres_test_db_cleardown, get
     assert 'No contact found with this id - 1' in get_single_contact_resp_decoded
 
 
+def test_unhappy_path_update_contact_email_in_use(postgres_test_db_cleardown, get_flask_app):
+    """Tests unhappy path of updating a contact - another contact already has the proposed email address"""
+
+    # arrange
+    for first_name in ('Jane', 'June'):
+        get_flask_app.post(
+            '/contacts',
+            json={'first_name': first_name,
+                  'last_name': 'Doe',
+                  'birthday': '1997-09-01',
+                  'email_address': f'{first_name.lower()}.doe@gmails.com'}
+        )
+
+    # act
+    response = get_flask_app.put('/contacts/2', json={'email_address': 'jane.doe@gmails.com'})
+    unchanged_response = get_flask_app.get('/contacts/2')
+
+    # assert
+    assert response.status_code == 400
+    assert 'Contact already exists with this email address - jane.doe@gmails.com' in response.data.decode('utf-8')
+    assert json.loads(unchanged_response.data.decode('utf-8'))['email_address'] == 'june.doe@gmails.com'
+
+
 def test_unhappy_path_contact_creation_update_flow(postgres_test_db_cleardown, get_flask_app):
     """Tests whether the API can handle a complete flow: contact creation fails, data retrieval fails, contact updates failure and contact deletion failure"""
 
@@ -211,4 +241,555 @@ def test_invalid_path_returns_bad_request(postgres_test_db_cleardown, get_flask_
     # assert
     assert get_response.status_code == 400
     assert 'Invalid path' in get_response_decoded
-    
\ No newline at end of file
+    
+
+def test_happy_path_retrieve_contacts_by_page(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - retrieving contacts a page at a time via the API using the next_cursor"""
+
+    # arrange
+    for first_name in ['June', 'Jane', 'Jade']:
+        get_flask_app.post(
+            '/contacts',
+            json={'first_name': first_name,
+                  'last_name': 'Doe',
+                  'birthday': '1997-09-01',
+                  'email_address': f'{first_name.lower()}.doe@gmails.com'}
+        )
+
+    # act
+    first_response = get_flask_app.get('/contacts?limit=2')
+    first_page = json.loads(first_response.data.decode('utf-8'))
+    second_response = get_flask_app.get(f'/contacts?limit=2&cursor={first_page["next_cursor"]}')
+    second_page = json.loads(second_response.data.decode('utf-8'))
+
+    # assert
+    assert first_response.status_code == 200
+    assert len(first_page["contacts"]) == 2
+    assert [contact["first_name"] for contact in second_page["contacts"]] == ['Jade']
+    assert second_page["next_cursor"] is None
+
+
+def test_unhappy_path_retrieve_contacts_by_page_invalid_limit(postgres_test_db_cleardown, get_flask_app):
+    """Tests unhappy path - retrieving a page of contacts with a limit that is out of range"""
+
+    # act
+    response = get_flask_app.get('/contacts?limit=0')
+
+    # assert
+    assert response.status_code == 400
+    assert 'limit must be between 1 and 500' in response.data.decode('utf-8')
+
+
+def test_happy_path_stream_contacts_as_ndjson(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - streaming all contacts as newline-delimited JSON via the API"""
+
+    # arrange
+    for first_name in ['June', 'Jane']:
+        get_flask_app.post(
+            '/contacts',
+            json={'first_name': first_name,
+                  'last_name': 'Doe',
+                  'birthday': '1997-09-01',
+                  'email_address': f'{first_name.lower()}.doe@gmails.com'}
+        )
+
+    # act
+    response = get_flask_app.get('/contacts', headers={'Accept': 'application/x-ndjson'})
+    lines = response.data.decode('utf-8').splitlines()
+
+    # assert
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)["first_name"] for line in lines] == ['June', 'Jane']
+
+
+def test_happy_path_bulk_create_contacts(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - creating a batch of contacts in one request via the API"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+
+    # act
+    response = get_flask_app.post(
+        '/contacts/bulk',
+        json=[{'first_name': 'Jane', 'last_name': 'Doe', 'birthday': '1993-02-10', 'email_address': 'jane.doe@gmails.com'},
+              {'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'},
+              {'first_name': 'Jade', 'last_name': 'Doe', 'birthday': '1990-13-01', 'email_address': 'jade.doe@gmails.com'}]
+    )
+    response_decoded = json.loads(response.data.decode('utf-8'))
+    all_contacts = json.loads(get_flask_app.get('/contacts').data.decode('utf-8'))
+
+    # assert
+    assert response.status_code == 207
+    assert [result["status"] for result in response_decoded["results"]] == ['created', 'duplicate', 'invalid']
+    assert response_decoded["created"] == 1
+    assert len(all_contacts) == 2
+
+
+def test_happy_path_upsert_contacts(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - upserting a batch of contacts keyed on email address via the API"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+
+    # act
+    response = get_flask_app.put(
+        '/contacts/upsert',
+        json=[{'first_name': 'Juniper', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'},
+              {'first_name': 'Jane', 'last_name': 'Doe', 'birthday': '1993-02-10', 'email_address': 'jane.doe@gmails.com'}]
+    )
+    response_decoded = json.loads(response.data.decode('utf-8'))
+    updated_contact = json.loads(get_flask_app.get('/contacts/1').data.decode('utf-8'))
+
+    # assert
+    assert response.status_code == 200
+    assert response_decoded == {'inserted': 1, 'updated': 1, 'unchanged': 0}
+    assert updated_contact["first_name"] == 'Juniper'
+
+
+def test_retrieve_contact_query_budget(postgres_test_db_cleardown, get_flask_app, assert_max_queries):
+    """Tests retrieving a single contact via the API sends one SQL statement and reports it in debug mode"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+    flask_app = get_flask_app.application
+    flask_app.debug = True
+
+    # act
+    try:
+        with assert_max_queries(1):
+            response = get_flask_app.get('/contacts/1')
+    finally:
+        flask_app.debug = False
+
+    # assert
+    assert response.status_code == 200
+    assert response.headers['X-DB-Queries'] == '1'
+    assert response.headers['X-DB-Time'].endswith('ms')
+
+
+def test_update_contact_query_budget(postgres_test_db_cleardown, get_flask_app, assert_max_queries):
+    """Tests updating a contact via the API looks it up once and reads it back from the UPDATE itself, with no duplicate queries"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+    flask_app = get_flask_app.application
+    flask_app.debug = True
+
+    # act
+    try:
+        # The lookup, the UPDATE ... RETURNING and the collection version bump
+        with assert_max_queries(3) as stats:
+            response = get_flask_app.put('/contacts/1', json={'first_name': 'Juniper'})
+    finally:
+        flask_app.debug = False
+
+    # assert
+    assert response.status_code == 201
+    assert json.loads(response.data.decode('utf-8'))["first_name"] == 'Juniper'
+    assert stats.duplicates() == []
+    assert response.headers['X-DB-Queries'] == str(stats.count)
+
+
+def test_query_stats_are_only_reported_when_enabled(postgres_test_db_cleardown, get_flask_app):
+    """Tests statements aren't counted or reported per request outside debug mode unless QUERY_STATS_ENABLED is set"""
+
+    # arrange
+    flask_app = get_flask_app.application
+
+    # act
+    default_response = get_flask_app.get('/contacts')
+    flask_app.config['QUERY_STATS_ENABLED'] = True
+    try:
+        enabled_response = get_flask_app.get('/contacts')
+    finally:
+        flask_app.config['QUERY_STATS_ENABLED'] = False
+
+    # assert
+    assert 'X-DB-Queries' not in default_response.headers
+    # The collection version and the contacts
+    assert enabled_response.headers['X-DB-Queries'] == '2'
+
+
+def test_conditional_retrieve_contact_with_etag(postgres_test_db_cleardown, get_flask_app, assert_max_queries):
+    """Tests retrieving a contact with If-None-Match returns 304 until the contact is updated"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+    etag = get_flask_app.get('/contacts/1').headers['ETag']
+
+    # act
+    with assert_max_queries(1):
+        not_modified_response = get_flask_app.get('/contacts/1', headers={'If-None-Match': etag})
+    get_flask_app.put('/contacts/1', json={'first_name': 'Juniper'})
+    modified_response = get_flask_app.get('/contacts/1', headers={'If-None-Match': etag})
+
+    # assert
+    assert not_modified_response.status_code == 304
+    assert not_modified_response.data == b''
+    assert not_modified_response.headers['ETag'] == etag
+    assert modified_response.status_code == 200
+    assert modified_response.headers['ETag'] != etag
+    assert json.loads(modified_response.data.decode('utf-8'))["first_name"] == 'Juniper'
+
+
+def test_conditional_retrieve_all_contacts_with_etag(postgres_test_db_cleardown, get_flask_app, assert_max_queries):
+    """Tests retrieving all contacts with If-None-Match returns 304 until the collection changes"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+    etag = get_flask_app.get('/contacts').headers['ETag']
+
+    # act
+    with assert_max_queries(1):
+        not_modified_response = get_flask_app.get('/contacts', headers={'If-None-Match': etag})
+    paged_response = get_flask_app.get('/contacts?limit=1', headers={'If-None-Match': etag})
+    get_flask_app.delete('/contacts/1')
+    modified_response = get_flask_app.get('/contacts', headers={'If-None-Match': etag})
+
+    # assert
+    assert not_modified_response.status_code == 304
+    assert paged_response.status_code == 200
+    assert modified_response.status_code == 200
+    assert json.loads(modified_response.data.decode('utf-8')) == []
+
+
+def test_conditional_retrieve_with_a_weak_etag(postgres_test_db_cleardown, get_flask_app):
+    """Tests If-None-Match is compared weakly - a W/ tag, as proxies pass on, still answers 304 for a contact and the collection"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+    contact_etag = get_flask_app.get('/contacts/1').headers['ETag']
+    collection_etag = get_flask_app.get('/contacts').headers['ETag']
+
+    # act
+    contact_response = get_flask_app.get('/contacts/1', headers={'If-None-Match': f'W/{contact_etag}'})
+    collection_response = get_flask_app.get('/contacts', headers={'If-None-Match': f'"other", W/{collection_etag}'})
+
+    # assert
+    assert contact_response.status_code == 304
+    assert collection_response.status_code == 304
+
+
+def test_unhappy_path_create_contact_invalid_json(postgres_test_db_cleardown, get_flask_app):
+    """Tests unhappy path - creating a contact with a body that is not valid JSON returns Bad Request"""
+
+    # act
+    response = get_flask_app.post('/contacts', data='{"first_name": "Jane",', content_type='application/json')
+
+    # assert
+    assert response.status_code == 400
+    assert 'Request body must be valid JSON' in response.data.decode('utf-8')
+
+
+def test_happy_path_retrieve_contacts_with_sparse_fieldset(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - retrieving contacts and a single contact with only the fields asked for via the API"""
+
+    # arrange
+    get_flask_app.post(
+        '/contacts',
+        json={'first_name': 'June',
+              'last_name': 'Doe',
+              'birthday': '1997-09-01',
+              'email_address': 'june.doe@gmails.com'}
+    )
+
+    # act
+    list_response = get_flask_app.get('/contacts?fields=email_address')
+    page_response = get_flask_app.get('/contacts?fields=email_address&limit=1')
+    single_response = get_flask_app.get('/contacts/1?fields=first_name,email_address')
+    unknown_field_response = get_flask_app.get('/contacts?fields=password')
+
+    # assert
+    assert json.loads(list_response.data.decode('utf-8')) == [{'id': 1, 'email_address': 'june.doe@gmails.com'}]
+    assert json.loads(page_response.data.decode('utf-8'))["contacts"] == [{'id': 1, 'email_address': 'june.doe@gmails.com'}]
+    assert json.loads(single_response.data.decode('utf-8')) == {'id': 1, 'first_name': 'June', 'email_address': 'june.doe@gmails.com'}
+    assert single_response.headers['ETag'] != get_flask_app.get('/contacts/1').headers['ETag']
+    assert unknown_field_response.status_code == 400
+    assert 'Unknown field(s): password' in unknown_field_response.data.decode('utf-8')
+
+
+def test_happy_path_retrieve_filtered_and_sorted_contacts(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - retrieving contacts filtered by query parameters and sorted, a page at a time, via the API"""
+
+    # arrange
+    for first_name, last_name in [('June', 'Doe'), ('Jane', 'Dodd'), ('Jade', 'Doe'), ('Jack', 'Smith')]:
+        get_flask_app.post(
+            '/contacts',
+            json={'first_name': first_name,
+                  'last_name': last_name,
+                  'birthday': '1997-09-01',
+                  'email_address': f'{first_name.lower()}.{last_name.lower()}@gmails.com'}
+        )
+
+    # act
+    first_response = get_flask_app.get('/contacts?last_name_prefix=Do&sort=last_name,first_name&limit=2')
+    first_page = json.loads(first_response.data.decode('utf-8'))
+    second_response = get_flask_app.get(f'/contacts?last_name_prefix=Do&sort=last_name,first_name&limit=2&cursor={first_page["next_cursor"]}')
+    second_page = json.loads(second_response.data.decode('utf-8'))
+    exact_response = get_flask_app.get('/contacts?last_name=Doe&first_name=June&fields=first_name')
+    invalid_response = get_flask_app.get('/contacts?birthday_from=last-year')
+
+    # assert
+    assert [contact["first_name"] for contact in first_page["contacts"]] == ['Jane', 'Jade']
+    assert [contact["first_name"] for contact in second_page["contacts"]] == ['June']
+    assert json.loads(exact_response.data.decode('utf-8')) == [{'id': 1, 'first_name': 'June'}]
+    assert invalid_response.status_code == 400
+    assert 'birthday_from must be a date (YYYY-MM-DD)' in invalid_response.data.decode('utf-8')
+
+
+def test_happy_path_search_contacts(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - searching contacts by partial name or email address via the API"""
+
+    # arrange
+    for first_name, last_name in [('June', 'Doe'), ('Jane', 'Dodd'), ('Jack', 'Smith')]:
+        get_flask_app.post(
+            '/contacts',
+            json={'first_name': first_name,
+                  'last_name': last_name,
+                  'birthday': '1997-09-01',
+                  'email_address': f'{first_name.lower()}@{last_name.lower()}.com'}
+        )
+
+    # act
+    response = get_flask_app.get('/contacts/search?q=do')
+    limited_response = get_flask_app.get('/contacts/search?q=j&limit=1')
+    missing_query_response = get_flask_app.get('/contacts/search')
+
+    # assert
+    assert response.status_code == 200
+    assert {contact["first_name"] for contact in json.loads(response.data.decode('utf-8'))} == {'June', 'Jane'}
+    assert len(json.loads(limited_response.data.decode('utf-8'))) == 1
+    assert missing_query_response.status_code == 400
+
+
+def test_happy_path_autocomplete_contacts(postgres_test_db_cleardown, monkeypatch):
+    """Tests happy path - autocomplete suggestions come from the typeahead index loaded at startup and follow new contacts"""
+
+    # arrange
+    monkeypatch.setattr(config.TestingConfig, 'TYPEAHEAD_ENABLED', True)
+    setup_app = create_app()
+    setup_app.test_client().post(
+        '/contacts',
+        json={'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'}
+    )
+    flask_app = create_app()
+    client = flask_app.test_client()
+
+    # act
+    client.post(
+        '/contacts',
+        json={'first_name': 'Jane', 'last_name': 'Dodd', 'birthday': '1997-09-01', 'email_address': 'jane.dodd@gmails.com'}
+    )
+    response = client.get('/contacts/autocomplete?q=do')
+
+    # assert
+    assert response.status_code == 200
+    assert [suggestion["first_name"] for suggestion in json.loads(response.data.decode('utf-8'))] == ['June', 'Jane']
+    assert flask_app.extensions['typeahead_index'].stats()["contacts"] == 2
+
+
+def test_happy_path_retrieve_upcoming_birthdays(postgres_test_db_cleardown, get_flask_app):
+    """Tests happy path - retrieving the contacts with a birthday in the next days via the API"""
+
+    # arrange
+    today = datetime.date.today()
+    for first_name, birthday in [('June', today.replace(year=1992)), ('Jane', today.replace(year=1992) - datetime.timedelta(days=1))]:
+        get_flask_app.post(
+            '/contacts',
+            json={'first_name': first_name,
+                  'last_name': 'Doe',
+                  'birthday': birthday.isoformat(),
+                  'email_address': f'{first_name.lower()}.doe@gmails.com'}
+        )
+
+    # act
+    response = get_flask_app.get('/contacts/birthdays?within_days=0&fields=first_name')
+    invalid_response = get_flask_app.get('/contacts/birthdays?within_days=soon')
+
+    # assert
+    assert response.status_code == 200
+    assert json.loads(response.data.decode('utf-8')) == [{'id': 1, 'first_name': 'June'}]
+    assert invalid_response.status_code == 400
+
+
+def test_retrieve_db_pool_stats(postgres_test_db_cleardown, get_flask_app):
+    """Tests the connection pool statistics are reported via the API"""
+
+    # arrange
+    get_flask_app.get('/contacts')
+
+    # act
+    response = get_flask_app.get('/status/db-pool')
+    stats = json.loads(response.data.decode('utf-8'))
+
+    # assert
+    assert response.status_code == 200
+    assert stats["instrumented"] is True
+    assert stats["checkouts"] >= 1
+    assert stats["checked_out"] == 0
+
+
+def test_happy_path_warm_up_fills_the_pool_at_startup(postgres_test_db_cleardown, monkeypatch):
+    """Tests happy path - with warm-up enabled the app starts with a full pool and serves requests from it"""
+
+    # arrange
+    monkeypatch.setattr(config.TestingConfig, 'DB_WARMUP', True)
+    monkeypatch.setattr(config.TestingConfig, 'DB_POOL_SIZE', 2)
+
+    # act
+    flask_app = create_app()
+    pool_stats = flask_app.extensions['session_factory'].engine.pool.stats()
+    response = flask_app.test_client().get('/contacts')
+
+    # assert
+    assert pool_stats["size"] == 2
+    assert pool_stats["checked_in"] == 2
+    assert response.status_code == 200
+
+
+def test_happy_path_reads_go_to_the_replica_except_just_after_a_write(postgres_test_db_cleardown, monkeypatch, tmp_path):
+    """Tests happy path - with a replica configured, reads use it unless the client wrote within the stickiness window"""
+
+    # arrange
+    replica_uri = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_engine = sa.create_engine(replica_uri)
+    with replica_engine.begin() as connection:
+        init_database(connection)
+    monkeypatch.setattr(config.TestingConfig, 'REPLICA_DATABASE_URI', replica_uri)
+    flask_app = create_app()
+    writing_client = flask_app.test_client()
+    other_client = flask_app.test_client()
+
+    # act
+    created_response = writing_client.post(
+        '/contacts',
+        json={'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'}
+    )
+    own_read_response = writing_client.get('/contacts/1')
+    other_read_response = other_client.get('/contacts/1')
+    writing_client.set_cookie(READ_PRIMARY_COOKIE, '0')
+    expired_read_response = writing_client.get('/contacts/1')
+
+    # assert
+    assert READ_PRIMARY_COOKIE in created_response.headers['Set-Cookie']
+    assert own_read_response.status_code == 200
+    assert other_read_response.status_code == 404
+    assert expired_read_response.status_code == 404
+
+
+def test_happy_path_server_timing_breaks_requests_down_by_phase(postgres_test_db_cleardown, monkeypatch):
+    """Tests happy path - with Server-Timing enabled each response reports the time spent in each phase"""
+
+    # arrange
+    monkeypatch.setattr(config.TestingConfig, 'SERVER_TIMING_ENABLED', True)
+    client = create_app().test_client()
+
+    # act
+    created_response = client.post(
+        '/contacts',
+        json={'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'}
+    )
+    read_response = client.get('/contacts/1')
+
+    # assert
+    created_phases = {metric.split(';')[0] for metric in created_response.headers['Server-Timing'].split(', ')}
+    read_phases = {metric.split(';')[0] for metric in read_response.headers['Server-Timing'].split(', ')}
+    assert created_phases == {'validate', 'uow', 'serialize', 'json', 'db', 'total'}
+    assert read_phases == {'uow', 'serialize', 'db', 'total'}
+    assert 'desc="1 query"' in read_response.headers['Server-Timing']
+
+
+def test_server_timing_is_off_by_default(postgres_test_db_cleardown, get_flask_app):
+    """Tests no Server-Timing header is sent unless it is enabled"""
+
+    # act
+    response = get_flask_app.get('/contacts')
+
+    # assert
+    assert 'Server-Timing' not in response.headers
+
+
+def test_happy_path_metrics_report_requests_errors_and_pool(postgres_test_db_cleardown):
+    """Tests happy path - /metrics reports request counts and latencies by route, error counts and pool gauges"""
+
+    # arrange
+    client = create_app().test_client()
+    contact = {'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'}
+    client.post('/contacts', json=contact)
+    client.post('/contacts', json=contact)
+    client.get('/contacts/99')
+
+    # act
+    response = client.get('/metrics')
+    text = response.data.decode('utf-8')
+
+    # assert
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert 'crm_http_requests_total{method="POST",route="/contacts",status="201"} 1' in text
+    assert 'crm_http_requests_total{method="POST",route="/contacts",status="400"} 1' in text
+    assert 'crm_http_request_duration_seconds_count{method="GET",route="/contacts/<int:id>",status="404"} 1' in text
+    assert 'crm_errors_total{endpoint="add_contact",exception="RecordExists"} 1' in text
+    assert 'crm_errors_total{endpoint="get_contact",exception="InvalidRecord"} 1' in text
+    assert 'crm_db_pool_checked_out{database="primary"} 0' in text
+    assert '# TYPE crm_http_request_duration_seconds histogram' in text
+
+
+def test_unhappy_path_retrieve_contacts_with_edge_case_prefix_and_cursor(postgres_test_db_cleardown, get_flask_app):
+    """Tests a prefix ending in the last Unicode code point is served, and a cursor with a non-string sort key is a bad request"""
+
+    # arrange
+    cursor = base64.urlsafe_b64encode(json.dumps({'id': 1, 'keys': [{'last_name': 'Doe'}]}).encode('utf-8')).decode('ascii')
+
+    # act
+    prefix_response = get_flask_app.get('/contacts?first_name_prefix=%F4%8F%BF%BF')
+    cursor_response = get_flask_app.get(f'/contacts?sort=last_name&limit=2&cursor={cursor}')
+
+    # assert
+    assert prefix_response.status_code == 200
+    assert json.loads(prefix_response.data.decode('utf-8')) == []
+    assert cursor_response.status_code == 400
+    assert 'Invalid cursor' in cursor_response.data.decode('utf-8')
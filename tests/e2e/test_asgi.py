@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import config
+from src.contacts.entrypoints.asgi import create_asgi_app
+
+
+class AsgiTestClient:
+    """Calls an ASGI app directly, collecting the response messages"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, json_body=None, query_string=b'', headers=()):
+        body = json.dumps(json_body).encode('utf-8') if json_body is not None else b''
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+                 'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+        await self.app(scope, receive, send)
+        return messages[0]['status'], dict(messages[0]['headers']), b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def run_against_asgi_app(scenario):
+    """Run a coroutine function with a client for a new ASGI app, going through the lifespan events in the same event loop"""
+    app = create_asgi_app(config.TestingConfig)
+
+    async def run():
+        lifespan_messages = asyncio.Queue()
+        for message_type in ('lifespan.startup', 'lifespan.shutdown'):
+            lifespan_messages.put_nowait({'type': message_type})
+        sent = []
+
+        async def send(message):
+            sent.append(message['type'])
+            if message['type'] == 'lifespan.startup.complete':
+                result.append(await scenario(AsgiTestClient(app)))
+
+        result = []
+        await app({'type': 'lifespan'}, lifespan_messages.get, send)
+        assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        return result[0]
+
+    return asyncio.run(run())
+
+
+def test_happy_path_asgi_create_and_retrieve_contact(postgres_test_db_cleardown):
+    """Tests happy path - creating a contact and reading it back, as a page and by id, via the ASGI app"""
+
+    # arrange
+    async def scenario(client):
+        created = await client.request('POST', '/contacts', {'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'})
+        page = await client.request('GET', '/contacts', query_string=b'limit=10&fields=first_name')
+        contact = await client.request('GET', '/contacts/1')
+        revalidated = await client.request('GET', '/contacts/1', headers=[('If-None-Match', contact[1][b'etag'].decode('latin-1'))])
+        # Compared weakly, so a tag a proxy has marked W/ still matches
+        weakly_revalidated = await client.request('GET', '/contacts', query_string=b'limit=10&fields=first_name',
+                                                  headers=[('If-None-Match', f"W/{page[1][b'etag'].decode('latin-1')}")])
+        return created, page, contact, revalidated, weakly_revalidated
+
+    # act
+    created, page, contact, revalidated, weakly_revalidated = run_against_asgi_app(scenario)
+
+    # assert
+    assert created[0] == 201
+    assert json.loads(created[2])['email_address'] == 'june.doe@gmails.com'
+    assert page[0] == 200
+    assert json.loads(page[2]) == {'contacts': [{'id': 1, 'first_name': 'June'}], 'next_cursor': None}
+    assert contact[0] == 200
+    assert json.loads(contact[2])['first_name'] == 'June'
+    assert revalidated[0] == 304
+    assert revalidated[2] == b''
+    assert weakly_revalidated[0] == 304
+
+
+def test_unhappy_path_asgi_error_contract_matches_flask(postgres_test_db_cleardown, get_flask_app):
+    """Tests unhappy path - the ASGI app answers duplicate, missing, invalid and unknown requests exactly as the Flask app does"""
+
+    # arrange
+    contact = {'first_name': 'June', 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': 'june.doe@gmails.com'}
+    requests = [('POST', '/contacts', contact), ('POST', '/contacts', contact), ('GET', '/contacts/99', None),
+                ('POST', '/contacts', {'first_name': 'June'}), ('GET', '/unknown', None)]
+
+    async def scenario(client):
+        return [await client.request(method, path, body) for method, path, body in requests]
+
+    # act
+    asgi_responses = run_against_asgi_app(scenario)
+    get_flask_app.delete('/contacts/1')
+    flask_responses = [get_flask_app.open(path, method=method, json=body) for method, path, body in requests]
+
+    # assert
+    assert [status for status, _, _ in asgi_responses] == [201, 400, 404, 422, 400]
+    assert [status for status, _, _ in asgi_responses[1:]] == [response.status_code for response in flask_responses[1:]]
+    assert [body for _, _, body in asgi_responses[1:]] == [response.data for response in flask_responses[1:]]
+
+
+def test_unhappy_path_asgi_update_contact_email_in_use(postgres_test_db_cleardown):
+    """Tests unhappy path - updating a contact to another contact's email address is rejected via the ASGI app"""
+
+    # arrange
+    async def scenario(client):
+        for first_name in ('Jane', 'June'):
+            await client.request('POST', '/contacts', {'first_name': first_name, 'last_name': 'Doe', 'birthday': '1997-09-01', 'email_address': f'{first_name.lower()}.doe@gmails.com'})
+        return await client.request('PUT', '/contacts/2', {'email_address': 'jane.doe@gmails.com'})
+
+    # act
+    status, _, body = run_against_asgi_app(scenario)
+
+    # assert
+    assert status == 400
+    assert 'Contact already exists with this email address - jane.doe@gmails.com' in body.decode('utf-8')
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from config import TestingConfig
+from src.contacts.adapters.pool import InstrumentedQueuePool
+from src.contacts.service_layer.unit_of_work import LazySessionFactory, config_settings, pool_options
+
+
+def test_pool_records_checkouts_waits_and_timeouts(tmp_path):
+    """Tests the instrumented pool counts checkouts, how long they waited and those that timed out"""
+
+    # arrange
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    connection = engine.connect()
+
+    # act
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    stats = engine.pool.stats()
+    connection.close()
+
+    # assert
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["checked_out"] == 1
+    assert stats["max_wait_ms"] >= 50
+    assert engine.pool.stats()["checked_in"] == 1
+
+
+def test_pool_options_follow_config(monkeypatch, tmp_path):
+    """Tests the pool settings of the config class are applied to the engine, and survive the pool being recreated"""
+
+    # arrange
+    monkeypatch.setattr(TestingConfig, 'DB_POOL_SIZE', 3)
+    monkeypatch.setattr(TestingConfig, 'DB_MAX_OVERFLOW', 2)
+
+    # act
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **pool_options(config_settings(TestingConfig)))
+    engine.dispose()
+
+    # assert
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert engine.pool.stats()["size"] == 3
+    assert engine.pool.stats()["max_overflow"] == 2
+    assert engine.pool._pre_ping is True
+
+
+def test_lazy_session_factory_creates_its_engine_on_first_use(tmp_path):
+    """Tests the session factory opens nothing until a session is asked for, and then reuses one engine"""
+
+    # arrange
+    session_factory = LazySessionFactory(f"sqlite:///{tmp_path / 'lazy.db'}", 'SERIALIZABLE', **pool_options(config_settings(TestingConfig)))
+
+    # act
+    initialised_before = session_factory.initialised
+    with session_factory() as session:
+        bind = session.get_bind()
+
+    # assert
+    assert initialised_before is False
+    assert session_factory.initialised is True
+    assert bind is session_factory.engine
+
+
+def test_lazy_session_factory_warm_up_fills_the_pool(tmp_path):
+    """Tests warming up the session factory leaves a full pool of idle connections"""
+
+    # arrange
+    session_factory = LazySessionFactory(f"sqlite:///{tmp_path / 'warm.db'}", 'SERIALIZABLE', poolclass=InstrumentedQueuePool, pool_size=3, max_overflow=0)
+
+    # act
+    session_factory.warm_up()
+
+    # assert
+    assert session_factory.engine.pool.stats()["checked_in"] == 3
+    assert session_factory.engine.pool.stats()["checked_out"] == 0
@@ -1,9 +1,11 @@
 import datetime
 import pytest
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import UnmappedInstanceError
 
-from src.contacts.adapters.repository import SqlAlchemyContactRepository
-from src.contacts.domain.model import Contact
+from src.contacts.adapters.repository import SqlAlchemyContactRepository, filter_and_sort, page_statement
+from src.contacts.domain.model import COLLECTION_VERSION_SLOTS, Contact, init_database
 
 
 def test_repository_add_and_retrieve_contact_success(new_session_empty_db):
@@ -24,6 +26,42 @@ def test_repository_add_and_retrieve_contact_success(new_session_empty_db):
     assert retrieved_contact.last_name == 'Doe'
 
 
+def test_repository_add_contact_with_email_in_use_fails(new_session_empty_db):
+    """Tests unhappy path when adding a Contact record whose email address is already in use - the unique index rejects it"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    repo.add(Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+    new_session_empty_db.commit()
+
+    # act
+    with pytest.raises(IntegrityError):
+        repo.add(Contact(first_name='Jamelia', last_name='Doe', birthday=datetime.date(1992, 4, 19), email_address='julianne.doe@gmails.com'))
+    new_session_empty_db.rollback()
+
+    # assert
+    assert len(repo.get_all()) == 1
+
+
+def test_repository_add_returns_generated_columns_in_one_statement(new_session_empty_db):
+    """Tests that adding a Contact record reads id and timestamps back from the INSERT itself with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    statements = []
+    event.listen(new_session_empty_db.get_bind(), 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+
+    # act
+    contact = repo.add(Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+    contact_id, created_at = contact.id, contact.created_at
+
+    # assert
+    assert len(statements) == 1
+    assert 'RETURNING' in statements[0]
+    assert contact_id == 1
+    assert created_at is not None
+
+
 def test_repository_retrieve_contact_fail(new_session_empty_db):
     """Tests unhappy path when retrieving a Contact record that doesn't exist with the Contact Repository"""
 
@@ -56,6 +94,173 @@ def test_repository_add_and_retrieve_multiple_contacts_success(new_session_empty
     assert len(all_contacts) == 2 
 
 
+def test_repository_get_page_seeks_past_cursor(new_session_empty_db):
+    """Tests happy path when retrieving a page of contacts after a given id with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    for index in range(5):
+        repo.add(Contact(first_name=f'Julianne{index}', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address=f'julianne{index}.doe@gmails.com'))
+    new_session_empty_db.commit()
+
+    # act
+    page = repo.get_page(2, after_id=2)
+
+    # assert
+    assert [contact.id for contact in page] == [3, 4]
+
+
+def test_repository_iter_batches_reads_all_contacts(new_session_empty_db):
+    """Tests happy path when reading every contact in fixed-size batches with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    for index in range(5):
+        repo.add(Contact(first_name=f'Julianne{index}', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address=f'julianne{index}.doe@gmails.com'))
+    new_session_empty_db.commit()
+
+    # act
+    batches = list(repo.iter_batches(2))
+
+    # assert
+    assert [[contact.id for contact in batch] for batch in batches] == [[1, 2], [3, 4], [5]]
+
+
+def test_repository_get_page_selects_only_requested_fields(new_session_empty_db):
+    """Tests a page of contacts projected to some fields reads just those columns, plus id, with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    statements = []
+    event.listen(new_session_empty_db.get_bind(), 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+    repo.add(Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+    new_session_empty_db.commit()
+    statements.clear()
+
+    # act
+    page = repo.get_page(10, fields=('email_address',))
+    contact = repo.get_fields_by_id(1, ('first_name',))
+
+    # assert
+    assert page[0]._fields == ('id', 'email_address')
+    assert contact._fields == ('id', 'first_name')
+    assert 'first_name' not in statements[0] and 'birthday' not in statements[0]
+    assert repo.get_fields_by_id(2, ('first_name',)) is None
+
+
+def test_repository_get_page_filters_and_sorts(new_session_empty_db):
+    """Tests paging through filtered contacts in a mixed ascending/descending order with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    for first_name, last_name, domain in [('Jade', 'Doe', 'gmails.com'), ('June', 'Doe', 'gmails.com'), ('Jane', 'Dodd', 'gmails.com'),
+                                          ('Jill', 'Doe', 'work.com'), ('Jack', 'Smith', 'gmails.com')]:
+        repo.add(Contact(first_name=first_name, last_name=last_name, birthday=datetime.date(1999, 3, 13), email_address=f'{first_name.lower()}@{domain}'))
+    new_session_empty_db.commit()
+    filters = {'last_name_prefix': 'Do', 'email_domain': 'gmails.com'}
+    sort = ('last_name', '-first_name')
+
+    # act
+    first_page = repo.get_page(2, filters=filters, sort=sort)
+    second_page = repo.get_page(2, after_id=first_page[-1].id, filters=filters, sort=sort, after_keys=['Doe', 'June'])
+
+    # assert
+    assert [contact.first_name for contact in first_page] == ['Jane', 'June']
+    assert [contact.first_name for contact in second_page] == ['Jade']
+
+
+def test_repository_sorted_pages_after_a_cursor_seek_the_index(new_session_empty_db):
+    """Tests pages after a cursor seek the sort index, for a single direction sort and for mixed directions"""
+
+    # arrange
+    statements = [page_statement(50, 10, None, None, sort, ['Doe', 'Jane']) for sort in (('last_name', 'first_name'), ('-last_name', 'first_name'))]
+
+    # act
+    plans = [new_session_empty_db.execute(text(f'EXPLAIN QUERY PLAN {statement.compile(compile_kwargs={"literal_binds": True})}')).all() for statement in statements]
+
+    # assert
+    for plan in plans:
+        assert any(row.detail.startswith('SEARCH contact USING INDEX ix_contact_last_name_first_name') for row in plan)
+
+
+def test_repository_prefix_filter_ending_in_the_last_code_point(new_session_empty_db):
+    """Tests a prefix ending in U+10FFFF, which has no next character to bound the range, matches by prefix alone"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    repo.add(Contact(first_name='Jane', last_name='Doe\U0010ffff', birthday=datetime.date(1997, 9, 1), email_address='jane.doe@gmails.com'))
+    repo.add(Contact(first_name='June', last_name='Doe', birthday=datetime.date(1992, 4, 2), email_address='june.doe@gmails.com'))
+    new_session_empty_db.commit()
+
+    # act
+    rows = repo.get_all_rows(('first_name',), {'last_name_prefix': 'Doe\U0010ffff'})
+    unbounded_rows = repo.get_all_rows(('first_name',), {'last_name_prefix': '\U0010ffff'})
+
+    # assert
+    assert [row.first_name for row in rows] == ['Jane']
+    assert unbounded_rows == []
+
+
+def test_repository_name_filter_and_sort_use_composite_index(new_session_empty_db):
+    """Tests a last name prefix filter sorted by last and first name is answered from the composite index"""
+
+    # arrange
+    statement = filter_and_sort(select(Contact.id), {'last_name_prefix': 'Do'}, ('last_name', 'first_name'))
+
+    # act
+    plan = new_session_empty_db.execute(text(f'EXPLAIN QUERY PLAN {statement.compile(compile_kwargs={"literal_binds": True})}')).all()
+
+    # assert
+    assert any('ix_contact_last_name_first_name' in row.detail for row in plan)
+    assert not any('TEMP B-TREE' in row.detail for row in plan)
+
+
+def test_repository_search_uses_full_text_index_kept_in_sync(new_session_empty_db):
+    """Tests full-text search by name and email prefixes follows inserts, updates and deletes with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    for first_name, last_name, email_address in [('Janice', 'Doe', 'janice@gmails.com'), ('June', 'Smith', 'june@work.com'), ('Jack', 'Janssen', 'jack@gmails.com')]:
+        repo.add(Contact(first_name=first_name, last_name=last_name, birthday=datetime.date(1999, 3, 13), email_address=email_address))
+    new_session_empty_db.commit()
+
+    # act
+    by_name = repo.search(['jan'], 10)
+    by_email = repo.search(['work'], 10, fields=('email_address',))
+    repo.update(2, {'email_address': 'june@home.com'})
+    repo.delete_by_id(3)
+    new_session_empty_db.commit()
+
+    # assert
+    assert {contact.id for contact in by_name} == {1, 3}
+    assert [contact.email_address for contact in by_email] == ['june@work.com']
+    assert repo.search(['work'], 10) == []
+    assert [contact.id for contact in repo.search(['jan'], 10)] == [1]
+    assert len(repo.search(['j'], 1)) == 1
+
+
+def test_repository_get_birthdays_between_uses_month_day_index(new_session_empty_db):
+    """Tests birthdays in a month/day range, including one over the new year, are read with index range scans"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    for index, birthday in enumerate([datetime.date(1999, 12, 31), datetime.date(1985, 1, 2), datetime.date(2001, 6, 15), datetime.date(1990, 12, 29)]):
+        repo.add(Contact(first_name=f'Julianne{index}', last_name='Doe', birthday=birthday, email_address=f'julianne{index}.doe@gmails.com'))
+    new_session_empty_db.commit()
+    statements = []
+    event.listen(new_session_empty_db.get_bind(), 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+
+    # act
+    over_new_year = repo.get_birthdays_between(1228, 104)
+    summer = repo.get_birthdays_between(601, 630, fields=('first_name',))
+    plan = new_session_empty_db.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statements[-1]}', (601, 630)).all()
+
+    # assert
+    assert [contact.birthday for contact in over_new_year] == [datetime.date(1990, 12, 29), datetime.date(1999, 12, 31), datetime.date(1985, 1, 2)]
+    assert [contact.first_name for contact in summer] == ['Julianne2']
+    assert any('ix_contact_birthday_month_day' in row.detail for row in plan)
+
+
 def test_repository_retrieve_contact_by_email_address_success(new_session_empty_db):
     """Tests happy path when retrieving a contact with their email address using the Contact Repository"""
 
@@ -89,6 +294,47 @@ def test_repository_retrieve_contact_by_email_address_fail(new_session_empty_db)
     assert retrieved_contact is None
 
 
+def test_repository_upsert_many_contacts(new_session_empty_db):
+    """Tests bulk upsert with the Contact Repository - unchanged rows keep their last_updated_at"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    repo.add(Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+    repo.add(Contact(first_name='John', last_name='Doe', birthday=datetime.date(1995, 2, 11), email_address='john.doe@gmails.com'))
+    new_session_empty_db.commit()
+    unchanged_last_updated_at = repo.get_by_id(1).last_updated_at
+
+    # act
+    outcome = repo.upsert_many([
+        {'first_name': 'Julianne', 'last_name': 'Doe', 'birthday': datetime.date(1999, 3, 13), 'email_address': 'julianne.doe@gmails.com'},
+        {'first_name': 'Johnny', 'last_name': 'Doe', 'birthday': datetime.date(1995, 2, 11), 'email_address': 'john.doe@gmails.com'},
+        {'first_name': 'Jamelia', 'last_name': 'Doe', 'birthday': datetime.date(1992, 4, 19), 'email_address': 'jamelia.doe@gmails.com'},
+    ])
+    new_session_empty_db.commit()
+
+    # assert
+    assert outcome == {'inserted': {'jamelia.doe@gmails.com': 3}, 'updated': {'john.doe@gmails.com': 2}, 'unchanged': 1}
+    assert repo.get_by_id(1).last_updated_at == unchanged_last_updated_at
+    assert repo.get_by_id(2).first_name == 'Johnny'
+
+
+def test_repository_bump_collection_version(new_session_empty_db):
+    """Tests the contact collection version starts at zero and is incremented in the current transaction with the Contact Repository"""
+
+    # arrange
+    repo = SqlAlchemyContactRepository(new_session_empty_db)
+    initial_version = repo.get_collection_version()
+
+    # act
+    for _ in range(COLLECTION_VERSION_SLOTS + 1):
+        repo.bump_collection_version()
+    new_session_empty_db.commit()
+
+    # assert
+    assert initial_version == 0
+    assert repo.get_collection_version() == COLLECTION_VERSION_SLOTS + 1
+
+
 def test_repository_update_contact_success(new_session_empty_db):
     """Tests happy path when updating an existing contact using the Contact Repository"""
 
@@ -165,4 +411,31 @@ def test_repository_delete_contact_fail(new_session_empty_db):
     all_contacts = repo.get_all()
 
     # assert
-    assert len(all_contacts) == 1
\ No newline at end of file
+    assert len(all_contacts) == 1
+
+
+def test_init_database_names_duplicate_email_addresses_before_adding_the_unique_index(tmp_path):
+    """Tests bootstrapping a contact table from before the unique email index fails clearly, naming the duplicates, until they are resolved"""
+
+    # arrange
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE contact (id INTEGER PRIMARY KEY, first_name VARCHAR(255) NOT NULL, last_name VARCHAR(255) NOT NULL, "
+                                   "birthday DATE NOT NULL, email_address VARCHAR(255) NOT NULL, created_at DATETIME NOT NULL, last_updated_at DATETIME NOT NULL)")
+        for id, email_address in enumerate(['june.doe@gmails.com', 'june.doe@gmails.com', 'jane.doe@gmails.com'], start=1):
+            connection.exec_driver_sql("INSERT INTO contact VALUES (?, 'June', 'Doe', '1997-09-01', ?, '2026-01-01 00:00:00', '2026-01-01 00:00:00')", (id, email_address))
+
+    # act
+    with pytest.raises(RuntimeError) as excinfo:
+        with engine.begin() as connection:
+            init_database(connection)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM contact WHERE id = 2")
+        init_database(connection)
+    with pytest.raises(IntegrityError):
+        with engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO contact VALUES (4, 'June', 'Doe', '1997-09-01', 'jane.doe@gmails.com', '2026-01-01 00:00:00', '2026-01-01 00:00:00')")
+
+    # assert
+    assert 'june.doe@gmails.com' in str(excinfo.value)
+    assert 'jane.doe@gmails.com' not in str(excinfo.value)
@@ -1,9 +1,19 @@
 import datetime
+import time
 import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.exc import UnmappedInstanceError
 
+from src.contacts.domain import model
 from src.contacts.domain.model import Contact
 from src.contacts.service_layer.unit_of_work import SqlAlchemyUnitOfWork
+from src.contacts.service_layer.services import ContactService, collection_etag
+from src.contacts.adapters.repository import SqlAlchemyContactRepository
+from src.contacts.adapters.query_stats import track_queries
+from src.contacts.adapters.cache import ContactCache
+from src.contacts.utils import timing
 
 def test_uow_can_add_and_retrieve_contact_success(new_session_empty_db, session_factory):
     """Tests happy path of adding and retrieving a contact with the unit of work"""
@@ -171,4 +181,228 @@ def test_uow_can_update_contact_successfully(new_session_empty_db, session_facto
     assert contact_retrieved.first_name == 'Jamelia'
     assert contact_retrieved.last_name == 'Doe'
     assert str(contact_retrieved.birthday) == '1999-07-20'
-    assert contact_retrieved.email_address == 'julianne.doe@gmails.com'
\ No newline at end of file
+    assert contact_retrieved.email_address == 'julianne.doe@gmails.com'
+
+
+def test_uow_counts_queries_and_flags_duplicates(new_session_empty_db, session_factory):
+    """Tests the unit of work instruments its engine so repeated identical statements are counted and flagged"""
+
+    # arrange
+    uow = SqlAlchemyUnitOfWork(session_factory)
+
+    # act
+    with track_queries() as stats:
+        with uow:
+            uow.contacts.get_by_email_address('julianne.doe@gmails.com')
+            uow.contacts.get_by_email_address('julianne.doe@gmails.com')
+            uow.contacts.get_by_email_address('jacqueline.doe@hotmails.com')
+
+    # assert
+    assert stats.count == 3
+    assert stats.total_time > 0
+    assert len(stats.duplicates()) == 1
+    assert stats.duplicates()[0][2] == 2
+
+
+def test_uow_query_stats_time_statements_after_a_failed_one(new_session_empty_db, session_factory):
+    """Tests a statement that fails leaves nothing behind, so the statements after it are timed from their own start"""
+
+    # arrange
+    uow = SqlAlchemyUnitOfWork(session_factory)
+
+    # act
+    with track_queries() as stats:
+        with uow:
+            with pytest.raises(OperationalError):
+                uow.session.execute(text('SELECT * FROM no_such_table'))
+            uow.session.rollback()
+            time.sleep(0.05)
+            uow.contacts.get_by_email_address('julianne.doe@gmails.com')
+            connection_info = dict(uow.session.connection().info)
+
+    # assert
+    assert stats.count == 1
+    assert stats.total_time < 0.05
+    assert 'query_start_time' not in connection_info
+
+
+def test_uow_cache_serves_repeat_lookups_and_invalidates_on_commit(new_session_empty_db, session_factory):
+    """Tests the unit of work serves repeat lookups from the contact cache and drops updated contacts once committed"""
+
+    # arrange
+    contact = Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com')
+    cache = ContactCache(max_size=10, ttl=30)
+    uow = SqlAlchemyUnitOfWork(session_factory, cache=cache)
+    with uow:
+        uow.contacts.add(contact)
+        uow.commit()
+    with uow:
+        uow.contacts.get_by_id(1)
+
+    # act
+    with track_queries() as stats:
+        with uow:
+            cached_contact = uow.contacts.get_by_email_address('julianne.doe@gmails.com')
+    with uow:
+        uow.contacts.update(1, {'first_name': 'Jamelia'})
+        uow.commit()
+    with uow:
+        updated_first_name = uow.contacts.get_by_id(1).first_name
+
+    # assert
+    assert stats.count == 0
+    assert cached_contact.first_name == 'Julianne'
+    assert updated_first_name == 'Jamelia'
+    assert cache.stats()["hits"] == 1
+
+
+def test_uow_cache_drops_a_fill_that_races_a_committed_update(new_session_empty_db, session_factory, monkeypatch):
+    """Tests a contact loaded on a cache miss isn't cached when an update is committed and invalidated before the put"""
+
+    # arrange
+    cache = ContactCache(max_size=10, ttl=30)
+    with SqlAlchemyUnitOfWork(session_factory, cache=cache) as uow:
+        uow.contacts.add(Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+        uow.commit()
+    load_contact = SqlAlchemyContactRepository.get_by_id
+    racing_writes = [{'first_name': 'Jamelia'}]
+
+    def load_then_lose_race(self, id):
+        contact = load_contact(self, id)
+        if racing_writes:
+            # Another request commits an update after the miss has loaded the contact, but before it is cached
+            with SqlAlchemyUnitOfWork(session_factory, cache=cache) as writer:
+                writer.contacts.update(id, racing_writes.pop())
+                writer.commit()
+        return contact
+
+    monkeypatch.setattr(SqlAlchemyContactRepository, 'get_by_id', load_then_lose_race)
+
+    # act
+    with SqlAlchemyUnitOfWork(session_factory, cache=cache, read_only=True) as uow:
+        raced_first_name = uow.contacts.get_by_id(1).first_name
+    with SqlAlchemyUnitOfWork(session_factory, cache=cache, read_only=True) as uow:
+        first_name = uow.contacts.get_by_id(1).first_name
+
+    # assert
+    assert raced_first_name == 'Julianne'
+    assert first_name == 'Jamelia'
+    assert cache.stats()["stale_fills"] == 1
+
+def test_read_only_uow_reads_from_the_replica_and_cannot_commit(new_session_empty_db, session_factory):
+    """Tests a read-only unit of work takes its session from the replica and refuses to commit"""
+
+    # arrange
+    replica_engine = create_engine('sqlite:///:memory:')
+    model.Base.metadata.create_all(replica_engine)
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        uow.contacts.add(Contact(first_name='Julianne', last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+        uow.commit()
+    uow = SqlAlchemyUnitOfWork(session_factory, read_only=True, replica_session_factory=sessionmaker(bind=replica_engine))
+
+    # act
+    with uow:
+        replica_contact = uow.contacts.get_by_id(1)
+        with pytest.raises(RuntimeError):
+            uow.commit()
+    with SqlAlchemyUnitOfWork(session_factory, read_only=True) as primary_uow:
+        primary_first_name = primary_uow.contacts.get_by_id(1).first_name
+
+    # assert
+    assert replica_contact is None
+    assert primary_first_name == 'Julianne'
+
+
+def test_replica_reads_do_not_fill_the_shared_cache(new_session_empty_db, session_factory):
+    """Tests a lagging replica row read through the cache isn't cached, so primary reads still see the latest version"""
+
+    # arrange
+    replica_engine = create_engine('sqlite:///:memory:')
+    model.Base.metadata.create_all(replica_engine)
+    replica_session_factory = sessionmaker(bind=replica_engine)
+    cache = ContactCache(max_size=10, ttl=30)
+    for factory, first_name in ((session_factory, 'Julianne'), (replica_session_factory, 'Julie')):
+        with SqlAlchemyUnitOfWork(factory) as uow:
+            uow.contacts.add(Contact(first_name=first_name, last_name='Doe', birthday=datetime.date(1999, 3, 13), email_address='julianne.doe@gmails.com'))
+            uow.commit()
+
+    # act
+    with SqlAlchemyUnitOfWork(session_factory, cache=cache, read_only=True, replica_session_factory=replica_session_factory) as uow:
+        replica_first_name = uow.contacts.get_by_id(1).first_name
+    with SqlAlchemyUnitOfWork(session_factory, cache=cache, read_only=True) as uow:
+        primary_first_name = uow.contacts.get_by_id(1).first_name
+    with SqlAlchemyUnitOfWork(session_factory, cache=cache, read_only=True, replica_session_factory=replica_session_factory) as uow:
+        cached_first_name = uow.contacts.get_by_id(1).first_name
+
+    # assert
+    assert replica_first_name == 'Julie'
+    assert primary_first_name == 'Julianne'
+    assert cached_first_name == 'Julianne'
+
+
+def test_nested_units_of_work_are_timed_once(session_factory):
+    """Tests re-entering a unit of work records one uow phase, covering the outermost block"""
+
+    # arrange
+    uow = SqlAlchemyUnitOfWork(session_factory)
+    timings, token = timing.start_timing()
+
+    # act
+    with uow:
+        time.sleep(0.02)
+        with uow:
+            pass
+    timing.stop_timing(token)
+
+    # assert
+    assert timings.phases['uow'] >= 0.02
+
+
+def test_bulk_add_falls_back_to_single_inserts_when_an_email_address_is_taken_concurrently(new_session_empty_db, session_factory, monkeypatch):
+    """Tests a unique violation in the bulk INSERT is rolled back and the contacts added one by one, keeping the rest of the batch"""
+
+    # arrange
+    contact_service = ContactService(SqlAlchemyUnitOfWork(session_factory))
+    check_existing_email_addresses = SqlAlchemyContactRepository.get_existing_email_addresses
+
+    def check_then_lose_race(self, email_addresses):
+        existing_emails = check_existing_email_addresses(self, email_addresses)
+        # A concurrent request commits Juliet just after the duplicate check
+        with SqlAlchemyUnitOfWork(session_factory) as uow:
+            uow.contacts.add(Contact(first_name='Juliet', last_name='Doe', birthday=datetime.date(1999, 7, 31), email_address='juliet.doe@gmails.com'))
+            uow.commit()
+        return existing_emails
+
+    monkeypatch.setattr(SqlAlchemyContactRepository, 'get_existing_email_addresses', check_then_lose_race)
+    contacts_data = [
+        {'first_name': 'Janice', 'last_name': 'Doe', 'birthday': '1997-05-21', 'email_address': 'janice.doe@gmails.com'},
+        {'first_name': 'Juliet', 'last_name': 'Doe', 'birthday': '1999-07-31', 'email_address': 'juliet.doe@gmails.com'},
+        {'first_name': 'Jamelia', 'last_name': 'Doe', 'birthday': '1995-02-11', 'email_address': 'jamelia.doe@gmails.com'},
+    ]
+
+    # act
+    results = contact_service.add_many(contacts_data)
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        email_addresses = sorted(contact.email_address for contact in uow.contacts.get_all())
+
+    # assert
+    assert [result["status"] for result in results] == ['created', 'duplicate', 'created']
+    assert results[2]["contact"]["email_address"] == 'jamelia.doe@gmails.com'
+    assert email_addresses == ['jamelia.doe@gmails.com', 'janice.doe@gmails.com', 'juliet.doe@gmails.com']
+
+
+def test_collection_etag_changes_for_a_write_older_than_the_latest(new_session_empty_db, session_factory):
+    """Tests an update stamped before the latest change - as a PostgreSQL transaction started earlier would be - still changes the collection ETag"""
+
+    # arrange
+    contact_service = ContactService(SqlAlchemyUnitOfWork(session_factory))
+    contact_service.add('Julianne', 'Doe', datetime.date(1999, 3, 13), 'julianne.doe@gmails.com')
+    contact_service.add('John', 'Doe', datetime.date(1995, 2, 11), 'john.doe@gmails.com')
+    etag = collection_etag(contact_service.get_collection_version(), b'')
+
+    # act
+    contact_service.update(1, {'first_name': 'Jamelia', 'last_updated_at': datetime.datetime(2000, 1, 1)})
+    new_etag = collection_etag(contact_service.get_collection_version(), b'')
+
+    # assert
+    assert new_etag != etag
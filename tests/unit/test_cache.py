@@ -0,0 +1,87 @@
+import datetime
+
+from src.contacts.adapters.cache import ContactCache
+
+
+def make_record(id, email_address):
+    return {'id': id, 'first_name': 'Juliet', 'last_name': 'Doe', 'birthday': datetime.date(1999, 7, 31),
+            'email_address': email_address, 'created_at': None, 'last_updated_at': None}
+
+
+def test_cache_lookup_by_id_and_email_address():
+    """Tests a cached record can be found by id and by email address, and that hits and misses are counted"""
+
+    # arrange
+    cache = ContactCache(max_size=10, ttl=30)
+    cache.put(make_record(1, 'juliet.doe@gmails.com'))
+
+    # act
+    by_id = cache.get_by_id(1)
+    by_email_address = cache.get_by_email_address('juliet.doe@gmails.com')
+    missing = cache.get_by_id(2)
+
+    # assert
+    assert by_id["email_address"] == 'juliet.doe@gmails.com'
+    assert by_email_address["id"] == 1
+    assert missing is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used_record():
+    """Tests the cache stays within its size by evicting the least recently used record"""
+
+    # arrange
+    cache = ContactCache(max_size=2, ttl=30)
+    cache.put(make_record(1, 'juliet.doe@gmails.com'))
+    cache.put(make_record(2, 'janice.doe@gmails.com'))
+    cache.get_by_id(1)
+
+    # act
+    cache.put(make_record(3, 'jamelia.doe@gmails.com'))
+
+    # assert
+    assert cache.get_by_id(2) is None
+    assert cache.get_by_email_address('janice.doe@gmails.com') is None
+    assert cache.get_by_id(1) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_expires_records_after_ttl():
+    """Tests records are no longer returned once their time-to-live has passed"""
+
+    # arrange
+    now = [100.0]
+    cache = ContactCache(max_size=10, ttl=5, clock=lambda: now[0])
+    cache.put(make_record(1, 'juliet.doe@gmails.com'))
+
+    # act
+    now[0] += 6
+    expired = cache.get_by_id(1)
+
+    # assert
+    assert expired is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_drops_a_fill_read_before_an_invalidation():
+    """Tests a record loaded on a miss isn't cached if the contact was invalidated between the load and the put"""
+
+    # arrange
+    cache = ContactCache(max_size=10, ttl=30)
+    cache.put(make_record(1, 'juliet.doe@gmails.com'))
+    cache.invalidate(1)
+    # A reader misses, and loads the contact as it was before the write below
+    generation = cache.generation()
+    stale_record = make_record(1, 'juliet.doe@gmails.com')
+
+    # act
+    cache.invalidate(1)
+    cache.put(stale_record, generation)
+    cache.put(make_record(2, 'janice.doe@gmails.com'), cache.generation())
+
+    # assert
+    assert cache.get_by_id(1) is None
+    assert cache.get_by_id(2) is not None
+    assert cache.stats()["stale_fills"] == 1
@@ -0,0 +1,138 @@
+import datetime
+import time
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.contacts.adapters.repository import InMemoryContactRepository, MockContactRepository
+from src.contacts.domain.model import Contact
+
+
+def make_contact(first_name, last_name='Doe', birthday='1999-07-31'):
+    return Contact(first_name=first_name, last_name=last_name, birthday=birthday, email_address=f'{first_name.lower()}.{last_name.lower()}@gmails.com')
+
+
+def test_in_memory_repository_looks_up_by_id_and_email_address():
+    """Tests contacts can be found by id and by email address, with birthdays stored as dates"""
+
+    # arrange
+    repository = InMemoryContactRepository()
+    repository.add_many([make_contact('Juliet'), make_contact('Janice')])
+
+    # act
+    by_id = repository.get_by_id(2)
+    by_email_address = repository.get_by_email_address('juliet.doe@gmails.com')
+
+    # assert
+    assert by_id.first_name == 'Janice'
+    assert by_id.birthday == datetime.date(1999, 7, 31)
+    assert by_email_address.id == 1
+    assert repository.get_by_id(3) is None
+    assert repository.get_by_email_address('jamelia.doe@gmails.com') is None
+    assert MockContactRepository is InMemoryContactRepository
+
+
+def test_in_memory_repository_rejects_duplicate_email_addresses():
+    """Tests adding or updating to an email address already in use fails like the unique index does, leaving the data unchanged"""
+
+    # arrange
+    repository = InMemoryContactRepository()
+    repository.add(make_contact('Juliet'))
+    repository.add(make_contact('Janice'))
+
+    # act / assert
+    with pytest.raises(IntegrityError):
+        repository.add(make_contact('Juliet'))
+    with pytest.raises(IntegrityError):
+        repository.add_many([make_contact('Jamelia'), make_contact('Janice')])
+    with pytest.raises(IntegrityError):
+        repository.update(2, {'email_address': 'juliet.doe@gmails.com'})
+    assert len(repository.get_all()) == 2
+
+
+def test_in_memory_repository_keeps_indexes_up_to_date_on_update_and_delete():
+    """Tests updates move the email address index and deleted ids are never reused"""
+
+    # arrange
+    repository = InMemoryContactRepository()
+    repository.add(make_contact('Juliet'))
+    repository.add(make_contact('Janice'))
+    original = repository.get_by_id(1)
+
+    # act
+    repository.update(1, {'email_address': 'juliet.smith@gmails.com', 'birthday': '2000-01-01'})
+    repository.delete_by_id(2)
+    new_contact = repository.add(make_contact('Jamelia'))
+
+    # assert
+    assert repository.get_by_email_address('juliet.doe@gmails.com') is None
+    assert repository.get_by_email_address('juliet.smith@gmails.com').birthday == datetime.date(2000, 1, 1)
+    assert original.email_address == 'juliet.doe@gmails.com'
+    assert repository.get_last_updated_at(1) >= original.last_updated_at
+    assert new_contact.id == 3
+    assert [contact.id for contact in repository.get_page(10)] == [1, 3]
+
+
+def test_in_memory_repository_pages_through_sorted_and_filtered_contacts():
+    """Tests keyset pages continue from the cursor position for both id order and a mixed sort"""
+
+    # arrange
+    repository = InMemoryContactRepository()
+    for first_name, last_name in [('Juliet', 'Smith'), ('Janice', 'Doe'), ('Jamelia', 'Adams'), ('Jill', 'Doe'), ('Jo', 'Doe')]:
+        repository.add(make_contact(first_name, last_name))
+    sort = ('last_name', '-first_name')
+
+    # act
+    first_page = repository.get_page(2, sort=sort)
+    second_page = repository.get_page(2, after_id=first_page[-1].id, sort=sort, after_keys=['Doe', 'Jill'])
+    id_page = repository.get_page(2, after_id=2, filters={'last_name': 'Doe'})
+
+    # assert
+    assert [contact.first_name for contact in first_page] == ['Jamelia', 'Jo']
+    assert [contact.first_name for contact in second_page] == ['Janice', 'Juliet']
+    assert [contact.id for contact in id_page] == [4, 5]
+
+
+def test_in_memory_repository_upsert_counts_outcomes():
+    """Tests upserting inserts new email addresses, updates changed contacts and leaves identical ones alone"""
+
+    # arrange
+    repository = InMemoryContactRepository()
+    repository.add(make_contact('Juliet'))
+    repository.add(make_contact('Janice'))
+    unchanged_at = repository.get_last_updated_at(2)
+
+    # act
+    outcome = repository.upsert_many([
+        {'first_name': 'Julie', 'last_name': 'Doe', 'birthday': '1999-07-31', 'email_address': 'juliet.doe@gmails.com'},
+        {'first_name': 'Janice', 'last_name': 'Doe', 'birthday': datetime.date(1999, 7, 31), 'email_address': 'janice.doe@gmails.com'},
+        {'first_name': 'Jamelia', 'last_name': 'Doe', 'birthday': '1995-02-11', 'email_address': 'jamelia.doe@gmails.com'},
+    ])
+
+    # assert
+    assert outcome == {'inserted': {'jamelia.doe@gmails.com': 3}, 'updated': {'juliet.doe@gmails.com': 1}, 'unchanged': 1}
+    assert repository.get_by_id(1).first_name == 'Julie'
+    assert repository.get_last_updated_at(2) == unchanged_at
+
+
+def test_in_memory_repository_stamps_contacts_in_utc(monkeypatch):
+    """Tests contacts are stamped in naive UTC, as the database stamps them, whatever the local time zone"""
+
+    # arrange
+    monkeypatch.setenv('TZ', 'Etc/GMT-5')
+    time.tzset()
+    repository = InMemoryContactRepository()
+
+    # act
+    try:
+        before = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        added = repository.add(make_contact('Juliet'))
+        updated = repository.update(1, {'first_name': 'Julie'})
+        after = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    # assert
+    assert before <= added.created_at <= after
+    assert before <= updated.last_updated_at <= after
@@ -0,0 +1,57 @@
+import threading
+
+from src.contacts.adapters.metrics import MetricsRegistry
+
+
+def test_counts_from_many_threads_add_up():
+    """Tests counters and histograms recorded by concurrent threads are all included in a scrape"""
+
+    # arrange
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    labels = (('route', '/contacts'),)
+
+    def record():
+        for _ in range(1000):
+            metrics.inc('requests_total', labels)
+            metrics.observe('duration_seconds', 0.5, labels)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+
+    # act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.inc('requests_total', labels)
+    totals = metrics.collect()
+
+    # assert
+    assert totals.counters[('requests_total', labels)] == 8001
+    assert totals.histograms[('duration_seconds', labels)][0] == [0, 8000, 0]
+    assert totals.histograms[('duration_seconds', labels)][1] == 4000.0
+    assert len(metrics._shards) == 1
+
+
+def test_render_prometheus_text_format():
+    """Tests histograms render with cumulative buckets, and gauges are rendered alongside the recorded metrics"""
+
+    # arrange
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    metrics.describe('duration_seconds', 'histogram', 'Request latency')
+    metrics.observe('duration_seconds', 0.05, (('route', '/contacts'),))
+    metrics.observe('duration_seconds', 2.0, (('route', '/contacts'),))
+
+    # act
+    text = metrics.render([('pool_size', (('database', 'primary'),), 5)])
+
+    # assert
+    assert text == (
+        '# HELP duration_seconds Request latency\n'
+        '# TYPE duration_seconds histogram\n'
+        'duration_seconds_bucket{route="/contacts",le="0.1"} 1\n'
+        'duration_seconds_bucket{route="/contacts",le="1.0"} 1\n'
+        'duration_seconds_bucket{route="/contacts",le="+Inf"} 2\n'
+        'duration_seconds_sum{route="/contacts"} 2.05\n'
+        'duration_seconds_count{route="/contacts"} 2\n'
+        'pool_size{database="primary"} 5\n'
+    )
@@ -0,0 +1,76 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.contacts.domain.model import Contact
+from src.contacts.domain.schema import ContactSchema
+from src.contacts.service_layer import serialization
+
+
+def make_contacts():
+    return [
+        Contact(id=1, first_name='Juliet', last_name='Doe', birthday=datetime.date(1999, 7, 31),
+                email_address='juliet.doe@gmails.com', created_at=datetime.datetime(2024, 5, 1, 9, 30, 0, 125000)),
+        Contact(id=2, first_name='Zoë "Jo"', last_name='O\'Brien\\Doe', birthday=datetime.date(1987, 1, 2),
+                email_address='zoe@gmails.com', created_at=datetime.datetime(2024, 5, 1, 9, 30)),
+        Contact(id=3, first_name='Jamelia', last_name='Doe', birthday=datetime.date(1995, 2, 11),
+                email_address='jamelia.doe@gmails.com', created_at=None),
+    ]
+
+
+def test_contacts_to_json_matches_marshmallow_output():
+    """Tests the precompiled encoder produces exactly the bytes of ContactSchema().dump + json.dumps"""
+
+    # arrange
+    contacts = make_contacts()
+    expected = json.dumps(ContactSchema(many=True).dump(contacts)).encode('ascii')
+
+    # act
+    encoded = serialization.contacts_to_json(contacts)
+
+    # assert
+    assert encoded == expected
+    assert serialization.contact_to_json(contacts[1]) == json.dumps(ContactSchema().dump(contacts[1])).encode('ascii')
+    assert serialization.contacts_to_json([]) == b'[]'
+
+
+def test_contacts_to_json_accepts_plain_rows():
+    """Tests the encoder works on plain column rows as well as ORM instances"""
+
+    # arrange
+    contact = make_contacts()[0]
+    row = SimpleNamespace(**{field: getattr(contact, field) for field in serialization.CONTACT_JSON_FIELDS})
+
+    # act
+    encoded = serialization.contact_to_json(row)
+
+    # assert
+    assert encoded == serialization.contact_to_json(contact)
+
+
+def test_page_to_json_matches_json_dumps():
+    """Tests a page of contacts is encoded the same way json.dumps encodes the page dictionary"""
+
+    # arrange
+    contacts = make_contacts()
+    expected = json.dumps({"contacts": ContactSchema(many=True).dump(contacts), "next_cursor": "eyJpZCI6IDN9"}).encode('ascii')
+
+    # act
+    encoded = serialization.page_to_json(contacts, "eyJpZCI6IDN9")
+
+    # assert
+    assert encoded == expected
+
+
+def test_loads_rejects_invalid_json():
+    """Tests request bodies are parsed, and that invalid JSON raises ValueError"""
+
+    # act
+    parsed = serialization.loads(b'{"first_name": "Juliet"}')
+
+    # assert
+    assert parsed == {"first_name": "Juliet"}
+    with pytest.raises(ValueError):
+        serialization.loads(b'{"first_name": ')
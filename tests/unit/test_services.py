@@ -1,6 +1,12 @@
+import datetime
 import pytest
 from types import SimpleNamespace
 
+from src.contacts.service_layer.services import parse_fields, parse_filters, parse_sort, encode_cursor, decode_cursor, birthday_window, parse_birthday_window
+from src.contacts.adapters.typeahead import TypeaheadIndex
+from src.contacts.service_layer.services import ContactService
+from src.contacts.utils.exceptions import BadRequestException
+
 def test_add_and_retrieve_contact_success(mock_uow, contact_service):
     """Tests successful creation of a contact record with ContactService"""
 
@@ -146,4 +152,350 @@ def test_update_contact_success(mock_uow, contact_service):
     assert current_contact.last_name == contact_retrieved.last_name
     assert contact_retrieved.first_name == 'Jamelia'
     assert contact_retrieved.birthday == '1999-07-20'
-    assert mock_uow.committed == True
\ No newline at end of file
+    assert mock_uow.committed == True
+
+def test_get_page_of_contacts_success(contact_service):
+    """Tests happy path of paging through contacts with a cursor with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    contact_service.add('Janice', 'Doe', '1997-05-21', 'janice.doe@gmails.com')
+    contact_service.add('Jamelia', 'Doe', '1995-02-11', 'jamelia.doe@gmails.com')
+
+    # act
+    first_page = contact_service.get_page(limit=2)
+    second_page = contact_service.get_page(limit=2, cursor=first_page["next_cursor"])
+
+    # assert
+    assert [contact["first_name"] for contact in first_page["contacts"]] == ['Juliet', 'Janice']
+    assert [contact["first_name"] for contact in second_page["contacts"]] == ['Jamelia']
+    assert second_page["next_cursor"] is None
+
+
+def test_get_page_invalid_cursor(contact_service):
+    """Tests unhappy path of paging through contacts with a cursor that cannot be decoded with ContactService"""
+
+    # act
+    with pytest.raises(Exception) as excinfo:
+        contact_service.get_page(limit=2, cursor='not-a-cursor')
+
+    # assert
+    assert str(excinfo.value) == 'Bad Request - Invalid cursor'
+
+
+def test_stream_all_contacts_in_batches(contact_service):
+    """Tests happy path of streaming all contacts in fixed-size batches with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    contact_service.add('Janice', 'Doe', '1997-05-21', 'janice.doe@gmails.com')
+    contact_service.add('Jamelia', 'Doe', '1995-02-11', 'jamelia.doe@gmails.com')
+
+    # act
+    batches = list(contact_service.stream_all_contacts(batch_size=2))
+
+    # assert
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[1][0]["first_name"] == 'Jamelia'
+
+
+def test_add_many_contacts_reports_each_item(contact_service):
+    """Tests bulk creation of contacts with ContactService - created, duplicate and invalid items"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    contacts_data = [
+        {'first_name': 'Janice', 'last_name': 'Doe', 'birthday': '1997-05-21', 'email_address': 'janice.doe@gmails.com'},
+        {'first_name': 'Juliet', 'last_name': 'Doe', 'birthday': '1999-07-31', 'email_address': 'juliet.doe@gmails.com'},
+        {'first_name': 'Jamelia', 'last_name': 'Doe', 'birthday': '1995-02-11', 'email_address': ''},
+        {'first_name': 'Janice', 'last_name': 'Doe', 'birthday': '1997-05-21', 'email_address': 'janice.doe@gmails.com'},
+    ]
+
+    # act
+    results = contact_service.add_many(contacts_data)
+
+    # assert
+    assert [result["status"] for result in results] == ['created', 'duplicate', 'invalid', 'duplicate']
+    assert results[0]["contact"]["id"] == 2
+    assert 'email_address' in results[2]["errors"]
+
+
+def test_add_many_contacts_reports_only_the_contact_taken_concurrently(mock_uow, contact_service):
+    """Tests an email address taken after the duplicate check fails only its own item, not the whole batch"""
+
+    # arrange
+    repository = mock_uow.contacts
+    check_existing_email_addresses = repository.get_existing_email_addresses
+
+    def check_then_lose_race(email_addresses):
+        existing_emails = check_existing_email_addresses(email_addresses)
+        # A concurrent request adds Juliet just after the duplicate check
+        repository.get_existing_email_addresses = check_existing_email_addresses
+        contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+        return existing_emails
+
+    repository.get_existing_email_addresses = check_then_lose_race
+    contacts_data = [
+        {'first_name': 'Janice', 'last_name': 'Doe', 'birthday': '1997-05-21', 'email_address': 'janice.doe@gmails.com'},
+        {'first_name': 'Juliet', 'last_name': 'Doe', 'birthday': '1999-07-31', 'email_address': 'juliet.doe@gmails.com'},
+    ]
+
+    # act
+    results = contact_service.add_many(contacts_data)
+
+    # assert
+    assert [result["status"] for result in results] == ['created', 'duplicate']
+    assert results[0]["contact"]["email_address"] == 'janice.doe@gmails.com'
+    assert results[1]["email_address"] == 'juliet.doe@gmails.com'
+
+
+def test_upsert_many_contacts_counts_outcomes(mock_uow, contact_service):
+    """Tests bulk upsert of contacts keyed on email address with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    contact_service.add('Janice', 'Doe', '1997-05-21', 'janice.doe@gmails.com')
+    contacts_data = [
+        {'first_name': 'Juliet', 'last_name': 'Doe', 'birthday': '1999-07-31', 'email_address': 'juliet.doe@gmails.com'},
+        {'first_name': 'Janice', 'last_name': 'Smith', 'birthday': '1997-05-21', 'email_address': 'janice.doe@gmails.com'},
+        {'first_name': 'Jamelia', 'last_name': 'Doe', 'birthday': '1995-02-11', 'email_address': 'jamelia.doe@gmails.com'},
+    ]
+
+    # act
+    counts = contact_service.upsert_many(contacts_data)
+
+    # assert
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+    assert mock_uow.committed
+
+
+def test_contact_etag_changes_when_contact_is_updated(contact_service):
+    """Tests the ETag of a contact matches its full representation and changes once the contact is updated with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    _, full_etag = contact_service.get_json_by_id_with_etag(1)
+    original_etag = contact_service.get_etag(1)
+
+    # act
+    contact_service.update(1, {'first_name': 'Jamelia'})
+    updated_etag = contact_service.get_etag(1)
+
+    # assert
+    assert original_etag == full_etag
+    assert updated_etag != original_etag
+    assert contact_service.get_etag(2) is None
+
+
+def test_get_contacts_with_sparse_fieldset(contact_service):
+    """Tests contacts can be projected to the requested fields, always with their id, with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    fields = parse_fields('email_address, first_name')
+
+    # act
+    contact = contact_service.get_by_id(1, fields)
+    contact_json, etag = contact_service.get_json_by_id_with_etag(1, fields)
+    page = contact_service.get_page(limit=2, fields=fields)
+
+    # assert
+    assert fields == ('id', 'first_name', 'email_address')
+    assert contact == {'id': 1, 'first_name': 'Juliet', 'email_address': 'juliet.doe@gmails.com'}
+    assert contact_json == b'{"id": 1, "first_name": "Juliet", "email_address": "juliet.doe@gmails.com"}'
+    assert page["contacts"] == [contact]
+    assert etag == contact_service.get_etag(1, fields)
+    assert etag != contact_service.get_etag(1)
+
+
+def test_parse_fields_rejects_unknown_fields():
+    """Tests a sparse fieldset naming a field contacts don't have is rejected"""
+
+    # act
+    with pytest.raises(BadRequestException) as excinfo:
+        parse_fields('email_address,password')
+
+    # assert
+    assert str(excinfo.value) == 'Bad Request - Unknown field(s): password'
+    assert parse_fields(None) is None
+
+
+def test_get_page_of_filtered_and_sorted_contacts(contact_service):
+    """Tests paging through contacts filtered by birthday and sorted by last name with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Smith', '1999-07-31', 'juliet.smith@gmails.com')
+    contact_service.add('Janice', 'Doe', '1997-05-21', 'janice.doe@gmails.com')
+    contact_service.add('Jamelia', 'Adams', '1995-02-11', 'jamelia.adams@gmails.com')
+    contact_service.add('Jill', 'Brown', '1990-01-01', 'jill.brown@gmails.com')
+    filters = parse_filters({'birthday_from': '1995-01-01', 'birthday_to': '2000-01-01'})
+    sort = parse_sort('-last_name')
+
+    # act
+    first_page = contact_service.get_page(limit=2, filters=filters, sort=sort)
+    second_page = contact_service.get_page(limit=2, cursor=first_page["next_cursor"], filters=filters, sort=sort)
+
+    # assert
+    assert [contact["last_name"] for contact in first_page["contacts"]] == ['Smith', 'Doe']
+    assert [contact["last_name"] for contact in second_page["contacts"]] == ['Adams']
+    assert second_page["next_cursor"] is None
+
+
+def test_filters_and_sort_reject_invalid_values():
+    """Tests malformed filter values, unknown sort fields and cursors from another sort order are rejected"""
+
+    # act
+    with pytest.raises(BadRequestException) as filter_excinfo:
+        parse_filters({'created_after': 'yesterday'})
+    with pytest.raises(BadRequestException) as sort_excinfo:
+        parse_sort('last_name,password')
+    with pytest.raises(BadRequestException) as cursor_excinfo:
+        decode_cursor(encode_cursor(1), ('last_name',))
+
+    # assert
+    assert str(filter_excinfo.value) == 'Bad Request - created_after must be an ISO 8601 timestamp'
+    assert str(sort_excinfo.value) == 'Bad Request - Unknown sort field(s): password'
+    assert str(cursor_excinfo.value) == 'Bad Request - Invalid cursor'
+
+
+def test_decode_cursor_rejects_keys_that_are_not_strings():
+    """Tests well-formed cursors whose sort keys are lists, objects or numbers are rejected rather than bound into the query"""
+
+    # arrange
+    cursors = [encode_cursor(1, [['Doe']], ('last_name',)), encode_cursor(1, [{'last_name': 'Doe'}], ('last_name',)), encode_cursor(1, [7], ('last_name',))]
+
+    # act
+    errors = []
+    for cursor in cursors:
+        with pytest.raises(BadRequestException) as excinfo:
+            decode_cursor(cursor, ('last_name',))
+        errors.append(str(excinfo.value))
+
+    # assert
+    assert errors == ['Bad Request - Invalid cursor'] * 3
+
+
+def test_decode_cursor_rejects_a_cursor_from_another_sort_with_as_many_keys(contact_service):
+    """Tests a cursor minted under one sort is rejected under another sort of the same length, rather than seeking to the wrong place"""
+
+    # arrange
+    contact_service.add('Juliet', 'Smith', '1999-07-31', 'juliet.smith@gmails.com')
+    contact_service.add('Janice', 'Doe', '1997-05-21', 'janice.doe@gmails.com')
+    contact_service.add('Jamelia', 'Adams', '1995-02-11', 'jamelia.adams@gmails.com')
+    cursor = contact_service.get_page(limit=2, sort=parse_sort('last_name'))["next_cursor"]
+
+    # act
+    with pytest.raises(BadRequestException) as excinfo:
+        contact_service.get_page(limit=2, cursor=cursor, sort=parse_sort('first_name'))
+    with pytest.raises(BadRequestException) as descending_excinfo:
+        contact_service.get_page(limit=2, cursor=cursor, sort=parse_sort('-last_name'))
+
+    # assert
+    assert str(excinfo.value) == 'Bad Request - Invalid cursor'
+    assert str(descending_excinfo.value) == 'Bad Request - Invalid cursor'
+    assert [contact["last_name"] for contact in contact_service.get_page(limit=2, cursor=cursor, sort=parse_sort('last_name'))["contacts"]] == ['Smith']
+
+
+def test_created_after_with_an_offset_is_compared_in_utc(contact_service):
+    """Tests a created_after timestamp with a UTC offset is converted to the naive UTC contacts are stamped in, instead of failing the comparison"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    filters = parse_filters({'created_after': '2000-01-01T01:00:00+01:00'})
+
+    # act
+    contacts = contact_service.get_all_contacts(filters=filters)
+
+    # assert
+    assert filters == {'created_after': datetime.datetime(2000, 1, 1)}
+    assert [contact["first_name"] for contact in contacts] == ['Juliet']
+
+
+def test_search_contacts_by_name_and_email_prefix(contact_service):
+    """Tests searching contacts by the start of any word of their name or email address with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    contact_service.add('Janice', 'Smith', '1997-05-21', 'janice@work.com')
+
+    # act
+    by_name = contact_service.search('smi')
+    by_email = contact_service.search('JUL gmails.c', fields=('id', 'email_address'))
+    by_punctuation = contact_service.search('@.')
+
+    # assert
+    assert [contact["first_name"] for contact in by_name] == ['Janice']
+    assert by_email == [{'id': 1, 'email_address': 'juliet.doe@gmails.com'}]
+    assert by_punctuation == []
+
+
+def test_autocomplete_index_follows_service_writes(mock_uow):
+    """Tests the typeahead index is loaded from the contacts and kept up to date by adds, updates and deletes with ContactService"""
+
+    # arrange
+    ContactService(mock_uow).add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    contact_service = ContactService(mock_uow, TypeaheadIndex())
+    contact_service.load_typeahead_index()
+
+    # act
+    contact_service.add('Janice', 'Doe', '1997-05-21', 'janice.doe@gmails.com')
+    contact_service.update(1, {'last_name': 'Smith'})
+    contact_service.delete_by_id(2)
+
+    # assert
+    assert contact_service.autocomplete('janice') == []
+    assert contact_service.autocomplete('smi') == [{'id': 1, 'first_name': 'Juliet', 'last_name': 'Smith', 'email_address': 'juliet.doe@gmails.com'}]
+    assert ContactService(mock_uow).autocomplete('smi') == contact_service.autocomplete('smi')
+
+
+def test_get_upcoming_birthdays_across_the_new_year(contact_service):
+    """Tests upcoming birthdays are found across the end of the year and listed soonest first with ContactService"""
+
+    # arrange
+    contact_service.add('Juliet', 'Doe', '1999-01-03', 'juliet.doe@gmails.com')
+    contact_service.add('Janice', 'Doe', '1997-12-30', 'janice.doe@gmails.com')
+    contact_service.add('Jamelia', 'Doe', '1995-12-20', 'jamelia.doe@gmails.com')
+    contact_service.add('Jill', 'Doe', '1990-01-10', 'jill.doe@gmails.com')
+
+    # act
+    upcoming = contact_service.get_upcoming_birthdays(7, today=datetime.date(2026, 12, 28))
+
+    # assert
+    assert [contact["first_name"] for contact in upcoming] == ['Janice', 'Juliet']
+
+
+def test_birthday_window_handles_year_end_and_leap_days():
+    """Tests the month/day range of upcoming birthdays wraps at the new year and covers 29 February outside leap years"""
+
+    # act
+    same_year = birthday_window(datetime.date(2026, 6, 1), 10)
+    over_new_year = birthday_window(datetime.date(2026, 12, 28), 7)
+    ending_28_february = birthday_window(datetime.date(2027, 2, 20), 8)
+    ending_28_february_leap_year = birthday_window(datetime.date(2028, 2, 20), 8)
+
+    # assert
+    assert same_year == (601, 611)
+    assert over_new_year == (1228, 104)
+    assert ending_28_february == (220, 229)
+    assert ending_28_february_leap_year == (220, 228)
+    assert birthday_window(datetime.date(2026, 6, 1), 365) == (101, 1231)
+    with pytest.raises(BadRequestException):
+        parse_birthday_window('366')
+
+
+def test_collection_version_changes_on_every_write(contact_service):
+    """Tests the contact collection version changes with every add, update and delete with ContactService"""
+
+    # arrange
+    versions = [contact_service.get_collection_version()]
+
+    # act
+    contact_service.add('Juliet', 'Doe', '1999-07-31', 'juliet.doe@gmails.com')
+    versions.append(contact_service.get_collection_version())
+    contact_service.update(1, {'first_name': 'Jamelia'})
+    versions.append(contact_service.get_collection_version())
+    contact_service.delete_by_id(1)
+    versions.append(contact_service.get_collection_version())
+
+    # assert
+    assert versions == [0, 1, 2, 3]
@@ -0,0 +1,37 @@
+from src.contacts.utils import timing
+
+
+def test_phases_add_up_and_render_as_server_timing():
+    """Tests a phase entered more than once is reported once, with its durations added up"""
+
+    # arrange
+    timings, token = timing.start_timing()
+
+    # act
+    for _ in range(3):
+        with timing.phase('serialize'):
+            pass
+    timings.add('db', 0.0025, '2 queries')
+    timing.stop_timing(token)
+
+    # assert
+    assert list(timings.phases) == ['serialize', 'db']
+    assert timings.header().endswith('db;dur=2.500;desc="2 queries"')
+    assert timings.header().startswith('serialize;dur=')
+
+
+def test_phases_outside_a_timed_request_are_not_recorded():
+    """Tests phases entered when no request is being timed use the shared no-op context manager"""
+
+    # arrange
+    timings, token = timing.start_timing()
+    timing.stop_timing(token)
+
+    # act
+    with timing.phase('validate'):
+        pass
+
+    # assert
+    assert timing.current() is None
+    assert timing.phase('validate') is timing.phase('json')
+    assert timings.phases == {}
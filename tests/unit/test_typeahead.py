@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from src.contacts.adapters.typeahead import TypeaheadIndex
+
+
+def make_index():
+    index = TypeaheadIndex()
+    index.load([
+        SimpleNamespace(id=1, first_name='Juliet', last_name='Doe', email_address='juliet.doe@gmails.com'),
+        SimpleNamespace(id=2, first_name='Janice', last_name='Smith', email_address='janice@work.com'),
+        SimpleNamespace(id=3, first_name='Jack', last_name='Janssen', email_address='jack@gmails.com'),
+    ])
+    return index
+
+
+def test_typeahead_matches_word_prefixes_of_names_and_email_addresses():
+    """Tests suggestions match the start of any name or email address word, whatever the length of the query"""
+
+    # arrange
+    index = make_index()
+
+    # act
+    single_letter = index.search('j')
+    two_words = index.search('jan smi')
+    email_address = index.search('juliet.doe@gm')
+    middle_of_word = index.search('ansse')
+
+    # assert
+    assert [suggestion["id"] for suggestion in single_letter] == [1, 2, 3]
+    assert two_words == [{'id': 2, 'first_name': 'Janice', 'last_name': 'Smith', 'email_address': 'janice@work.com'}]
+    assert [suggestion["id"] for suggestion in email_address] == [1]
+    assert middle_of_word == []
+    assert len(index.search('j', limit=2)) == 2
+
+
+def test_typeahead_follows_updates_and_removals():
+    """Tests changed and removed contacts stop being suggested, including after the posting lists are compacted"""
+
+    # arrange
+    index = make_index()
+
+    # act
+    index.add(2, 'Janice', 'Brown', 'janice@home.com')
+    index.remove(3)
+
+    # assert
+    assert index.search('smith') == []
+    assert [suggestion["id"] for suggestion in index.search('bro')] == [2]
+    assert [suggestion["id"] for suggestion in index.search('jan')] == [2]
+    assert index.stats()["contacts"] == 2
+    assert index.stats()["stale_postings"] * 2 <= index.stats()["postings"]